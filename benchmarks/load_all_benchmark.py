@@ -0,0 +1,65 @@
+import os
+import sys
+import sqlite3
+import tempfile
+import shutil
+from timeit import default_timer as timer
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from mmu.db.migrations import migrate
+from mmu.db.handlers.signatures import RawSignatureHandler
+
+# Measures RawSignatureHandler.load_all on a synthetic raw signatures table with each of the available row types.
+# Usage: python benchmarks/load_all_benchmark.py [number of rows]
+
+
+# Fills a new database with synthetic signatures: 50 roles, 2000 issues with 2 regulations each, and as many persons
+# as it takes for every person to sign each regulation once, since a regulation can't be signed twice by the same person
+def create_database(path, num_rows):
+    num_persons = max(300, num_rows // 4000 + 1)
+
+    db = sqlite3.connect(path)
+    db.executescript(open(os.path.join(os.path.dirname(__file__), '..', 'install', 'default.sql'),
+                          encoding='utf8').read())
+    migrate(db)
+
+    db.executemany('INSERT INTO signature_persons (id, name) VALUES (?, ?)',
+                   ((i, 'ΠΡΟΣΩΠΟ {}'.format(i)) for i in range(1, num_persons + 1)))
+    db.executemany('INSERT INTO signature_roles (id, title) VALUES (?, ?)',
+                   ((i, 'ΥΠΟΥΡΓΟΣ {}'.format(i)) for i in range(1, 51)))
+    db.executemany('INSERT INTO signature_issues (id, title, date) VALUES (?, ?, ?)',
+                   ((i, 'ΦΕΚ A {}'.format(i), '2016-01-01 00:00:00') for i in range(1, 2001)))
+    db.executemany('INSERT INTO signature_regulations (id, title) VALUES (?, ?)',
+                   ((i, 'ΝΟΜΟΣ {}'.format(i)) for i in range(1, 4001)))
+    db.executemany('INSERT INTO signature_facts (person_id, role_id, issue_id, regulation_id) VALUES (?, ?, ?, ?)',
+                   ((i // 4000 + 1, i % 50 + 1, i % 2000 + 1, i % 4000 + 1) for i in range(num_rows)))
+    db.commit()
+    db.close()
+
+
+def measure(name, function):
+    start = timer()
+    result = function()
+    print("{:<8} {:>8.3f} seconds for {} rows".format(name, timer() - start, len(result)))
+
+
+if __name__ == '__main__':
+    num_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'benchmark')
+
+    try:
+        create_database(path, num_rows)
+
+        for row_type in ['dict', 'row', 'record', 'tuple']:
+            handler = RawSignatureHandler(path, row_type=row_type)
+            measure(row_type, handler.load_all)
+
+        try:
+            handler = RawSignatureHandler(path)
+            measure('columns', lambda: handler.load_columns(['person_name', 'role', 'regulation'])['role'])
+        except ImportError:
+            print("NumPy is not installed, skipping the columnar fetch")
+
+        handler.close()
+    finally:
+        shutil.rmtree(directory)
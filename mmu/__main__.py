@@ -2,15 +2,16 @@ import sys
 import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.split(sys.argv[0])[0], '..')))
 sys.path.insert(0, os.path.abspath(os.path.split(sys.argv[0])[0]))
-from mmu.automations.loader import Loader
+from mmu.automations.runner import PipelineRunner
 from mmu.automations.researcher import Researcher
 from mmu.analysis.analyzer import Analyzer
 
 
 source = "http://www.et.gr/idocs-nph/search/fekForm.html"
 
-loader = Loader(source)
-loader.scrape_pdfs()
+# Issues are parsed and their signatures saved while the crawl goes on
+runner = PipelineRunner(source)
+print(runner.run())
 
 researcher = Researcher()
 researcher.research()
@@ -2,23 +2,49 @@ from mmu.db.handlers.issue import IssueHandler
 from mmu.db.handlers.signatures import SignatureHandler
 from mmu.db.handlers.signatures import RawSignatureHandler
 from mmu.db.handlers.person import PersonHandler
+from mmu.db.handlers.job import JobHandler
+from mmu.db.handlers.cabinet import CabinetHandler
+from mmu.db.handlers.ministry import MinistryHandler
+from mmu.db.shards import Shards
 # from mmu.automations.researcher import Researcher
 from mmu.analysis.pdf_parser import CustomPDFParser
 from mmu.utility.helper import Helper
+from mmu.utility.blob_store import BlobStore
 from mmu.analysis.stats import Stats
+from mmu.analysis.intervals import SignerIndex
 import re
 import json
 from timeit import default_timer as timer
 
 class Analyzer:
 
-    def __init__(self):
-        self.__issue_handler = IssueHandler()
+    # The types of issues whose signatures are extracted
+    extracted_types = ['Α']
+
+    # @param snapshot Whether the analysis runs on a frozen copy of the database that nothing writes to, in which case
+    #   its reads skip locking altogether
+    # @param db_name The database issues are extracted from, e.g. a year's shard so that years are extracted in parallel
+    # @param federated Whether the analysis sees the issues and signatures of all year shards along with db_name's
+    # @param blob_store The BlobStore the issues' pdfs are read from
+    def __init__(self, snapshot = False, db_name = 'default', federated = False, blob_store = None):
+        self.__issue_handler = IssueHandler(db_name)
         self.__pdf_analyzer = CustomPDFParser()
-        self.__signature_handler = SignatureHandler()
+        self.__signature_handler = SignatureHandler(db_name)
         self.__person_handler = PersonHandler()
+        self.__cabinet_handler = CabinetHandler()
+        self.__ministry_handler = MinistryHandler()
         # self.__researcher = Researcher()
-        self.__raw_signature_handler = RawSignatureHandler()
+        self.__raw_signature_handler = RawSignatureHandler(db_name)
+        self.__job_handler = JobHandler(db_name)
+        self.__blob_store = blob_store or BlobStore()
+
+        # Analysis only reads, so it uses read-only connections that don't compete with extraction for locks
+        self.__analysis_issue_handler = IssueHandler(db_name, read_only=True, immutable=snapshot)
+        self.__analysis_signature_handler = RawSignatureHandler(db_name, read_only=True, immutable=snapshot)
+
+        # Both analysis handlers share one connection, so attaching the shards to it federates them both
+        if federated:
+            Shards(db_name).federate(self.__analysis_issue_handler)
 
         # Compile regular expressions that will be used a lot
         self.__illegal_chars = re.compile(r"\d+")
@@ -127,7 +153,7 @@ class Analyzer:
     # all required information is found through the researcher.
     def load_person_by_name(self, name):
         normalized_name = Helper.normalize_greek_name(name)
-        person = self.__person_handler.load_by_name(normalized_name)
+        person = self.__person_handler.load_by_name(normalized_name, fuzzy=True)
 
         if not person:
             self.__researcher.research_person(name)
@@ -140,75 +166,127 @@ class Analyzer:
         conditions = {'issue_title': [issue_title], 'person_name': [person_name]}
         return self.__raw_signature_handler.load_one(conditions=conditions)
 
+    # Checks that an issue's file is the one that was downloaded, by its SHA-256. Issues downloaded before checksums
+    # were recorded only need their file to exist.
+    def is_verified(self, issue):
+        return self.__blob_store.verify(issue['file'], issue['sha256'])
+
+    # Checks whether the signatures of an issue are extracted, i.e. whether it's of a type that has them and it has a
+    # file
+    def is_extractable(self, issue):
+        return issue['type'] in self.extracted_types and issue['file'] != 'N/A'
+
+    # Extracts the text of an issue's pages and the signatures of its regulations
+    # @return A tuple with the text of every page and the issue's raw signatures, or None instead of the signatures if
+    #   they couldn't be extracted
+    def extract_issue(self, issue):
+        issue_title = issue['title']
+        issue_date = issue['date']
+        year = issue_date[0:4]
+
+        print('Analyzing', issue_title)
+
+        # The text of every page, which is kept for full-text search, and all signatures found in this issue grouped
+        # by the regulation they belong to, from a single layout of the pdf
+        with self.__blob_store.open(issue['file']) as pdf:
+            pages, regulations = self.__pdf_analyzer.get_pages_and_signatures(pdf, year)
+
+        raw_signatures = None
+        if not regulations:
+            print("No relevant regulations were found in", issue_title)
+        elif 'signatures' not in regulations[0]:
+            print("Signature extraction failed for", issue_title)
+        else:
+            raw_signatures = []
+            for regulation in regulations:
+                regulation_type = regulation['type'] + " " + regulation['number']
+                if 'signatures' in regulation:
+                    for signature in regulation['signatures']:
+                        raw_signatures.append({'person_name': signature['name'],
+                                               'role': Helper.format_role(signature['role']),
+                                               'issue_title': issue_title,
+                                               'issue_date': issue_date,
+                                               'regulation': regulation_type})
+
+        return pages, raw_signatures
+
+    # Saves what extract_issue returned. The issue is only marked as analyzed along with its signatures.
+    def save_extraction(self, issue, pages, raw_signatures):
+        self.__issue_handler.save_pages(issue['id'], pages)
+
+        if raw_signatures is not None:
+            self.__raw_signature_handler.create_multiple(raw_signatures)
+            self.__issue_handler.set_analyzed(issue['id'])
+
+    # Extracts the signatures of all issues that haven't been analyzed yet. Issues are queued as jobs, so several
+    # extraction processes can run at the same time, each one claiming different issues, and issues that were being
+    # analyzed by a process that crashed are picked up again once their lease expires.
     def start_signature_extraction(self):
-        # Loads all issues not yet analyzed
-        issues = self.__issue_handler.load_all({'analyzed' : [0], 'type': ['Α']})
+        # Queues all issues not yet analyzed. Issues that are already queued are skipped.
+        issues = self.__issue_handler.load_unanalyzed(self.extracted_types)
         # issues = self.__issue_handler.load_all({'analyzed' : [0], 'type': ['Α'], 'title': ['ΦΕΚ A 179 - 23.11.2017']})
+        self.__job_handler.enqueue('signature_extraction', [issue['id'] for issue in issues if issue])
 
-        if not issues or issues[0] == None:
-            return
+        while True:
+            job = self.__job_handler.claim('signature_extraction')
+            if not job:
+                break
 
-        for issue in issues:
-            issue_id = issue['id']
-            issue_file = issue['file']
-            issue_number = issue['number']
+            issue = self.__issue_handler.load_by_id(job['item_id'])
             issue_title = issue['title']
-            issue_date = issue['date']
-            year = issue_date[0:4]
 
-            if issue_file == 'N/A':
+            # Issues can be analyzed by a pipeline while their job waits in the queue
+            if issue['file'] == 'N/A' or issue['analyzed']:
+                self.__job_handler.complete(job['id'])
                 continue
 
-            print('Analyzing', issue_title)
-            # All signatures found in this issue grouped by the regulation they belong to.
-            regulations = self.__pdf_analyzer.get_signatures_from_pdf(issue_file, year)
-
-            if not regulations:
-                print("No relevant regulations were found in", issue_title)
+            if not self.is_verified(issue):
+                print("The file of", issue_title, "is missing or incomplete")
+                self.__job_handler.fail(job['id'], 'File missing or incomplete')
                 continue
 
-            if 'signatures' not in regulations[0]:
-                print("Signature extraction failed for", issue_title)
+            try:
+                pages, raw_signatures = self.extract_issue(issue)
+            except Exception as e:
+                print("Signature extraction failed for", issue_title, e)
+                self.__job_handler.fail(job['id'], e)
                 continue
 
-            raw_signatures = []
-            for regulation in regulations:
-                regulation_type = regulation['type'] + " " + regulation['number']
-                if 'signatures' in regulation:
-                    for signature in regulation['signatures']:
-                        raw_signatures.append({'person_name': signature['name'],
-                                               'role': Helper.format_role(signature['role']),
-                                               'issue_title': issue_title,
-                                               'issue_date': issue_date,
-                                               'regulation': regulation_type})
+            # An issue is never marked as analyzed without its signatures being saved and vice versa. Completing the
+            # job first makes sure that only the process holding its lease saves them.
+            with self.__issue_handler.transaction():
+                if not self.__job_handler.complete(job['id']):
+                    print("Lost the lease of", issue_title, "to another process")
+                    continue
 
-            self.__raw_signature_handler.create_multiple(raw_signatures)
-            self.__issue_handler.set_analyzed(issue_id)
+                self.save_extraction(issue, pages, raw_signatures)
+
+    # Saves the text of the issues that were downloaded but whose text hasn't been saved yet, e.g. issues analyzed
+    # before page texts were kept, so that they can be searched with IssueHandler.search_text
+    def index_issue_texts(self, conditions=None):
+        for issue in self.__issue_handler.load_without_pages(conditions):
+            try:
+                with self.__blob_store.open(issue['file']) as pdf:
+                    pages = self.__pdf_analyzer.get_pages_text(pdf)
+            except Exception as e:
+                print("Text extraction failed for", issue['title'], e)
+                continue
+
+            self.__issue_handler.save_pages(issue['id'], pages)
 
     def prepare_analysis(self, conditions=None):
 
         # Gets all the signatures grouped by name
         joins = {'raw_signatures': ['INNER', 'raw_signatures.issue_title = issues.title']}
-        all_names = self.__issue_handler.load_all(conditions=conditions,
-                                                  group_by='raw_signatures.person_name',
-                                                  joins=joins)
+        all_names = self.__analysis_issue_handler.load_all(conditions=conditions,
+                                                           group_by='raw_signatures.person_name',
+                                                           joins=joins)
 
         for signature in all_names:
             name = signature['person_name']
-            person_signatures = self.__raw_signature_handler.load_all_by_person_name(name)
+            person_signatures = self.__analysis_signature_handler.load_all_by_person_name(name)
             role_titles = {}
 
-            # Code snippet that finds people's signatures without the middle initial
-            # name_parts = name.split(" ")
-            # if len(name_parts) > 2:
-            #     first_name = name_parts[0]
-            #     last_name = name_parts[len(name_parts) - 1]
-            #     similar_name_conditions = {'person_name': ["{f}%{l}".format(f=first_name, l=last_name), 'LIKE'],
-            #                                'raw_signatures.person_name': [name, '!=']}
-            #     same_person_different_name = self.__raw_signature_handler.load_all(conditions=similar_name_conditions)
-            #     if (same_person_different_name):
-            #         print('Test', same_person_different_name)
-
             for sig in person_signatures:
 
                 if not sig['role'] in role_titles:
@@ -228,13 +306,46 @@ class Analyzer:
                     .replace("ΥΠΟΥΡΓΟΣ", "").replace("ΟΙ ΥΠΟΥΡΓΟΙ", "")\
                     .replace("ΟΙΚΟΝΟΜΙΚΩΝΟΙΚΟΝΟΜΙΚΩΝ", "ΟΙΚΟΝΟΜΙΚΩΝ").replace("ΟΙ ΑΝΑΠΛΗΡΩΤΕΣ ΥΠΟΥΡΓΟΙ", "").strip()
 
-    def start_analysis(self, conditions = None):
-        signatures = self.__raw_signature_handler.load_all(conditions=conditions)
+    # Turns a ministry's name, e.g. Υπουργείο Οικονομικών, into the form find_ministry_name_from_role returns
+    def ministry_label(self, name):
+        return Helper.normalize_greek_name(name).replace("ΥΠΟΥΡΓΕΙΟ", "").strip()
+
+    # Maps the labels of ministries to the labels of the lineage roots their counts are rolled up to, so that a renamed
+    # or merged ministry counts as the same node as its predecessors
+    # @param root_ids The ids of the chosen roots, by default each ministry's oldest ancestor
+    def lineage_labels(self, root_ids = None):
+        return {self.ministry_label(name): self.ministry_label(root_name)
+                for name, (root_id, root_name) in self.__ministry_handler.load_roll_up(root_ids).items()}
+
+    # @param roll_up Whether ministries are rolled up to their lineage roots
+    # @param root_ids The ids of the chosen lineage roots, by default each ministry's oldest ancestor
+    def start_analysis(self, conditions = None, roll_up = False, root_ids = None):
+        signatures = self.__analysis_signature_handler.load_all(conditions=conditions)
+
+        # The ministry of each signer is the one they held a position in when the issue was published, which handles
+        # reshuffles. Signers without a known position fall back to their most common role, looked up once per person.
+        signer_index = SignerIndex(self.__person_handler, self.__cabinet_handler)
+        signer_index.resolve(signatures)
+        roles = {}
+
         for signature in signatures:
-            role = self.__raw_signature_handler.find_most_common_role(conditions=conditions,
-                                                                      person_name=signature['person_name'])
+            position = signature['position']
+
+            if position and position['ministry']:
+                signature['ministry'] = self.ministry_label(position['ministry'])
+                continue
+
+            person_name = signature['person_name']
+            if person_name not in roles:
+                roles[person_name] = self.__analysis_signature_handler.find_most_common_role(conditions=conditions,
+                                                                                              person_name=person_name)
+
+            signature['ministry'] = self.find_ministry_name_from_role(roles[person_name][0]['role'])
 
-            signature['ministry'] = self.find_ministry_name_from_role(role[0]['role'])
+        if roll_up:
+            lineage_labels = self.lineage_labels(root_ids)
+            for signature in signatures:
+                signature['ministry'] = lineage_labels.get(signature['ministry'], signature['ministry'])
 
         Stats.measure_co_responsibilities(signatures)
         # Stats.cluster_signature_data(signatures)
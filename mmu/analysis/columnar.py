@@ -0,0 +1,236 @@
+from mmu.db.handlers.signatures import RawSignatureHandler
+import os
+import json
+import shutil
+import tempfile
+import numpy as np
+
+
+# Keeps a columnar copy of the signatures for analysis. Every fact column is stored as a separate .npy file of
+# integers, in partitions by issue year and type:
+#   <directory>/year=2016/type=Α/part-00000/{id,person_id,role_id,issue_id,regulation_id}.npy
+# Strings are dictionary encoded: the integer columns reference the dimension tables, which are stored under
+# <directory>/dictionaries as a sorted array of ids and an array of their values. A manifest lists the partitions and
+# the last exported version of the signatures, so each export only writes the signatures saved or changed since the
+# previous one. Partitions are never modified: one that holds signatures that changed is written again without them,
+# under a new name, and the changed signatures are exported with the new ones.
+# All arrays are loaded memory mapped, so reading them doesn't copy anything until the data is actually used.
+class ColumnarStore:
+
+    # The integer columns of each partition
+    fact_columns = ['id', 'person_id', 'role_id', 'issue_id', 'regulation_id']
+
+    # The fact column that references each dimension, by raw_signatures column
+    dimension_columns = {'person_name': 'person_id', 'role': 'role_id', 'issue_title': 'issue_id',
+                         'regulation': 'regulation_id'}
+
+    # @param directory The directory of the store, which is created if needed
+    # @param db_name The database the signatures are exported from
+    def __init__(self, directory, db_name = 'default'):
+        self.__directory = directory
+        self.__db_name = db_name
+        self.__signature_handler = None
+
+    # The handler signatures are exported through, opened on first use so that loading doesn't need the database
+    def signature_handler(self):
+        if not self.__signature_handler:
+            self.__signature_handler = RawSignatureHandler(self.__db_name, read_only=True, row_type='tuple')
+
+        return self.__signature_handler
+
+    # Loads the manifest of the store, or an empty one if nothing has been exported yet
+    def load_manifest(self):
+        path = os.path.join(self.__directory, 'manifest.json')
+
+        if not os.path.exists(path):
+            return {'last_version': 0, 'next_partition': 0, 'partitions': []}
+
+        with open(path, 'r', encoding='utf8') as file:
+            return json.load(file)
+
+    # Replaces the manifest in one step, so that readers see either the old or the new partitions but never a part
+    def save_manifest(self, manifest):
+        path = os.path.join(self.__directory, 'manifest.json')
+
+        with open(path + '.tmp', 'w', encoding='utf8') as file:
+            json.dump(manifest, file, ensure_ascii=False, indent=1)
+
+        os.replace(path + '.tmp', path)
+
+    # Saves an array to a .npy file in one step
+    @staticmethod
+    def save_array(path, array):
+        with open(path + '.tmp', 'wb') as file:
+            np.save(file, array)
+
+        os.replace(path + '.tmp', path)
+
+    # Writes the fact columns of a partition. The columns are written to a temporary directory that's renamed once
+    # they're complete, so a partition is never seen half written.
+    # @param manifest The manifest the partition is numbered by
+    # @param columns A dictionary in the format column : array
+    # @return The manifest entry of the partition
+    def write_partition(self, manifest, year, issue_type, columns):
+        path = os.path.join('year=' + year, 'type=' + issue_type, 'part-{:05d}'.format(manifest['next_partition']))
+        manifest['next_partition'] += 1
+
+        target = os.path.join(self.__directory, path)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+
+        # A partition that an export wrote before failing isn't in the manifest, so nothing reads it
+        if os.path.exists(target):
+            shutil.rmtree(target)
+
+        temporary = tempfile.mkdtemp(prefix='.part-', dir=os.path.dirname(target))
+        for column in self.fact_columns:
+            self.save_array(os.path.join(temporary, column + '.npy'), np.ascontiguousarray(columns[column]))
+
+        os.rename(temporary, target)
+
+        return {'year': year, 'type': issue_type, 'path': path, 'rows': len(columns['id'])}
+
+    # Exports the signatures saved or changed since the last export as new partitions, and writes the partitions that
+    # held an older copy of the changed ones again without it
+    # @return The manifest entries of the new partitions
+    def export(self):
+        os.makedirs(self.__directory, exist_ok=True)
+        manifest = self.load_manifest()
+        rows = self.signature_handler().load_facts_changed_after(manifest['last_version'])
+
+        if not rows:
+            return []
+
+        # Dictionaries are written first, so that every value of the new partitions can be decoded
+        for column in self.dimension_columns:
+            self.export_dimension(column)
+
+        changed = np.array([row[0] for row in rows], dtype=np.int64)
+        kept = []
+        replaced = []
+        partitions = []
+
+        for partition in manifest['partitions']:
+            ids = np.load(os.path.join(self.__directory, partition['path'], 'id.npy'), mmap_mode='r')
+            stale = np.isin(ids, changed)
+
+            if not stale.any():
+                kept.append(partition)
+                continue
+
+            replaced.append(partition)
+            if stale.all():
+                continue
+
+            columns = {column: np.load(os.path.join(self.__directory, partition['path'], column + '.npy'))[~stale]
+                       for column in self.fact_columns}
+            partitions.append(self.write_partition(manifest, partition['year'], partition['type'], columns))
+
+        partition_rows = {}
+        for row in rows:
+            key = (row[5] or 'unknown', row[6] or 'unknown')
+            partition_rows.setdefault(key, []).append(row[:5])
+
+        for (year, issue_type), facts in sorted(partition_rows.items()):
+            facts = np.array(facts, dtype=np.int64)
+            columns = {column: facts[:, index] for index, column in enumerate(self.fact_columns)}
+            partitions.append(self.write_partition(manifest, year, issue_type, columns))
+
+        manifest['partitions'] = kept + partitions
+        manifest['last_version'] = rows[-1][7]
+        self.save_manifest(manifest)
+
+        # Readers that loaded the previous manifest keep the files they mapped open, even once they're removed
+        for partition in replaced:
+            shutil.rmtree(os.path.join(self.__directory, partition['path']), ignore_errors=True)
+
+        return partitions
+
+    # Writes the dictionary of a dimension, replacing the previous one. Dimensions only ever grow, so codes of
+    # partitions that were exported earlier can still be decoded.
+    # @param column The raw_signatures column whose values are exported, e.g. person_name
+    def export_dimension(self, column):
+        dimension = self.signature_handler().load_dimension(column)
+        ids = sorted(id for id in dimension if dimension[id] is not None)
+
+        directory = os.path.join(self.__directory, 'dictionaries')
+        os.makedirs(directory, exist_ok=True)
+
+        self.save_array(os.path.join(directory, column + '.ids.npy'), np.array(ids, dtype=np.int64))
+        self.save_array(os.path.join(directory, column + '.values.npy'),
+                        np.array([str(dimension[id]) for id in ids], dtype=str))
+
+    # Returns the manifest entries of the partitions that match the given years and types
+    # @param years A list of years, e.g. ['2016'], or None for all years
+    # @param types A list of issue types, e.g. ['Α'], or None for all types
+    def partitions(self, years = None, types = None):
+        return [partition for partition in self.load_manifest()['partitions']
+                if (years is None or partition['year'] in years) and (types is None or partition['type'] in types)]
+
+    # Loads fact columns into NumPy arrays. A single partition is returned memory mapped as it is, while more
+    # partitions are concatenated into one array per column.
+    # @param columns The fact columns to load, all of them by default
+    # @return A dictionary in the format column : array
+    def load_columns(self, columns = None, years = None, types = None):
+        columns = columns or self.fact_columns
+        partitions = self.partitions(years, types)
+        loaded = {}
+
+        for column in columns:
+            arrays = [np.load(os.path.join(self.__directory, partition['path'], column + '.npy'), mmap_mode='r')
+                      for partition in partitions]
+
+            if not arrays:
+                loaded[column] = np.empty(0, dtype=np.int64)
+            elif len(arrays) == 1:
+                loaded[column] = arrays[0]
+            else:
+                loaded[column] = np.concatenate(arrays)
+
+        return loaded
+
+    # Loads the dictionary of a dimension
+    # @param column The raw_signatures column, e.g. person_name
+    # @return A tuple containing the sorted ids and their values, both memory mapped
+    def load_dimension(self, column):
+        directory = os.path.join(self.__directory, 'dictionaries')
+
+        if not os.path.exists(os.path.join(directory, column + '.ids.npy')):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=str)
+
+        return np.load(os.path.join(directory, column + '.ids.npy'), mmap_mode='r'), \
+               np.load(os.path.join(directory, column + '.values.npy'), mmap_mode='r')
+
+    # Turns dimension ids into positions in the dimension's dictionary, -1 for ids that aren't in it
+    @staticmethod
+    def dictionary_codes(ids, values):
+        if not len(ids):
+            return np.full(len(values), -1, dtype=np.int64)
+
+        positions = np.searchsorted(ids, values)
+        clipped = np.minimum(positions, len(ids) - 1)
+
+        return np.where(ids[clipped] == values, clipped, -1)
+
+    # Loads the signatures into a pandas DataFrame in the shape of raw_signatures, with categorical columns built
+    # straight from the stored codes, and the year and type of each signature's issue
+    def load_frame(self, years = None, types = None):
+        import pandas as pd
+
+        partitions = self.partitions(years, types)
+        facts = self.load_columns(years=years, types=types)
+        frame = {'id': facts['id']}
+
+        for column in self.dimension_columns:
+            ids, values = self.load_dimension(column)
+            codes = self.dictionary_codes(ids, facts[self.dimension_columns[column]])
+            frame[column] = pd.Categorical.from_codes(codes, categories=pd.Index(values, dtype=object))
+
+        for key in ['year', 'type']:
+            labels = sorted(set(partition[key] for partition in partitions))
+            codes = [np.full(partition['rows'], labels.index(partition[key]), dtype=np.int64)
+                     for partition in partitions]
+
+            frame[key] = pd.Categorical.from_codes(np.concatenate(codes) if codes else np.empty(0, dtype=np.int64),
+                                                   categories=labels)
+
+        return pd.DataFrame(frame)
@@ -0,0 +1,133 @@
+from mmu.utility.helper import Helper
+import bisect
+import datetime
+
+
+# Finds the values whose time interval contains a date, e.g. the position a person held on the day an issue was
+# published. Intervals are grouped by a key (such as a person's id) and kept sorted by their start, so a lookup is a
+# binary search over the intervals of its key.
+class IntervalIndex:
+
+    # Dates used for intervals that are open on one side
+    open_start = ''
+    open_end = '9999-12-31 23:59:59'
+
+    def __init__(self):
+        self.__intervals = {}
+
+        # Per key, the starts of the sorted intervals and the latest end among each interval and the ones before it
+        self.__starts = {}
+        self.__max_ends = {}
+
+    # Turns a date into a string that sorts chronologically, no matter if it was stored as text, a datetime or a unix
+    # timestamp. Missing dates, stored as 0, turn into the given default.
+    @staticmethod
+    def date_key(date, default = open_start):
+        if date is None or date == 0 or date == '0' or date == '':
+            return default
+
+        if isinstance(date, (int, float)):
+            date = datetime.datetime.utcfromtimestamp(date)
+
+        if isinstance(date, datetime.datetime):
+            return date.strftime('%Y-%m-%d %H:%M:%S')
+
+        return str(date)
+
+    # Adds an interval. Missing dates leave the interval open on that side.
+    def add(self, key, date_from, date_to, value):
+        self.__intervals.setdefault(key, []).append((self.date_key(date_from, self.open_start),
+                                                     self.date_key(date_to, self.open_end), value))
+        self.__starts.pop(key, None)
+
+    # Sorts the intervals of a key, if new ones were added since the last lookup
+    def sort(self, key):
+        if key in self.__starts:
+            return
+
+        intervals = self.__intervals[key]
+        intervals.sort(key=lambda interval: interval[0])
+
+        max_ends = []
+        for start, end, value in intervals:
+            max_ends.append(max(end, max_ends[-1]) if max_ends else end)
+
+        self.__starts[key] = [interval[0] for interval in intervals]
+        self.__max_ends[key] = max_ends
+
+    # Finds the values of a key whose interval contains the date, starting with the one that started last
+    def find_all(self, key, date):
+        if key not in self.__intervals:
+            return
+
+        self.sort(key)
+        date = self.date_key(date)
+        intervals = self.__intervals[key]
+        max_ends = self.__max_ends[key]
+
+        index = bisect.bisect_right(self.__starts[key], date) - 1
+
+        # Going back stops as soon as no earlier interval ends after the date
+        while index >= 0 and max_ends[index] >= date:
+            start, end, value = intervals[index]
+            if end >= date:
+                yield value
+            index -= 1
+
+    # Finds the value of a key whose interval contains the date. When intervals overlap, e.g. during a reshuffle, the
+    # one that started last is returned.
+    # @return The value or None if no interval contains the date
+    def find(self, key, date):
+        return next(self.find_all(key, date), None)
+
+
+# Resolves the position and the cabinet of a signer at the date of a signature, using indexes over the positions and
+# cabinets tables that are loaded once, instead of queries per signature.
+class SignerIndex:
+
+    # @param person_handler The handler persons and their positions are loaded from
+    # @param cabinet_handler The handler cabinets are loaded from
+    def __init__(self, person_handler, cabinet_handler):
+        self.__person_handler = person_handler
+        self.__positions = IntervalIndex()
+        self.__cabinets = IntervalIndex()
+
+        for position in person_handler.load_positions():
+            self.__positions.add(position['person_id'], position['date_from'], position['date_to'], position)
+
+        for cabinet in cabinet_handler.load_all():
+            self.__cabinets.add(None, cabinet['date_from'], cabinet['date_to'], cabinet)
+
+        # Person ids by normalized name
+        self.__person_ids = {person['normalized_name']: person['id'] for person in person_handler.load_all()}
+
+    # Finds the id of a person by name. Names without an exact match are looked up once, with the fuzzy matching of
+    # PersonHandler.load_by_name.
+    # @return The id or None if the person is unknown
+    def person_id(self, name):
+        normalized_name = Helper.normalize_greek_name(name)
+
+        if normalized_name not in self.__person_ids:
+            person = self.__person_handler.load_by_name(normalized_name, fuzzy=True)
+            self.__person_ids[normalized_name] = person['id'] if person else None
+
+        return self.__person_ids[normalized_name]
+
+    # Finds the position a person held at a date
+    # @return The position, with its ministry's name under 'ministry', or None if the person held no known position
+    def position(self, name, date):
+        return self.__positions.find(self.person_id(name), date)
+
+    # Finds the cabinet that was in office at a date
+    # @return The cabinet or None
+    def cabinet(self, date):
+        return self.__cabinets.find(None, date)
+
+    # Adds the position and the cabinet at the signature's issue date to every signature
+    # @param signatures A list of dictionaries with at least the person_name and issue_date keys
+    def resolve(self, signatures):
+        for signature in signatures:
+            signature['position'] = self.position(signature['person_name'], signature['issue_date'])
+            signature['cabinet'] = self.cabinet(signature['issue_date'])
+
+        return signatures
@@ -20,6 +20,8 @@ from pdfminer.layout import LTImage
 from pdfminer.layout import LTFigure
 from pdfminer.layout import LTTextBoxHorizontal
 from pdfminer.layout import LTChar
+from pdfminer.layout import LTText
+from pdfminer.layout import LTPage
 from pdfminer.pdfpage import PDFPage
 from mmu.utility.helper import Helper
 
@@ -75,33 +77,51 @@ class CustomPDFParser:
         else:
             return False
 
-    # Analyzes the structure of the pdf file to correctly extract the signatures from the document.
-    def get_signatures_from_pdf(self, path, year=''):
-        codec = 'utf-8'
+    # Opens a pdf given by its path. Pdfs that are open already, e.g. read from the blob store, are returned as they are.
+    def open_pdf(self, path):
+        return path if hasattr(path, 'read') else open(path, 'rb')
+
+    # Lays out the pages of a pdf one by one
+    # @param path The path of the pdf or a binary file-like object
+    # @return A generator of the layout of every page, in order
+    def get_page_layouts(self, path):
         rsrcmgr = PDFResourceManager()
-        laparams = LAParams()
-        device = PDFPageAggregator(rsrcmgr=rsrcmgr,laparams=laparams)
-        fp = open(path, 'rb')
+        device = PDFPageAggregator(rsrcmgr=rsrcmgr, laparams=LAParams())
         interpreter = PDFPageInterpreter(rsrcmgr, device)
-        password = ""
-        maxpages = 0
-        caching = True
-        pagenos = set()
-        pages = PDFPage.get_pages(fp, pagenos, maxpages=maxpages, password=password, caching=caching,
-                                  check_extractable=True)
-
-        temp_pages = []
-        for page in pages:
-            temp_pages.append(page)
 
-        if not temp_pages:
-            return
-
-        first_page = temp_pages[0]
-        interpreter.process_page(first_page)
-        first_page_layout = device.get_result()
-        regulations = self.get_document_info(first_page_layout)
+        with self.open_pdf(path) as fp:
+            for page in PDFPage.get_pages(fp, set(), maxpages=0, password="", caching=True, check_extractable=True):
+                interpreter.process_page(page)
+                yield device.get_result()
 
+    # Analyzes the structure of the pdf file to correctly extract the signatures from the document.
+    # @param path The path of the pdf or a binary file-like object
+    def get_signatures_from_pdf(self, path, year=''):
+        return self.get_pages_and_signatures(path, year)[1]
+
+    # Extracts the text of every page of a pdf and the signatures of its regulations. Every page is laid out once, and
+    # both the page's text and the text the signatures are searched in are taken from its layout.
+    # @param path The path of the pdf or a binary file-like object
+    # @return A tuple with the text of every page and the regulations as get_signatures_from_pdf returns them
+    def get_pages_and_signatures(self, path, year=''):
+        pages = []
+        signature_texts = []
+        regulations = None
+
+        for index, page_layout in enumerate(self.get_page_layouts(path)):
+            if index == 0:
+                regulations = self.get_document_info(page_layout)
+
+            pages.append(self.text_from_layout(page_layout))
+            if regulations:
+                signature_texts.append(self.text_from_layout_objects(page_layout))
+
+        return pages, self.find_signatures(regulations, signature_texts, year)
+
+    # Finds the signatures of the regulations of a document in the text of its pages
+    # @param regulations The regulations of the document, as get_document_info returns them
+    # @param page_texts The text of every page, as text_from_layout_objects returns it
+    def find_signatures(self, regulations, page_texts, year=''):
         ignore_words = ['ΟI ΥΠΟΥΡΓΟI', 'ΤΑ ΜΕΛΗ', 'ΟΙ ΥΠΟΥΡΓΟΙ']
 
         if not regulations:
@@ -109,16 +129,10 @@ class CustomPDFParser:
 
         signature_sets = []
 
-
-
         # Start from the last page until all the required signature sets are found
-        for page in reversed(temp_pages):
-            # Get the page's layout
-            interpreter.process_page(page)
-            page_layout = device.get_result()
-
+        for page_text in reversed(page_texts):
             # Split text to line's for easier parsing
-            text_lines = self.text_from_layout_objects(page_layout).split("\n")
+            text_lines = page_text.split("\n")
 
             # Boolean indicating whether we are currently in a signature set
             # Save the data found
@@ -196,8 +210,6 @@ class CustomPDFParser:
 
         try:
             for layout_object in objects:
-                if getattr(layout_object, "get_text", False):
-                    print(layout_object.get_text())
                 if isinstance(layout_object, LTTextBoxHorizontal):
                     self.in_character_sequence = False
                     # text += layout_object.get_text()
@@ -374,6 +386,30 @@ class CustomPDFParser:
         # And finally return all information gathered about the document's regulations
         return self.find_regulations(action=action, type=type.replace("***", ""), text_items=text_items, index=index)
 
+    # Extracts the text of every page of a pdf file
+    # @param path The path of the pdf or a binary file-like object
+    # @return A list with the text of every page, in order
+    def get_pages_text(self, path):
+        return [self.text_from_layout(page_layout) for page_layout in self.get_page_layouts(path)]
+
+    # The plain text of a layout object, in the format of pdfminer's TextConverter: text boxes end with a new line and
+    # pages with a form feed
+    def text_from_layout(self, layout_object):
+        text = ""
+
+        if isinstance(layout_object, LTContainer):
+            for child in layout_object:
+                text += self.text_from_layout(child)
+        elif isinstance(layout_object, LTText):
+            text += layout_object.get_text()
+
+        if isinstance(layout_object, LTTextBox):
+            text += "\n"
+        elif isinstance(layout_object, LTPage):
+            text += "\f"
+
+        return text
+
     def convert_pdf_to_txt(self, path):
         start = timer()
         codec = 'utf-8'
@@ -0,0 +1,124 @@
+import time
+import threading
+
+from mmu.db.handlers.crawl import CrawlShardHandler
+from mmu.db.handlers.job import JobHandler
+from mmu.db.transaction import TransactionHandler
+
+
+# Raised by a shard's heartbeat once another worker took the shard over because its lease expired
+class LeaseLost(Exception):
+    pass
+
+
+# Splits a crawl into shards, ranges of issue numbers of a type and year, and crawls them with several workers at once.
+# Every shard is a job of the crawl queue, so the progress of the crawl is checkpointed in the database: a crawl that
+# is interrupted resumes with the shards it didn't finish, and shards left running by a crashed crawl are taken over
+# once their lease expires. The range that follows a shard is only known to exist once the shard finds issues, so each
+# type and year starts with one shard and a shard that found issues queues the next one.
+class CrawlScheduler:
+
+    queue = 'crawl'
+
+    # @param crawl The function that crawls a shard, called with its type, year, first and last number and a heartbeat,
+    #   e.g. Loader.crawl_range. It returns how many issues the search found, or None if the type can't be searched.
+    #   It calls the heartbeat every now and then, e.g. once per saved issue, to extend the shard's lease. The
+    #   heartbeat raises LeaseLost if the shard was taken over, which stops the crawl of the shard.
+    # @param workers How many shards are crawled at once
+    # @param shard_size How many issue numbers a shard covers
+    # @param lease How many seconds a worker holds a shard before it's considered crashed
+    # @param retry_delay How many seconds a failed shard waits before it's crawled again, after its first attempt
+    # @param poll_interval How many seconds an idle worker waits for other workers to queue more shards
+    def __init__(self, crawl, db_name = 'default', workers = 4, shard_size = 200, lease = 600, retry_delay = 60,
+                 poll_interval = 1):
+        self.__crawl = crawl
+        self.__db_name = db_name
+        self.__workers = workers
+        self.__shard_size = shard_size
+        self.__lease = lease
+        self.__retry_delay = retry_delay
+        self.__poll_interval = poll_interval
+        self.__shard_handler = CrawlShardHandler(db_name)
+        self.__job_handler = JobHandler(db_name, lease=lease)
+
+    # Queues the first shard of every type and year. Shards that were queued before keep their progress.
+    # @param years The years to crawl
+    # @param types The ids of the issue types on the search page
+    def plan(self, years, types):
+        shards = [{'year': year, 'type': type, 'number_from': 1, 'number_to': self.__shard_size}
+                  for year in years for type in types]
+
+        with self.__shard_handler.transaction():
+            self.__job_handler.enqueue(self.queue, self.__shard_handler.create_multiple(shards))
+
+    # Queues again the crawled shards of a year that may still get new issues, e.g. the current year's
+    def reopen(self, year):
+        with self.__shard_handler.transaction():
+            self.__job_handler.requeue(self.queue, self.__shard_handler.load_open_ids(year))
+
+    # Crawls the queued shards until none are left
+    # @return The amount of jobs of the crawl queue by status
+    def run(self):
+        threads = [threading.Thread(target=self.work, name='CrawlWorker-{}'.format(number))
+                   for number in range(self.__workers)]
+
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        return self.__job_handler.count_by_status(self.queue)
+
+    # A worker's loop. Workers stop once no shard is pending or running, since a running shard may still queue the
+    # one after it.
+    def work(self):
+        job_handler = JobHandler(self.__db_name, lease=self.__lease)
+
+        while True:
+            job = job_handler.claim(self.queue)
+
+            if not job:
+                counts = job_handler.count_by_status(self.queue)
+                if not counts.get('pending') and not counts.get('running'):
+                    break
+
+                time.sleep(self.__poll_interval)
+                continue
+
+            shard = self.__shard_handler.load_by_id(job['item_id'])
+            try:
+                results = self.__crawl(shard['type'], shard['year'], shard['number_from'], shard['number_to'],
+                                       self.heartbeat(job_handler, job['id']))
+            except LeaseLost as e:
+                # The worker that took the shard over crawls it, so nothing is saved or failed here
+                print(e)
+                continue
+            except Exception as e:
+                print("Crawling", dict(shard), "failed:", e)
+                job_handler.fail(job['id'], str(e), self.__retry_delay)
+                continue
+
+            # The shard's results and the next shard are only saved if the shard was still leased to this worker
+            with job_handler.transaction():
+                if job_handler.complete(job['id']):
+                    self.finish(shard, results, job_handler)
+
+        TransactionHandler.close_thread_connections()
+
+    # The heartbeat of a shard's job, which extends its lease
+    # @return A function that raises LeaseLost if the job's lease was lost
+    def heartbeat(self, job_handler, job_id):
+        def heartbeat():
+            if not job_handler.heartbeat(job_id):
+                raise LeaseLost("The lease of job {} was taken over by another worker".format(job_id))
+
+        return heartbeat
+
+    # Saves the results of a shard and queues the next shard of its type and year if it found any issues
+    def finish(self, shard, results, job_handler):
+        self.__shard_handler.set_results(shard['id'], results)
+
+        if results:
+            next_shard = {'year': shard['year'], 'type': shard['type'], 'number_from': shard['number_to'] + 1,
+                          'number_to': shard['number_to'] + self.__shard_size}
+            job_handler.enqueue(self.queue, self.__shard_handler.create_multiple([next_shard]))
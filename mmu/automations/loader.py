@@ -1,20 +1,23 @@
-import time
 import re
-from selenium import webdriver
-from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.support.ui import Select
-from selenium.common.exceptions import ElementNotVisibleException
-from bs4 import BeautifulSoup
 import os
 import errno
 import glob
 import os.path
 import datetime
-from http.client import RemoteDisconnected
+from http.client import RemoteDisconnected, HTTPException
 import platform
+import threading
+from concurrent.futures import as_completed
 
 from mmu.db.handlers.issue import IssueHandler
+from mmu.db.shards import Shards
 from mmu.utility.helper import Helper
+from mmu.utility.downloads import DownloadPool, DownloadError
+from mmu.utility.redirects import RedirectResolver
+from mmu.utility.rate_limit import HostRateLimiter
+from mmu.utility.blob_store import BlobStore
+from mmu.automations.crawler import CrawlScheduler
+from mmu.automations.search_client import SearchClient, SearchPage
 
 
 class Loader:
@@ -24,10 +27,51 @@ class Loader:
     __possible_issues = range(1, 16)
     __driver = None
 
-    def __init__(self, source):
+    # @param sharded Whether issues are saved in one database per year instead of the main database
+    # @param download_workers How many issues are downloaded at once
+    # @param per_host How many requests run at once against the same server
+    # @param browser Whether the search form is driven through Chrome instead of plain http requests, in case the
+    #   site changes in a way the search client can't follow
+    # @param rate_limit How many requests per second the crawl makes to each server at most, or None for no limit.
+    #   The crawl slows down on its own when a server is overloaded or slow to respond, and speeds up again after.
+    # @param blob_store The BlobStore downloaded pdfs are moved to, by default an uncompressed one under pdfs/store
+    # @param on_issue_saved Called with the title of every new issue once it's saved, e.g. to parse it right away
+    # @param db_name The database issues are saved to, and the one the year databases are kept next to when sharded
+    # @param timeout How many seconds a download page or a pdf may keep the crawl waiting for a response
+    def __init__(self, source, sharded = False, download_workers = 16, per_host = 4, browser = False,
+                 rate_limit = 10, blob_store = None, on_issue_saved = None, db_name = 'default', timeout = 240):
         self.__source = source
+        self.__db_name = db_name
+        self.__on_issue_saved = on_issue_saved
         self.download_links = []
         self.download_folder = os.path.join(os.getcwd(), 'pdfs')
+        self.__blob_store = blob_store or BlobStore()
+        self.__rate_limiter = HostRateLimiter(rate_limit, burst=max(int(rate_limit), 1),
+                                              slow_response=10) if rate_limit else None
+
+        # Every crawling thread searches with its own client, since a search's pages belong to its session
+        self.__search_clients = threading.local()
+
+        if browser:
+            self.start_browser()
+
+        self.__issue_handler = IssueHandler(db_name)
+        self.__shards = Shards(db_name) if sharded else None
+        self.__downloads = DownloadPool(max_workers=download_workers, per_host=per_host,
+                                        rate_limiter=self.__rate_limiter, timeout=timeout)
+        self.__resolver = RedirectResolver(self.__downloads.host_limit, timeout=timeout,
+                                           rate_limiter=self.__rate_limiter)
+
+        # The titles and the amount of issues of each type already saved, and the pdf urls found by earlier crawls,
+        # by year, loaded once per crawl
+        self.__known_titles = {}
+        self.__issue_counts = {}
+        self.__links = {}
+        self.__preload_lock = threading.Lock()
+
+    # Starts Chrome through chromedriver. Selenium is only needed in browser mode, so it's imported here.
+    def start_browser(self):
+        from selenium import webdriver
 
         chromeOptions = webdriver.ChromeOptions()
         prefs = {"download.default_directory": os.getcwd() + "\pdfs"}
@@ -39,20 +83,98 @@ class Loader:
         else:
             self.__driver = webdriver.Chrome(os.path.join(os.path.join(os.path.dirname(__file__), ".."), "../drivers/chromedriver.exe"),
                                             chrome_options=chromeOptions)
-        
-        self.__issue_handler = IssueHandler()
+
+    # The calling thread's search client
+    def search_client(self):
+        if not hasattr(self.__search_clients, 'client'):
+            self.__search_clients.client = SearchClient(self.__source, rate_limiter=self.__rate_limiter)
+
+        return self.__search_clients.client
+
+    # Returns the handler that saves issues of the given date or year, which is the year's shard in sharded mode
+    def issue_handler(self, date):
+        if self.__shards:
+            return self.__shards.handler(IssueHandler, date)
+
+        return self.__issue_handler
 
     def file_exists(self, directory, file_name, file_extension = 'pdf'):
-        return os.path.isfile(os.getcwd() + "\\" + directory + "\\" + file_name + '.' + file_extension)
+        return os.path.isfile(os.path.join(os.getcwd(), directory, file_name + '.' + file_extension))
 
-    def find_start_number(self, type, year):
-        conditions = {"type": [type], "date": [Helper.date_to_unix_timestamp(year), '>='],
-                      "issues.date": [Helper.date_to_unix_timestamp(str(int(year) + 1)), '<']}
-        issues = self.__issue_handler.load_all(conditions=conditions)
+    # Loads the titles and the amount of issues of each type saved for a year, unless they're loaded already. They're
+    # kept up to date as issues are saved, so a crawl queries each year once instead of once per result.
+    def preload(self, year):
+        year = int(year)
+        if year in self.__known_titles:
+            return
 
-        return len(issues)
+        with self.__preload_lock:
+            if year in self.__known_titles:
+                return
+
+            handler = self.issue_handler(year)
+            date_from, date_to = '{}-01-01'.format(year), '{}-01-01'.format(year + 1)
+            self.__issue_counts[year] = handler.count_by_type(date_from, date_to)
+            self.__links[year] = handler.load_links()
+            self.__known_titles[year] = handler.load_titles(date_from, date_to)
+
+    # Checks if an issue published at a date has been saved
+    def is_known(self, title, date):
+        self.preload(date.year)
+        return title in self.__known_titles[date.year]
+
+    def find_start_number(self, type, year):
+        self.preload(year)
+        return self.__issue_counts[int(year)].get(type, 0)
 
     def download_all_issues(self, type, year):
+        if self.__driver:
+            self.download_all_issues_with_browser(type, year)
+            return
+
+        # Indicates at which issue the next search must start
+        issue_type = self.search_client().issue_type(type)
+        num_start = self.find_start_number(issue_type, str(year)) if issue_type is not None else 0
+
+        while True:
+            num_results = self.crawl_range(type, year, num_start, num_start + 200)
+
+            # The maximum number of results is 200, so if the result contains 200 an additional search will be needed
+            if not num_results or num_results < 200:
+                break
+
+            num_start += 200
+
+    # Searches the issues of a type and year with numbers in a range and downloads the ones that aren't saved yet
+    # @param heartbeat Called after every page and every saved issue, e.g. to extend the lease of the range's shard
+    # @return The amount of issues the search found, or None if the type of issues can't be searched
+    def crawl_range(self, type, year, number_from, number_to, heartbeat = None):
+        client = self.search_client()
+
+        # Find the issue type
+        issue_type = client.issue_type(type)
+        if issue_type is None:
+            print("This type of issues is not available.")
+            return None
+
+        page = client.search(type, year, number_from, number_to)
+        num_results = page.num_results()
+
+        # If there are no results for the search we abort
+        if num_results == 0:
+            print("No results have been found")
+            return 0
+
+        for result_page in client.pages(page):
+            self.handle_results(result_page.rows(), issue_type, heartbeat)
+            if heartbeat:
+                heartbeat()
+
+        return num_results
+
+    def download_all_issues_with_browser(self, type, year):
+        from selenium.webdriver.support.ui import Select
+        from selenium.common.exceptions import ElementNotVisibleException
 
         driver = self.__driver
         driver.get(self.__source)
@@ -85,11 +207,11 @@ class Loader:
             driver.find_element_by_name("fekNumberTo").clear()
             driver.find_element_by_name("fekNumberTo").send_keys(str(num_start + 200))
 
-            # Submits the search form
+            # Submits the search form and waits for the results to replace the current page
+            page = driver.find_element_by_tag_name("html")
+            self.wait_for_rate()
             driver.find_element_by_name("search").click()
-
-            # Waits 1 second for the results to load
-            time.sleep(1)
+            self.wait_for_page(driver, page)
 
             count = 0
             num_results = 0
@@ -133,75 +255,129 @@ class Loader:
                 pages = driver.find_elements_by_class_name("pagination_field")
                 # Loads the next page of results
                 if current_page + 1 < len(pages):
+                    self.wait_for_rate()
                     pages[current_page + 1].click()
-                    time.sleep(1)
-
+                    self.wait_for_page(driver, pages[current_page + 1])
+
+    # Waits for the rate limit of the search page's server before the browser sends a request to it
+    def wait_for_rate(self):
+        if self.__rate_limiter:
+            self.__rate_limiter.acquire(self.__source)
+
+    # Waits until an element of the browser's page is gone, because a new page or a rebuilt DOM replaced it, and the
+    # new page is loaded, instead of sleeping for a fixed time that's either too long or too short
+    # @param timeout How many seconds to wait at most
+    def wait_for_page(self, driver, element, timeout = 30):
+        from selenium.webdriver.support.ui import WebDriverWait
+        from selenium.webdriver.support import expected_conditions
+
+        wait = WebDriverWait(driver, timeout, poll_frequency=0.1)
+        wait.until(expected_conditions.staleness_of(element))
+        wait.until(lambda driver: driver.execute_script('return document.readyState') == 'complete')
+
+    # Follows the redirects of an issue's download page and downloads its pdf. The redirects are skipped if an earlier
+    # crawl saved where they lead, unless the download from there fails, since the pdf may have moved. It runs in the
+    # download pool, so it only does network work and leaves saving the issue to the crawling thread.
+    # @param params The issue's params, with the url of its pdf under pdf_link if it's known
+    # @return A tuple with the reference of the downloaded file in the blob store, 'N/A' if the server disconnected or
+    #   None if the download failed, the url of the pdf or None if the redirects couldn't be followed, and the SHA-256
+    #   of the file. Issues whose download failed are left to the next crawl.
     def handle_download(self, download_page, params):
+        download_link = params.get('pdf_link')
+
+        if not download_link:
+            try:
+                # The download page redirects twice before the pdf
+                download_link = self.__resolver.resolve(download_page, hops=2)
+            except RemoteDisconnected as e:
+                print(e)
+                return 'N/A', None, None
+            except (OSError, HTTPException) as e:
+                # E.g. a timeout or a page that was cut off
+                print("Following the redirects of", params['issue_title'], "failed:", e)
+                return None, None, None
+
+        if download_link is None:
+            return None, None, None
 
         try:
-            # First we get the redirect link from the download page
-            html = Helper.get_url_contents(download_page)
-            beautiful_soup = BeautifulSoup(html, "html.parser")
-            meta = beautiful_soup.find("meta", {"http-equiv": "REFRESH"})
-            download_link = meta['content'].replace("0;url=", "")
-
-            # We do the same process twice because it involves 2 redirects.
-            beautiful_soup = BeautifulSoup(Helper.get_url_contents(download_link), "html.parser")
-            meta = beautiful_soup.find("meta", {"http-equiv": "REFRESH"})
-            download_link = meta['content'].replace("0;url=", "")
-        except RemoteDisconnected as e:
+            sha256 = self.__downloads.download(download_link, params['issue_title'] + ".pdf", self.download_folder)
+        except (DownloadError, OSError, HTTPException) as e:
             print(e)
-            self.__issue_handler.create(params['issue_title'], params['issue_type'], params['issue_number'],
-                                        'N/A', params['issue_date'])
-            return
 
-        if Helper.download(download_link, params['issue_title'] + ".pdf", self.download_folder):
-            issue_file = os.path.join(self.download_folder, params['issue_title'] + ".pdf")
-            self.__issue_handler.create(params['issue_title'], params['issue_type'], params['issue_number'],
-                                        issue_file, params['issue_date'])
+            if params.get('pdf_link'):
+                return self.handle_download(download_page, dict(params, pdf_link=None))
 
-    def extract_download_links(self, html, issue_type):
-        beautiful_soup = BeautifulSoup(html, "html.parser")
-        result_table = beautiful_soup.find("table", {"id": "result_table"})
-        rows = result_table.find_all("tr")
+            return None, download_link, None
 
-        if result_table.find("ul", {"id": "sitenav"}):
-            start_row = 2
-            end_row = -1
-        else:
-            start_row = 1
-            end_row = len(rows)
+        # Issues with the same pdf share one stored file
+        issue_file = self.__blob_store.put(os.path.join(self.download_folder, params['issue_title'] + ".pdf"), sha256)
+        return issue_file, download_link, sha256
 
-        # We ignore the first 2 rows if there's pagination or the first row if there's not and the last one
-        for row in rows[start_row:end_row]:
-            cells = row.find_all("td")
-            info_cell = cells[1].find("b")
-            download_cell = cells[2].find_all("a")
+    # Saves an issue once its download is done, along with the url of its pdf
+    # @param result The tuple handle_download returned
+    def save_issue(self, params, result):
+        issue_file, download_link, sha256 = result
+        year = params['issue_date'].year
+        self.preload(year)
 
-            info_cell_text = info_cell.get_text()
-            info_cell_text = ' '.join(info_cell_text.split())
-            info_cell_parts = info_cell_text.split(" - ")
+        if download_link and self.__links[year].get(params['issue_title']) != download_link:
+            self.issue_handler(params['issue_date']).save_link(params['issue_title'], download_link)
+            self.__links[year][params['issue_title']] = download_link
 
-            issue_title = info_cell_text
-            issue_date = info_cell_parts[1]
-            issue_title_first = issue_title.split("-")[0]
-            issue_number = re.search(pattern=r'\d+', string=issue_title_first).group(0)
+        if issue_file is None:
+            return
 
+        self.issue_handler(params['issue_date']).create(params['issue_title'], params['issue_type'],
+                                                        params['issue_number'], issue_file, params['issue_date'], sha256)
+        with self.__preload_lock:
+            counts = self.__issue_counts[year]
+            self.__known_titles[year].add(params['issue_title'])
+            counts[params['issue_type']] = counts.get(params['issue_type'], 0) + 1
+
+        if self.__on_issue_saved:
+            self.__on_issue_saved(params['issue_title'])
+
+    def extract_download_links(self, html, issue_type):
+        self.handle_results(SearchPage(html, "http://www.et.gr").rows(), issue_type)
+
+    # Downloads the issues of a results page that aren't saved yet
+    # @param rows The issues as SearchPage.rows returns them
+    # @param heartbeat Called after every saved issue
+    def handle_results(self, rows, issue_type, heartbeat = None):
+        # The params of the page's issues by their download, which runs in the pool while the rest of the rows are read
+        downloads = {}
+        titles = set()
+
+        for row in rows:
             # Skip saved items
-            if self.__issue_handler.load_by_title(issue_title):
+            if row['title'] in titles or self.is_known(row['title'], row['date']):
                 continue
 
-            date_parts = issue_date.split(".")
-            issue_unix_date = datetime.datetime(day=int(date_parts[0]), month=int(date_parts[1]),
-                                                year=int(date_parts[2]))
+            params = {"issue_title": row['title'], "issue_date": row['date'], "issue_number": row['number'],
+                      "issue_type": issue_type, "pdf_link": self.__links[row['date'].year].get(row['title'])}
+            future = self.__downloads.submit(self.handle_download, row['link'], params)
+            downloads[future] = params
+            titles.add(row['title'])
+
+        # Issues are saved in this thread, in the order their downloads complete. A download that failed unexpectedly
+        # doesn't keep the rest of the page from being saved.
+        for future in as_completed(downloads):
+            try:
+                result = future.result()
+            except Exception as e:
+                print("Downloading", downloads[future]['issue_title'], "failed:", e)
+                continue
 
-            download_path = download_cell[1]['href'] if len(download_cell) > 1 else download_cell[0]['href']
-            download_link = "http://www.et.gr" + download_path
-            params = {"issue_title": issue_title, "issue_date": issue_unix_date, "issue_number": issue_number,
-                      "issue_type": issue_type}
-            self.handle_download(download_link, params)
+            self.save_issue(downloads[future], result)
+            if heartbeat:
+                heartbeat()
 
-    def scrape_pdfs(self):
+    # Downloads the issues of a range of years
+    # @param types The ids of the issue types on the search page, all of them by default
+    # @param workers How many ranges of issues are searched at once. Ranges are checkpointed, so a crawl that is
+    #   interrupted resumes where it stopped. The browser only searches one range at a time.
+    def scrape_pdfs(self, year_start = 2016, year_end = 2017, types = None, workers = 4):
 
         # Creates the pdfs folder if not exists
         try:
@@ -209,11 +385,23 @@ class Loader:
         except OSError as e:
             if e.errno != errno.EEXIST:
                 raise
-        
 
-        year_start = 2016
-        year_end = 2017
+        types = types or self.__possible_issues
+
+        if self.__driver:
+            for year in range(year_start, year_end + 1):
+                # New issues are committed in batches instead of one by one
+                with self.issue_handler(year).batch(size=200, interval=30):
+                    for i in types:
+                        self.download_all_issues(i, year)
+            return
+
+        scheduler = CrawlScheduler(self.crawl_range, self.__db_name, workers=workers)
+        scheduler.plan(range(year_start, year_end + 1), types)
+
+        # Issues are still being published in the current year, so its last ranges are searched again
+        current_year = datetime.datetime.now().year
+        if year_start <= current_year <= year_end:
+            scheduler.reopen(current_year)
 
-        for year in range(year_start, year_end + 1):
-            for i in self.__possible_issues:
-                self.download_all_issues(i, year)
+        print(scheduler.run())
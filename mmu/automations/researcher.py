@@ -2,24 +2,35 @@ from mmu.db.handlers.ministry import MinistryHandler
 from mmu.db.handlers.cabinet import CabinetHandler
 from mmu.db.handlers.person import PersonHandler
 from mmu.utility.helper import Helper
+from mmu.utility.rate_limit import HostRateLimiter
 import datetime
 import urllib.request, urllib.parse, json, collections
 import re
+from concurrent.futures import ThreadPoolExecutor
 from bs4 import BeautifulSoup
 
 # Automatically finds information about past & current cabinet formations, ministers etc.
 class Researcher:
 
     # Default constructor for the researcher
-    def __init__(self):
+    # @param db_name The database the research is saved to
+    # @param rate_limiter The HostRateLimiter requests to wikipedia wait for, by default one that allows 5 requests
+    #   per second and slows down when wikipedia asks it to
+    # @param workers How many articles are fetched at once
+    def __init__(self, db_name = 'default', rate_limiter = None, workers = 4):
 
-        # Initialize ministry & cabinet handler in default database (no arguments)
-        self.__ministry_handler = MinistryHandler()
-        self.__cabinet_handler = CabinetHandler()
-        self.__person_handler = PersonHandler()
+        # Initialize ministry, cabinet & person handler in the research's database
+        self.__ministry_handler = MinistryHandler(db_name)
+        self.__cabinet_handler = CabinetHandler(db_name)
+        self.__person_handler = PersonHandler(db_name)
 
         # Helper class for utility and formatting functions
         self.__helper = Helper()
+        self.__rate_limiter = rate_limiter or HostRateLimiter(5, burst=5, slow_response=5)
+        self.__workers = workers
+
+        # The people looked up on wikipedia so far, by normalized name
+        self.__people = {}
 
     # Uses wikipedia's API to perform searches and returns the results from the JSON response as a list
     def wiki_search(self, keyword, limit = 10, lang = 'el'):
@@ -29,7 +40,7 @@ class Researcher:
              'format' : 'json', 'profile' : 'fuzzy'}
         link = link.format(lang=lang) + urllib.parse.urlencode(f)
 
-        return Helper.get_url_contents(link, 'json')
+        return Helper.get_url_contents(link, 'json', self.__rate_limiter)
 
     # Clears text from useless remaining markup elements
     def clear_text(self, text):
@@ -69,7 +80,7 @@ class Researcher:
 
     # Returns formatted information fetched from the table on the top right of wikipedia articles
     def wiki_synopsis_info(self, link):
-        html = Helper.get_url_contents(link)
+        html = Helper.get_url_contents(link, rate_limiter=self.__rate_limiter)
         soup = BeautifulSoup(html, 'html.parser')
         table = soup.find("table", {"class": "infobox"})
 
@@ -97,7 +108,7 @@ class Researcher:
 
     # Parses a wikipedia article's tables and returns all relevant information
     def wiki_article_info(self, link):
-        html = Helper.get_url_contents(link)
+        html = Helper.get_url_contents(link, rate_limiter=self.__rate_limiter)
         soup = BeautifulSoup(html, 'html.parser')
         tables = soup.find("div", {"id": "mw-content-text"}).find_all('table')
         tables_info = []
@@ -133,8 +144,8 @@ class Researcher:
 
         return tables_info
 
-    # Creates new records for the ministries that we don't have saved
-    def save_ministry(self, name, description, params):
+    # Returns the values of a ministry record from the information found about it
+    def ministry_values(self, name, description, params):
         established = 0
         disbanded = 0
 
@@ -144,11 +155,14 @@ class Researcher:
         if 'κατάργηση' in params:
             disbanded = Helper.date_to_unix_timestamp(params['κατάργηση'])
 
-        ministry = self.__ministry_handler.load_by_name(name)
-        if not ministry:
-            self.__ministry_handler.create(name, description, established, disbanded)
+        return {'name': name, 'description': description, 'established': established, 'disbanded': disbanded}
 
-    def save_cabinet(self, title, description, params):
+    # Creates new records for the ministries that we don't have saved
+    def save_ministry(self, name, description, params):
+        self.__ministry_handler.create_multiple([self.ministry_values(name, description, params)])
+
+    # Returns the values of a cabinet record from the information found about it
+    def cabinet_values(self, title, description, params):
 
         date_from = 0
         date_to = 0
@@ -159,10 +173,11 @@ class Researcher:
         if 'ημερομηνία διάλυσης' in params:
             date_to = Helper.date_to_unix_timestamp(params['ημερομηνία διάλυσης'])
 
-        cabinet  = self.__cabinet_handler.load_by_title(title)
+        return {'title': title, 'description': description, 'date_from': date_from, 'date_to': date_to}
 
-        if not cabinet:
-            self.__cabinet_handler.create(title, description, date_from, date_to)
+    # Creates new records for the cabinets that we don't have saved
+    def save_cabinet(self, title, description, params):
+        self.__cabinet_handler.create_multiple([self.cabinet_values(title, description, params)])
 
 
 
@@ -177,6 +192,7 @@ class Researcher:
                         'Υπουργείο Εσωτερικών Υποθέσεων (Ρωσία)']
 
 
+        ministries = []
         for key, ministry_name in enumerate(ministries_wiki[1]):
             ministry_name = ministry_name.replace(" (Ελλάδα)", "")
             if ministry_name not in ignore_titles:
@@ -185,7 +201,10 @@ class Researcher:
 
                 ministry_info = self.wiki_synopsis_info(wiki_link)
 
-                self.save_ministry(ministry_name, ministry_description, ministry_info)
+                ministries.append(self.ministry_values(ministry_name, ministry_description, ministry_info))
+
+        # Saves all ministries at once, skipping the ones we already have
+        self.__ministry_handler.create_multiple(ministries)
 
     # Researches and saves information about cabinets
     def research_cabinets(self):
@@ -199,109 +218,156 @@ class Researcher:
                          'Κυβέρνηση Εθνικής Αμύνης', 'Κυβέρνηση Καποδίστρια', 'Κυβέρνηση της Τσεχικής Δημοκρατίας',
                          'Κυβέρνηση του Ηνωμένου Βασιλείου Ντέιβιντ Κάμερον 2010', 'Κυβέρνηση Μίλαν Ατσίμοβιτς 1941',
                          'Κυβέρνηση του Ηνωμένου Βασιλείου', 'Κυβέρνηση Νίκου Αναστασιάδη 2013']
-        #
+        cabinets = []
         for key, cabinet_name in enumerate(cabinets_wiki[1]):
             if cabinet_name not in ignore_titles:
                 cabinet_description = cabinets_wiki[2][key]
                 wiki_link = cabinets_wiki[3][key]
                 cabinet_info = self.wiki_synopsis_info(wiki_link)
 
-                self.save_cabinet(cabinet_name, cabinet_description, cabinet_info)
-
-    # Researches and saves information about people and their positions
-    def research_positions(self):
-        ministries = self.__ministry_handler.load_all()
+                cabinets.append(self.cabinet_values(cabinet_name, cabinet_description, cabinet_info))
 
-        for ministry in ministries:
-            ministry_id = ministry['id']
-            ministry_name = ministry['name']
+        # Saves all cabinets at once, skipping the ones we already have
+        self.__cabinet_handler.create_multiple(cabinets)
 
+    # Finds the people listed in the tables of a ministry's wikipedia article, along with their terms. It only reads
+    # from wikipedia, so it can run in any thread.
+    # @return A list of dictionaries with each person's normalized name, the dates their term started and ended and the
+    #   title of their cabinet, which is empty if the article couldn't be fetched or parsed
+    def ministry_terms(self, ministry_name):
+        try:
             ministry_search = self.wiki_search(ministry_name, 1)
-            link =  ministry_search[3][0]
+            if len(ministry_search) < 4 or not ministry_search[3]:
+                return []
+
+            return self.article_terms(self.wiki_article_info(ministry_search[3][0]))
+        except Exception as e:
+            print("Researching the positions of", ministry_name, "failed:", e)
+            return []
+
+    # Finds the people listed in the tables of an article, as wiki_article_info returns them, along with their terms
+    def article_terms(self, info):
+        terms = []
+
+        for table in info:
+            # Make sure this table contains people
+            if table:
+                first_row = table[0]
+            else:
+                continue
 
-            info = self.wiki_article_info(link)
+            if 'Όνομα' in first_row or 'Ονοματεπώνυμο' in first_row or 'Υπουργός' in first_row:
+                for row in table:
 
-            for table in info:
-                # Make sure this table contains people
-                if table:
-                    first_row = table[0]
-                else:
-                    continue
+                    if 'Ονοματεπώνυμο' in row:
+                        name = row['Ονοματεπώνυμο']
+                    elif 'Όνομα' in row:
+                        name = row['Όνομα']
+                    elif 'Υπουργός' in row:
+                        name = row['Υπουργός']
+                    else:
+                        continue
 
-                if 'Όνομα' in first_row or 'Ονοματεπώνυμο' in first_row or 'Υπουργός' in first_row:
-                    for row in table:
+                    date_from = 0
+                    date_to = 0
+                    cabinet_title = None
 
-                        if 'Ονοματεπώνυμο' in row:
-                            name = row['Ονοματεπώνυμο']
-                        elif 'Όνομα' in row:
-                            name = row['Όνομα']
-                        elif 'Υπουργός' in row:
-                            name = row['Υπουργός']
-                        else:
-                            continue
+                    if 'Έναρξη Θητείας' in row:
+                        date_from = Helper.date_to_unix_timestamp(row['Έναρξη Θητείας'])
 
-                        name = self.__helper.normalize_greek_name(name)
-                        date_from = 0
-                        date_to = 0
-                        cabinet_title = ""
-                        cabinet_id = None
+                    if 'Λήξη Θητείας' in row:
+                        date_to = Helper.date_to_unix_timestamp(row['Λήξη Θητείας'])
 
-                        if 'Έναρξη Θητείας' in row:
-                            date_from = Helper.date_to_unix_timestamp(row['Έναρξη Θητείας'])
+                    if 'Κυβέρνηση' in row:
+                        cabinet_title = row['Κυβέρνηση']
 
-                        if 'Λήξη Θητείας' in row:
-                            date_to = Helper.date_to_unix_timestamp(row['Λήξη Θητείας'])
+                    terms.append({'name': self.__helper.normalize_greek_name(name), 'date_from': date_from,
+                                  'date_to': date_to, 'cabinet_title': cabinet_title})
 
-                        if 'Κυβέρνηση' in row:
-                            cabinet_title = row['Κυβέρνηση']
-                            cabinet = self.__cabinet_handler.load_by_title(cabinet_title)
-                            if cabinet:
-                                cabinet_id = cabinet['id']
+        return terms
 
-                        person = self.__person_handler.load_by_name(name)
+    # Researches and saves information about people and their positions. The articles of the ministries are fetched
+    # at once, and so are the people they list that aren't saved yet, each one only once even though most of them are
+    # listed by several ministries. Everything is saved together at the end. A ministry or a person whose article
+    # fails is skipped along with its positions, and is researched again by the next research.
+    def research_positions(self):
+        ministries = self.__ministry_handler.load_all()
 
-                        if not person:
-                            self.research_person(name)
-                            person = self.__person_handler.load_by_name(name)
+        # Cabinet ids by title, loaded once instead of once per table row
+        cabinet_ids = {cabinet['title']: cabinet['id'] for cabinet in self.__cabinet_handler.load_all()}
 
-                        person_id = person['id']
-                        role = 'Υπουργός'
+        with ThreadPoolExecutor(max_workers=self.__workers, thread_name_prefix='Researcher') as executor:
+            ministry_terms = list(executor.map(self.ministry_terms, [ministry['name'] for ministry in ministries]))
 
-                        position = self.__person_handler.load_position({'person_id' : [person_id],
-                                                                        'ministry_id' : [ministry_id],
-                                                                        'date_from' : [date_from],
-                                                                        'role' : [role]})
+            names = set(term['name'] for terms in ministry_terms for term in terms)
+            persons = {name: self.__person_handler.load_by_name(name) for name in names}
+            missing = sorted(name for name, person in persons.items() if not person)
 
-                        if not position:
-                            self.__person_handler.save_position(role, date_from, date_to, person_id,
-                                                                ministry_id, cabinet_id)
+            researched = [person for person in executor.map(self.fetch_person, missing) if person]
 
-    # Finds information from wikipedia (if available) on a person given his name
-    def research_person(self, name):
-        normalized_name = self.__helper.normalize_greek_name(name)
-        person = self.__person_handler.load_by_name(normalized_name)
+        # Persons that are already saved are skipped
+        self.__person_handler.create_multiple(researched)
+        for name in missing:
+            persons[name] = self.__person_handler.load_by_name(name)
 
-        wiki_search = self.wiki_search(name, 1)
-        link = wiki_search[3][0] if len(wiki_search[3]) > 0 else wiki_search[3]
+        positions = []
+        for ministry, terms in zip(ministries, ministry_terms):
+            for term in terms:
+                if not persons[term['name']]:
+                    continue
+
+                positions.append({'role': 'Υπουργός', 'date_from': term['date_from'], 'date_to': term['date_to'],
+                                  'person_id': persons[term['name']]['id'], 'ministry_id': ministry['id'],
+                                  'cabinet_id': cabinet_ids.get(term['cabinet_title'])})
+
+        # Saves all positions at once, skipping the ones we already have
+        self.__person_handler.save_positions(positions)
+
+    # Finds information from wikipedia (if available) on a person given his name, without saving it. People are only
+    # looked up once per researcher, and it only reads from wikipedia, so it can run in any thread.
+    # @return A dictionary with the person's normalized name, political party and birthdate, as PersonHandler.create
+    #   takes them, or None if their article couldn't be fetched or parsed, in which case they're looked up again the
+    #   next time
+    def fetch_person(self, name):
+        normalized_name = self.__helper.normalize_greek_name(name)
+        if normalized_name in self.__people:
+            return self.__people[normalized_name]
 
         birthdate = 0
         political_party = ""
 
-        if link:
-            synopsis = self.wiki_synopsis_info(link)
+        try:
+            wiki_search = self.wiki_search(name, 1)
+            link = wiki_search[3][0] if len(wiki_search) > 3 and wiki_search[3] else None
+
+            if link:
+                synopsis = self.wiki_synopsis_info(link)
 
-            if 'γέννηση' in synopsis:
-                birthdate = Helper.date_to_unix_timestamp(synopsis['γέννηση'])
+                if 'γέννηση' in synopsis:
+                    birthdate = Helper.date_to_unix_timestamp(synopsis['γέννηση'])
 
-            if 'πολιτικό κόμμα' in synopsis:
-                political_party = synopsis['πολιτικό κόμμα']
+                if 'πολιτικό κόμμα' in synopsis:
+                    political_party = synopsis['πολιτικό κόμμα']
+        except Exception as e:
+            print("Researching", name, "failed:", e)
+            return None
+
+        person = {'name': normalized_name, 'political_party': political_party, 'birthdate': birthdate}
+        self.__people[normalized_name] = person
+        return person
+
+    # Finds information from wikipedia (if available) on a person given his name and saves it
+    def research_person(self, name):
+        person = self.fetch_person(name)
 
-        # Make sure to avoid duplicate saving
-        if not person:
-            self.__person_handler.create(normalized_name, political_party, birthdate)
+        # Persons that are already saved are skipped
+        if person:
+            self.__person_handler.create(**person)
 
     # Starts the research process
     def research(self):
-        self.research_ministries()
-        self.research_cabinets()
-        self.research_positions()
\ No newline at end of file
+        # All handlers share the same connection, so a single batch covers everything saved during the research
+        with self.__person_handler.batch(size=500, interval=30):
+            self.research_ministries()
+            self.research_cabinets()
+            self.research_positions()
\ No newline at end of file
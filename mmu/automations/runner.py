@@ -0,0 +1,96 @@
+import threading
+
+from mmu.automations.loader import Loader
+from mmu.analysis.analyzer import Analyzer
+from mmu.db.handlers.issue import IssueHandler
+from mmu.db.transaction import TransactionHandler
+from mmu.db.writer import DatabaseWriter
+from mmu.utility.pipeline import Pipeline
+
+
+# Crawls the gazette and extracts the signatures of new issues while the crawl goes on, instead of after it: every
+# issue the crawl saves goes straight to a parse worker, and what the parser extracts goes to the database writer.
+# The stages have their own concurrency and are connected by bounded queues, so a crawl that's faster than the parsers
+# waits for them instead of queuing the whole archive in memory:
+#   search (crawl_workers) -> download (download_workers) -> parse (parse_workers) -> store (DatabaseWriter)
+class PipelineRunner:
+
+    # @param source The url of the search page
+    # @param crawl_workers How many ranges of issue numbers are searched at once
+    # @param download_workers How many issues are downloaded at once
+    # @param parse_workers How many issues are parsed at once
+    # @param max_pending How many saved issues can wait for a parse worker before the crawl blocks, and how many
+    #   extractions can wait for the writer before the parse workers block
+    # @param rate_limit How many requests per second the crawl makes to each server at most, or None for no limit
+    # @param db_name The database issues and their signatures are saved to
+    def __init__(self, source, crawl_workers = 4, download_workers = 16, parse_workers = 2, max_pending = 50,
+                 rate_limit = 10, db_name = 'default'):
+        self.__crawl_workers = crawl_workers
+        self.__db_name = db_name
+        self.__issue_handler = IssueHandler(db_name)
+        self.__writer = DatabaseWriter(db_name, max_pending=max_pending)
+
+        # The pdf parser keeps state while it reads a file, so every parse worker has its own analyzer
+        self.__analyzers = threading.local()
+
+        self.__pipeline = Pipeline(on_worker_exit=TransactionHandler.close_thread_connections)
+        self.__pipeline.add_stage('parse', self.parse, workers=parse_workers, max_pending=max_pending)
+        self.__pipeline.add_stage('store', self.store, workers=1, max_pending=max_pending)
+
+        self.__loader = Loader(source, download_workers=download_workers, rate_limit=rate_limit,
+                               on_issue_saved=self.issue_saved, db_name=db_name)
+
+    # The calling thread's analyzer
+    def analyzer(self):
+        if not hasattr(self.__analyzers, 'analyzer'):
+            self.__analyzers.analyzer = Analyzer(db_name=self.__db_name)
+
+        return self.__analyzers.analyzer
+
+    # Called by the crawl with the title of every issue it saves, which is passed on to a parse worker
+    def issue_saved(self, issue_title):
+        self.__pipeline.put(issue_title)
+
+    # Searches the issues of a range of years and saves the new ones
+    def crawl(self, year_start, year_end, types):
+        self.__loader.scrape_pdfs(year_start, year_end, types, workers=self.__crawl_workers)
+
+    # The parse stage: extracts the signatures of a saved issue
+    # @return A tuple with the issue and what Analyzer.extract_issue returned, or None if the issue is skipped
+    def parse(self, issue_title):
+        analyzer = self.analyzer()
+        issue = self.__issue_handler.load_by_title(issue_title)
+
+        # Issues that aren't committed yet or whose files are broken are left to the extraction that follows the crawl
+        if not issue or issue['analyzed'] or not analyzer.is_extractable(issue) or not analyzer.is_verified(issue):
+            return None
+
+        pages, raw_signatures = analyzer.extract_issue(issue)
+        return issue, pages, raw_signatures
+
+    # The store stage: hands an extraction to the database writer, which commits it along with the ones around it.
+    # Once the writer's queue is full this blocks, and so do the parse workers behind it.
+    def store(self, extraction):
+        issue, pages, raw_signatures = extraction
+        future = self.__writer.submit(self.analyzer().save_extraction, issue, pages, raw_signatures)
+        future.add_done_callback(lambda done: self.report(issue, done))
+
+    # Reports a save that failed once the writer is done with it
+    def report(self, issue, future):
+        if future.exception():
+            print("Saving the signatures of", issue['title'], "failed:", future.exception())
+
+    # Crawls the issues of a range of years, extracting their signatures as they're saved. Issues the pipeline
+    # skipped, and issues saved by earlier runs that were never analyzed, are extracted once the crawl is done. If the
+    # crawl fails, what the pipeline extracted until then is still saved.
+    # @return How many issues each stage handled and how many of them failed
+    def run(self, year_start = 2016, year_end = 2017, types = None):
+        try:
+            with self.__pipeline:
+                self.crawl(year_start, year_end, types)
+        finally:
+            self.__writer.close()
+
+        self.analyzer().start_signature_extraction()
+
+        return self.__pipeline.counts()
@@ -0,0 +1,245 @@
+import re
+import datetime
+import urllib.request
+import urllib.parse
+import http.cookiejar
+from html.parser import HTMLParser
+
+
+# Reads the parts of the gazette's search pages the crawl needs: the search form with its fields, the labels of the
+# issue types, the rows of the results table, the pagination and the text of the messages
+class SearchPageParser(HTMLParser):
+
+    def __init__(self):
+        HTMLParser.__init__(self, convert_charrefs=True)
+        self.forms = {}
+        self.labels = {}
+        self.result_rows = []
+        self.pagination = []
+        self.has_sitenav = False
+        self.text = []
+
+        self.__form = None
+        self.__select = None
+        self.__label = None
+        self.__table_depth = 0
+        self.__cell = None
+        self.__bold = False
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict((name, value if value is not None else '') for name, value in attrs)
+
+        if 'pagination_field' in attrs.get('class', '').split():
+            self.pagination.append(attrs)
+
+        if tag == 'form':
+            self.__form = {'action': attrs.get('action', ''), 'method': attrs.get('method', 'get').lower(),
+                           'fields': {}, 'checkboxes': {}, 'submits': {}}
+            self.forms[attrs.get('name') or attrs.get('id') or len(self.forms)] = self.__form
+        elif tag == 'input' and self.__form is not None and attrs.get('name'):
+            self.add_input(attrs)
+        elif tag == 'select' and self.__form is not None:
+            self.__select = attrs.get('name')
+        elif tag == 'option' and self.__select:
+            # The first option is selected unless another one is
+            if self.__select not in self.__form['fields'] or 'selected' in attrs:
+                self.__form['fields'][self.__select] = attrs.get('value', '')
+        elif tag == 'label' and attrs.get('id', '').startswith('label-issue-id-'):
+            self.__label = attrs['id'].replace('label-issue-id-', '')
+            self.labels[self.__label] = ''
+        elif tag == 'table' and (self.__table_depth or attrs.get('id') == 'result_table'):
+            self.__table_depth += 1
+        elif self.__table_depth == 1:
+            self.handle_result_tag(tag, attrs)
+
+    def add_input(self, attrs):
+        input_type = attrs.get('type', 'text').lower()
+        name = attrs['name']
+
+        if input_type == 'checkbox':
+            self.__form['checkboxes'][name] = attrs.get('value') or 'on'
+            if 'checked' in attrs:
+                self.__form['fields'][name] = self.__form['checkboxes'][name]
+        elif input_type in ('submit', 'button', 'image'):
+            self.__form['submits'][name] = attrs.get('value', '')
+        elif input_type != 'radio' or 'checked' in attrs:
+            self.__form['fields'][name] = attrs.get('value', '')
+
+    def handle_result_tag(self, tag, attrs):
+        if tag == 'tr':
+            self.result_rows.append([])
+            self.__cell = None
+        elif tag == 'td' and self.result_rows:
+            self.__cell = {'bold': '', 'links': []}
+            self.result_rows[-1].append(self.__cell)
+        elif tag == 'b' and self.__cell is not None:
+            self.__bold = True
+        elif tag == 'a' and self.__cell is not None and attrs.get('href'):
+            self.__cell['links'].append(attrs['href'])
+        elif tag == 'ul' and attrs.get('id') == 'sitenav':
+            self.has_sitenav = True
+
+    def handle_endtag(self, tag):
+        if tag == 'form':
+            self.__form = None
+        elif tag == 'select':
+            self.__select = None
+        elif tag == 'label':
+            self.__label = None
+        elif tag == 'table' and self.__table_depth:
+            self.__table_depth -= 1
+        elif tag == 'b':
+            self.__bold = False
+        elif tag == 'td':
+            self.__cell = None
+
+    def handle_data(self, data):
+        self.text.append(data)
+
+        if self.__label is not None:
+            self.labels[self.__label] += data
+
+        if self.__bold and self.__cell is not None:
+            self.__cell['bold'] += data
+
+
+# A page of search results, parsed once
+class SearchPage:
+
+    results_pattern = re.compile(r'Βρέθηκαν\s+(\d+)\s+αποτελέσματα')
+
+    # @param url The url the page was loaded from, which relative links are resolved against
+    def __init__(self, html, url = ''):
+        self.html = html
+        self.url = url
+        self.parser = SearchPageParser()
+        self.parser.feed(html)
+        self.parser.close()
+
+    # The amount of results the search found in total, 0 if the page shows none
+    def num_results(self):
+        match = self.results_pattern.search(' '.join(''.join(self.parser.text).split()))
+        return int(match.group(1)) if match else 0
+
+    # The issues on the page
+    # @return A list of dictionaries with the title, date, number and download link of each issue
+    def rows(self):
+        rows = self.parser.result_rows
+
+        # The first 2 rows and the last one are navigation if there's pagination, otherwise only the first one is a
+        # header
+        rows = rows[2:-1] if self.parser.has_sitenav else rows[1:]
+
+        issues = []
+        for cells in rows:
+            if len(cells) < 3 or not cells[1]['bold'] or not cells[2]['links']:
+                continue
+
+            title = ' '.join(cells[1]['bold'].split())
+            issue_date = title.split(" - ")[1]
+            number = re.search(pattern=r'\d+', string=title.split("-")[0]).group(0)
+            date_parts = issue_date.split(".")
+            links = cells[2]['links']
+
+            issues.append({'title': title, 'number': number,
+                           'date': datetime.datetime(day=int(date_parts[0]), month=int(date_parts[1]),
+                                                     year=int(date_parts[2])),
+                           'link': urllib.parse.urljoin(self.url, links[1] if len(links) > 1 else links[0])})
+
+        return issues
+
+
+# Searches the gazette with plain http requests, posting the fields of its search form the way the browser would,
+# instead of driving a browser. The session's cookies are kept between requests.
+class SearchClient:
+
+    # @param source The url of the search page, e.g. http://www.et.gr/idocs-nph/search/fekForm.html
+    # @param form_name The name of the search form on the page
+    # @param rate_limiter A HostRateLimiter every request waits for, e.g. one shared by the whole crawl
+    def __init__(self, source, form_name = 'fekForm', timeout = 60, rate_limiter = None):
+        self.__source = source
+        self.__form_name = form_name
+        self.__timeout = timeout
+        self.__opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+        self.__form = None
+        self.__labels = {}
+        self.__last_fields = None
+        self.__rate_limiter = rate_limiter
+
+    # Requests a page and parses it
+    # @param fields The fields to send, in which case the request is a POST unless method says otherwise
+    def request(self, url, fields = None, method = 'post'):
+        data = None
+
+        if fields is not None and method == 'post':
+            data = urllib.parse.urlencode(fields).encode('utf-8')
+        elif fields is not None:
+            url = url + ('&' if '?' in url else '?') + urllib.parse.urlencode(fields)
+
+        if self.__rate_limiter:
+            response = self.__rate_limiter.open(url, data, self.__timeout, self.__opener)
+        else:
+            response = self.__opener.open(url, data=data, timeout=self.__timeout)
+
+        with response:
+            charset = response.headers.get_content_charset() or 'utf-8'
+            return SearchPage(response.read().decode(charset, errors='replace'), response.geturl())
+
+    # Loads the search page once, for its form and the labels of the issue types
+    def load_form(self):
+        if self.__form is not None:
+            return self.__form
+
+        page = self.request(self.__source)
+        if self.__form_name not in page.parser.forms:
+            raise ValueError("The search page has no form named " + self.__form_name)
+
+        self.__form = page.parser.forms[self.__form_name]
+        self.__form['url'] = urllib.parse.urljoin(page.url, self.__form['action'])
+        self.__labels = page.parser.labels
+        return self.__form
+
+    # The name of an issue type as the search page shows it, e.g. ΠΡΩΤΟ (Α)
+    # @param type The id of the issue type on the search page
+    # @return The name, or None if the type can't be searched
+    def issue_type(self, type):
+        form = self.load_form()
+        if "chbIssue_" + str(type) not in form['checkboxes']:
+            return None
+
+        return ' '.join(self.__labels.get(str(type), '').split())
+
+    # Searches the issues of a type and year with numbers in a range
+    # @return The first page of results
+    def search(self, type, year, number_from, number_to):
+        form = self.load_form()
+        fields = dict(form['fields'])
+
+        # Only the chosen type is checked, along with the submit button the browser would click
+        for checkbox in form['checkboxes']:
+            if checkbox.startswith('chbIssue_'):
+                fields.pop(checkbox, None)
+
+        fields.update({'year': str(year), 'fekNumberFrom': str(number_from), 'fekNumberTo': str(number_to),
+                       "chbIssue_" + str(type): form['checkboxes']["chbIssue_" + str(type)]})
+        if 'search' in form['submits']:
+            fields['search'] = form['submits']['search']
+
+        self.__last_fields = fields
+        return self.request(form['url'], fields, form['method'])
+
+    # Goes through the pages of a search's results, starting with the page search returned. Pagination fields that
+    # are links are followed, the rest are sent as a field of the search form, like a click on them would.
+    def pages(self, first_page):
+        yield first_page
+
+        form = self.load_form()
+        for field in first_page.parser.pagination[1:]:
+            href = field.get('href', '')
+
+            if href and href != '#' and not href.startswith('javascript:'):
+                yield self.request(urllib.parse.urljoin(first_page.url, href))
+            elif field.get('name'):
+                fields = dict(self.__last_fields)
+                fields[field['name']] = field.get('value', '')
+                yield self.request(form['url'], fields, form['method'])
@@ -3,14 +3,23 @@ from mmu.db.transaction import TransactionHandler
 # Handler class for altering and creating cabinets data
 class CabinetHandler(TransactionHandler):
 
-    def __int__(self, db_name = 'default'):
-        TransactionHandler.__init__(self, db_name)
+    def __init__(self, db_name = 'default', **options):
+        TransactionHandler.__init__(self, db_name, **options)
 
-    # Creates a new cabinet
+    # Creates a new cabinet, unless a cabinet with the same title already exists
     def create(self, title, description, date_from, date_to):
         params = {'title' : title, 'description' : description, 'date_from' : date_from,
                   'date_to' : date_to}
-        TransactionHandler.insert(self,table='cabinets',params=params)
+        TransactionHandler.upsert(self, table='cabinets', params=params, conflict_columns=['title'])
+
+    # Creates multiple cabinets at once, skipping the ones that already exist
+    # @param cabinets A list of dictionaries with the same keys as create's parameters
+    def create_multiple(self, cabinets):
+        TransactionHandler.upsert_multiple(self, 'cabinets', cabinets, conflict_columns=['title'])
+
+    # Loads all cabinets
+    def load_all(self):
+        return TransactionHandler.select_all(self, 'cabinets')
 
     # Updates a cabinet given its id
     def update(self, id, params):
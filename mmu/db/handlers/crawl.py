@@ -0,0 +1,41 @@
+from mmu.db.transaction import TransactionHandler
+
+# Handler class for the shards of the crawl, i.e. the ranges of issue numbers searched by the crawl's workers
+class CrawlShardHandler(TransactionHandler):
+
+    def __init__(self, db_name = 'default', **options):
+        TransactionHandler.__init__(self, db_name, **options)
+
+    # Creates shards, skipping the ones that already exist
+    # @param shards A list of dictionaries with the year, type, number_from and number_to keys
+    # @return The ids of the shards, in the same order
+    def create_multiple(self, shards):
+        TransactionHandler.upsert_multiple(self, 'crawl_shards', shards,
+                                           conflict_columns=['year', 'type', 'number_from'])
+
+        return [self.load_id(shard['year'], shard['type'], shard['number_from']) for shard in shards]
+
+    # Loads the id of the shard of a type and year that starts at a number
+    def load_id(self, year, type, number_from):
+        conditions = {'year': [year], 'type': [type], 'number_from': [number_from]}
+        return TransactionHandler.select_value(self, 'crawl_shards', 'id', conditions)
+
+    # Loads a shard by id
+    def load_by_id(self, id):
+        return TransactionHandler.select_one(self, 'crawl_shards', conditions={'id': [id]})
+
+    # Records how many issues the search of a shard found
+    def set_results(self, id, results):
+        TransactionHandler.update(self, 'crawl_shards', {'results': results}, {'id': [id]})
+
+    # Loads the ids of the shards of a year that didn't find an issue for every number in their range, i.e. the ones
+    # where new issues may still be published
+    def load_open_ids(self, year):
+        return [id for id, in TransactionHandler.execute_tuples(self, '''
+            SELECT id FROM crawl_shards WHERE year = ? AND IFNULL(results, 0) < number_to - number_from + 1
+        ''', [year])]
+
+    # Loads all shards of a year, or of all years
+    def load_all(self, year = None):
+        conditions = {'year': [year]} if year is not None else None
+        return TransactionHandler.select_all(self, 'crawl_shards', conditions=conditions)
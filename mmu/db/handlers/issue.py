@@ -1,26 +1,78 @@
 from mmu.db.transaction import TransactionHandler
+from mmu.utility.helper import Helper
+import zlib
+import time
+import re
 
 class IssueHandler(TransactionHandler):
 
     # Default constructor for the Issue handler
-    def __init__(self, db_name='default'):
-        TransactionHandler.__init__(self, db_name)
+    def __init__(self, db_name='default', **options):
+        TransactionHandler.__init__(self, db_name, **options)
 
-    # Creates new record in the database for the issue
-    def create(self, title, type, number, file, date):
+    # Creates new record in the database for the issue, unless an issue with the same title already exists
+    # @param sha256 The SHA-256 of the issue's file, as a hex string
+    def create(self, title, type, number, file, date, sha256 = None):
         # Analyzed is false by default when creating a new issue
-        values = {'title' : title, 'type' : type, 'number' : number, 'file' : file, 'date' : date, 'analyzed': 0}
-        TransactionHandler.insert(self, 'issues', values)
+        values = {'title' : title, 'type' : type, 'number' : number, 'file' : file, 'date' : date, 'analyzed': 0,
+                  'sha256': sha256}
+        TransactionHandler.upsert(self, 'issues', values, conflict_columns=['title'])
+
+    # Creates records for multiple issues at once, skipping the ones that already exist
+    # @param issues A list of dictionaries with the same keys as create's parameters
+    def create_multiple(self, issues):
+        values = [{'sha256': None, **issue, 'analyzed': 0} for issue in issues]
+        TransactionHandler.upsert_multiple(self, 'issues', values, conflict_columns=['title'])
+
+    # Loads an issue by id
+    def load_by_id(self, id):
+        return TransactionHandler.select_one(self, table='issues', conditions={'id': [id]})
 
     # Loads information about an issue by its title
     def load_by_title(self, title):
         conditions = {'title' : [title]}
         return TransactionHandler.select_one(self, table='issues', conditions=conditions)
 
+    # Loads the titles of the issues published in a period, e.g. to skip the issues that are already saved
+    # @param date_from The start of the period, inclusive, in the form dates are stored in
+    # @param date_to The end of the period, exclusive
+    # @return A set of titles
+    def load_titles(self, date_from, date_to):
+        conditions = {'date': [date_from, '>=', 'AND'], 'issues.date': [date_to, '<']}
+        return set(title for title, in TransactionHandler.select_tuples(self, 'issues', ['title'], conditions))
+
+    # Counts the issues of each type published in a period
+    # @return A dictionary of counts by type
+    def count_by_type(self, date_from, date_to):
+        conditions = {'date': [date_from, '>=', 'AND'], 'issues.date': [date_to, '<']}
+        return dict(TransactionHandler.select_tuples(self, 'issues', ['type', 'COUNT(*)'], conditions,
+                                                     group_by='type'))
+
+    # Saves the url an issue's download page redirects to, replacing the one saved before
+    def save_link(self, title, url):
+        TransactionHandler.upsert(self, 'issue_links', {'title': title, 'url': url, 'resolved_at': int(time.time())},
+                                  conflict_columns=['title'], update_columns=['url', 'resolved_at'])
+
+    # Loads the saved urls of the issues' pdfs
+    # @return A dictionary of urls by title
+    def load_links(self):
+        return dict(TransactionHandler.select_tuples(self, 'issue_links', ['title', 'url']))
+
+    # Counts how many issues refer to each file
+    # @return A dictionary of counts by file
+    def count_file_references(self):
+        return dict(TransactionHandler.select_tuples(self, 'issues', ['file', 'COUNT(*)'], group_by='file'))
+
     # Loads all issues
     def load_all(self, conditions=None, group_by=None, joins=None):
         return TransactionHandler.select_all(self, table='issues', conditions=conditions, joins=joins, group_by=group_by)
 
+    # Loads the issues of some types that haven't been analyzed yet
+    # @param types The types of the issues, e.g. ['Α', 'Β']
+    def load_unanalyzed(self, types):
+        conditions = {'analyzed': [0], 'type': [list(types), 'IN']}
+        return TransactionHandler.select_all(self, table='issues', conditions=conditions)
+
     # Loads a random issue
     def load_random(self, conditions=None):
         return TransactionHandler.select_random(self, table='issues', conditions=conditions)
@@ -30,3 +82,94 @@ class IssueHandler(TransactionHandler):
         params = {'analyzed': 1}
         conditions = {'id' : [issue_id]}
         TransactionHandler.update(self, table='issues', params=params, conditions=conditions)
+
+    # Saves the text of an issue's pages and adds it to the full-text index, replacing any text saved before
+    # @param pages A list with the text of every page, in order
+    def save_pages(self, issue_id, pages):
+        with self.transaction():
+            self.delete_pages(issue_id)
+
+            rows = [{'issue_id': issue_id, 'page': number, 'text': zlib.compress(text.encode('utf8'))}
+                    for number, text in enumerate(pages, 1)]
+            TransactionHandler.insert_multiple(self, 'issue_pages', rows)
+
+            page_ids = dict(TransactionHandler.select_tuples(self, 'issue_pages', columns=['page', 'id'],
+                                                             conditions={'issue_id': [issue_id]}))
+            self.connection().executemany('INSERT INTO issue_pages_search (rowid, text) VALUES (?, ?)',
+                                          [(page_ids[number], Helper.normalize_greek_text(text))
+                                           for number, text in enumerate(pages, 1)])
+
+    # Deletes the text of an issue's pages and removes it from the full-text index. The index doesn't keep the text,
+    # so it has to be given the text that was indexed in order to remove it.
+    def delete_pages(self, issue_id):
+        pages = TransactionHandler.select_tuples(self, 'issue_pages', columns=['id', 'text'],
+                                                 conditions={'issue_id': [issue_id]})
+        if not pages:
+            return
+
+        self.connection().executemany(
+            "INSERT INTO issue_pages_search (issue_pages_search, rowid, text) VALUES ('delete', ?, ?)",
+            [(id, Helper.normalize_greek_text(zlib.decompress(text).decode('utf8'))) for id, text in pages])
+        TransactionHandler.execute(self, 'DELETE FROM issue_pages WHERE issue_id = ?', [issue_id])
+        TransactionHandler.written(self, len(pages))
+
+    # Loads the text of an issue's pages
+    # @return A list with the text of every page, in order
+    def load_pages(self, issue_id):
+        query = 'SELECT text FROM issue_pages WHERE issue_id = ? ORDER BY page'
+        return [zlib.decompress(row[0]).decode('utf8')
+                for row in TransactionHandler.execute_tuples(self, query, [issue_id])]
+
+    # Loads the issues that have a file but whose text hasn't been saved yet
+    def load_without_pages(self, conditions=None):
+        joins = {'issue_pages': ['LEFT', 'issue_pages.issue_id = issues.id AND issue_pages.page = 1']}
+        conditions = dict(conditions) if conditions else {}
+        conditions['issue_pages.id'] = [None, 'IS']
+        conditions['file'] = ['N/A', '!=']
+
+        return TransactionHandler.select_all(self, table='issues', columns=['issues.*'], conditions=conditions,
+                                             joins=joins)
+
+    # Searches the text of all saved pages. Words are matched regardless of case and accents, and a word ending in *
+    # matches every word that starts with it.
+    # @param text The words to look for, all of which must appear in a page
+    # @param limit The maximum amount of pages to return
+    # @return A list of dictionaries with the issue's id and title, the page number and a snippet of the text around
+    #   the first match, best matches first
+    def search_text(self, text, limit = 20):
+        words = re.findall(r'\w+\*?', Helper.normalize_greek_text(text))
+        if not words:
+            return []
+
+        query = '''
+            SELECT issues.id, issues.title, issue_pages.page, issue_pages.text
+            FROM issue_pages_search
+            INNER JOIN issue_pages ON issue_pages.id = issue_pages_search.rowid
+            INNER JOIN issues ON issues.id = issue_pages.issue_id
+            WHERE issue_pages_search MATCH ?
+            ORDER BY issue_pages_search.rank
+            LIMIT ?
+        '''
+        terms = ['"{}"{}'.format(word.rstrip('*'), '*' if word.endswith('*') else '') for word in words]
+        rows = TransactionHandler.execute_tuples(self, query, [" AND ".join(terms), limit]).fetchall()
+
+        return [{'issue_id': issue_id, 'title': title, 'page': page,
+                 'snippet': self.snippet(zlib.decompress(text).decode('utf8'), [word.rstrip('*') for word in words])}
+                for issue_id, title, page, text in rows]
+
+    # Cuts the part of a page's text around the first of the given words, marking the word with square brackets.
+    # The index doesn't keep the text, so snippets are made here instead of with fts5's snippet().
+    # @param words Normalized words, as searched for
+    # @param size The amount of characters kept on each side of the word
+    def snippet(self, text, words, size = 60):
+        normalized_text = Helper.normalize_greek_text(text)
+        matches = [re.search(r'\b' + re.escape(word), normalized_text) for word in words]
+        matches = [match for match in matches if match]
+        if not matches:
+            return ' '.join(text[:size * 2].split())
+
+        match = min(matches, key=lambda match: match.start())
+        start, end = match.start(), match.end()
+        snippet = text[max(start - size, 0):start] + '[' + text[start:end] + ']' + text[end:end + size]
+
+        return ('…' if start > size else '') + ' '.join(snippet.split()) + ('…' if end + size < len(text) else '')
@@ -0,0 +1,122 @@
+from mmu.db.transaction import TransactionHandler
+import os
+import time
+import socket
+import threading
+
+# Handler class for the durable job queue. Workers, in the same or in different processes, claim jobs by leasing them.
+# A job can only be completed by the worker holding its lease, so it's completed at most once, while jobs whose lease
+# expired are claimed again by other workers.
+class JobHandler(TransactionHandler):
+
+    # @param owner The name of this worker, by default its host, process and thread
+    # @param lease How many seconds a claimed job stays leased without a heartbeat
+    def __init__(self, db_name = 'default', owner = None, lease = 600, **options):
+        TransactionHandler.__init__(self, db_name, **options)
+        self.__owner = owner or "{host}:{pid}:{thread}".format(host=socket.gethostname(), pid=os.getpid(),
+                                                               thread=threading.get_ident())
+        self.__lease = lease
+
+    # The name this worker's leases are held under
+    def owner(self):
+        return self.__owner
+
+    # Adds jobs to a queue, skipping the items that already have a job in it
+    # @param item_ids The ids of the rows to work on, e.g. issue ids
+    def enqueue(self, queue, item_ids, max_attempts = 3):
+        now = time.time()
+        jobs = [{'queue': queue, 'item_id': item_id, 'max_attempts': max_attempts, 'created_at': now,
+                 'updated_at': now} for item_id in item_ids]
+        TransactionHandler.upsert_multiple(self, 'jobs', jobs, conflict_columns=['queue', 'item_id'])
+
+    # Puts finished jobs of a queue back in it, e.g. to redo work whose input has changed since
+    # @param item_ids The ids of the rows whose jobs are queued again
+    def requeue(self, queue, item_ids):
+        if not item_ids:
+            return
+
+        placeholders = ",".join("?" * len(item_ids))
+        cursor = TransactionHandler.execute(self, '''
+            UPDATE jobs SET status = 'pending', attempts = 0, owner = NULL, lease_until = NULL, error = NULL,
+            available_at = 0, updated_at = ?
+            WHERE queue = ? AND item_id IN ({}) AND status IN ('done', 'failed')
+        '''.format(placeholders), [time.time(), queue] + list(item_ids))
+        TransactionHandler.written(self, max(cursor.rowcount, 1))
+
+    # Claims the oldest job of a queue that is pending, or whose lease has expired, and leases it to this worker.
+    # Jobs whose lease expired on their last attempt are marked as failed instead.
+    # @return The claimed job, or None if there's nothing to do
+    def claim(self, queue):
+        now = time.time()
+
+        with self.transaction():
+            TransactionHandler.execute(self, '''
+                UPDATE jobs SET status = 'failed', owner = NULL, error = 'Lease expired', updated_at = ?
+                WHERE queue = ? AND status = 'running' AND lease_until < ? AND attempts >= max_attempts
+            ''', [now, queue, now])
+
+            jobs = TransactionHandler.execute(self, '''
+                UPDATE jobs SET status = 'running', owner = ?, lease_until = ?, attempts = attempts + 1,
+                updated_at = ?
+                WHERE id = (
+                    SELECT id FROM jobs
+                    WHERE queue = ? AND ((status = 'pending' AND available_at <= ?)
+                                         OR (status = 'running' AND lease_until < ?))
+                    ORDER BY id
+                    LIMIT 1
+                )
+                RETURNING *
+            ''', [self.__owner, now + self.__lease, now, queue, now, now]).fetchall()
+
+        return jobs[0] if jobs else None
+
+    # Extends the lease of a running job, for work that takes longer than the lease
+    # @return False if the job's lease was lost, in which case its work should be abandoned
+    def heartbeat(self, job_id):
+        now = time.time()
+        return self.update_owned(job_id, {'lease_until': now + self.__lease, 'updated_at': now})
+
+    # Marks a running job as done. Call it in the same transaction as the job's writes and only keep them if it
+    # returns True, so that a job whose lease was taken over by another worker doesn't save its results twice.
+    # @return False if the job's lease was lost
+    def complete(self, job_id):
+        return self.update_owned(job_id, {'status': 'done', 'owner': None, 'lease_until': None,
+                                          'updated_at': time.time()})
+
+    # Gives up a running job after an error. It will be claimed again after a delay that grows with every attempt,
+    # unless it has run out of attempts, in which case it's marked as failed.
+    # @param retry_delay The delay after the first attempt, in seconds
+    # @return False if the job's lease was lost
+    def fail(self, job_id, error, retry_delay = 60):
+        now = time.time()
+        cursor = TransactionHandler.execute(self, '''
+            UPDATE jobs SET status = CASE WHEN attempts < max_attempts THEN 'pending' ELSE 'failed' END,
+            available_at = ? + ? * attempts, owner = NULL, lease_until = NULL, error = ?, updated_at = ?
+            WHERE id = ? AND owner = ? AND status = 'running'
+        ''', [now, retry_delay, str(error), now, job_id, self.__owner])
+        TransactionHandler.written(self)
+
+        return cursor.rowcount == 1
+
+    # Updates a running job, as long as this worker still holds its lease
+    # @return Whether or not the job was updated
+    def update_owned(self, job_id, params):
+        values = ",".join("{} = ?".format(column) for column in params)
+        cursor = TransactionHandler.execute(self, '''
+            UPDATE jobs SET {values}
+            WHERE id = ? AND owner = ? AND status = 'running'
+        '''.format(values=values), list(params.values()) + [job_id, self.__owner])
+        TransactionHandler.written(self)
+
+        return cursor.rowcount == 1
+
+    # Loads a job by id
+    def load_by_id(self, id):
+        return TransactionHandler.select_one(self, table='jobs', conditions={'id': [id]})
+
+    # Counts the jobs of a queue by status
+    # @return A dictionary in the format status : count
+    def count_by_status(self, queue):
+        rows = TransactionHandler.select_tuples(self, table='jobs', columns=['status', 'COUNT(*)'],
+                                                conditions={'queue': [queue]}, group_by='status')
+        return dict(rows)
@@ -1,16 +1,21 @@
 from mmu.db.transaction import TransactionHandler
+import json
 
 # Handler class for altering and creating ministry records
 class MinistryHandler(TransactionHandler):
 
-    def __int__(self, db_name = 'default'):
-        TransactionHandler.__init__(self, db_name)
+    def __init__(self, db_name = 'default', **options):
+        TransactionHandler.__init__(self, db_name, **options)
 
-    # Creates a new ministry
+    # Creates a new ministry, unless a ministry with the same name already exists
     def create(self, name, description, established = 0, disbanded = 0):
         params = {'name' : name, 'description' : description, 'established' : established, 'disbanded' : disbanded}
-        print(params)
-        TransactionHandler.insert(self,table='ministries',params=params)
+        TransactionHandler.upsert(self, table='ministries', params=params, conflict_columns=['name'])
+
+    # Creates multiple ministries at once, skipping the ones that already exist
+    # @param ministries A list of dictionaries with the same keys as create's parameters
+    def create_multiple(self, ministries):
+        TransactionHandler.upsert_multiple(self, 'ministries', ministries, conflict_columns=['name'])
 
     # Updates a ministry based on the id given
     def update(self, id, params):
@@ -25,3 +30,112 @@ class MinistryHandler(TransactionHandler):
     # Loads all ministries
     def load_all(self):
         return TransactionHandler.select_all(self, 'ministries')
+
+    # Records that a ministry originated from others, e.g. through a merger or a renaming, and adds the new paths to
+    # the lineage closure: every ancestor of a predecessor becomes an ancestor of the ministry and of its descendants.
+    # @param type How the ministry originated, e.g. 'Renaming' or 'Merger'
+    # @param predecessor_ids The ids of the ministries it originated from
+    # @raise ValueError if a predecessor is the ministry or descends from it, since the lineage would be circular. In
+    #   that case nothing is recorded.
+    def add_origin(self, ministry_id, type, predecessor_ids):
+        with self.transaction():
+            for predecessor_id in predecessor_ids:
+                if self.is_ancestor(ministry_id, predecessor_id):
+                    raise ValueError("Ministry {} descends from ministry {}, so it can't be its predecessor".format(
+                        predecessor_id, ministry_id))
+
+            for predecessor_id in predecessor_ids:
+                self.add_lineage_edge(predecessor_id, ministry_id)
+
+            TransactionHandler.insert(self, 'ministry_origins', {
+                'type': type, 'data': json.dumps({'predecessors': list(predecessor_ids)}), 'ministry_id': ministry_id})
+
+    # Adds the closure rows of a single predecessor to ministry edge, keeping the shortest depth of every pair
+    def add_lineage_edge(self, predecessor_id, ministry_id):
+        cursor = TransactionHandler.execute(self, '''
+            INSERT INTO ministry_lineage (ancestor_id, descendant_id, depth)
+            SELECT ancestors.ancestor_id, descendants.descendant_id, ancestors.depth + descendants.depth + 1
+            FROM ministry_lineage AS ancestors, ministry_lineage AS descendants
+            WHERE ancestors.descendant_id = ? AND descendants.ancestor_id = ?
+            ON CONFLICT (ancestor_id, descendant_id) DO UPDATE SET depth = MIN(depth, excluded.depth)
+        ''', [predecessor_id, ministry_id])
+        TransactionHandler.written(self, cursor.rowcount)
+
+    # Checks if a ministry is among the ancestors of another, or the same ministry
+    def is_ancestor(self, ancestor_id, descendant_id):
+        conditions = {'ancestor_id': [ancestor_id], 'descendant_id': [descendant_id]}
+        return TransactionHandler.select_value(self, 'ministry_lineage', 'depth', conditions) is not None
+
+    # Loads the predecessors recorded in the ministry origins
+    # @return A list of (ministry id, predecessor id) tuples
+    def load_origin_edges(self):
+        edges = []
+        for ministry_id, data in TransactionHandler.select_tuples(self, 'ministry_origins', ['ministry_id', 'data']):
+            try:
+                predecessor_ids = json.loads(data).get('predecessors', []) if data else []
+            except (ValueError, AttributeError):
+                continue
+
+            edges += [(ministry_id, predecessor_id) for predecessor_id in predecessor_ids]
+
+        return edges
+
+    # Rebuilds the whole lineage closure from the ministry origins. Adding origins keeps the closure up to date on its
+    # own; this is for when origins are edited or deleted, since removing a path can't be done incrementally. Origins
+    # recorded before cycles were rejected may still contain one, and the predecessor that would close it is skipped.
+    def rebuild_lineage(self):
+        with self.transaction():
+            TransactionHandler.execute(self, 'DELETE FROM ministry_lineage')
+            TransactionHandler.execute(self, '''
+                INSERT INTO ministry_lineage (ancestor_id, descendant_id, depth) SELECT id, id, 0 FROM ministries
+            ''')
+
+            for ministry_id, predecessor_id in self.load_origin_edges():
+                if not self.is_ancestor(ministry_id, predecessor_id):
+                    self.add_lineage_edge(predecessor_id, ministry_id)
+
+    # Loads the ids of a ministry's ancestors, or descendants, along with how far apart they are
+    # @param descendants Whether to load the descendants instead of the ancestors
+    # @return A dictionary of depths by ministry id, including the ministry itself at depth 0
+    def load_lineage(self, ministry_id, descendants = False):
+        columns = ['descendant_id', 'depth'] if descendants else ['ancestor_id', 'depth']
+        conditions = {'ancestor_id' if descendants else 'descendant_id': [ministry_id]}
+        return dict(TransactionHandler.select_tuples(self, 'ministry_lineage', columns, conditions))
+
+    # Maps every ministry to the lineage root its counts should be rolled up to, in one join over the closure.
+    # By default the root is a ministry's oldest ancestor without predecessors. With root_ids, a ministry is rolled up
+    # to its nearest ancestor among them, and ministries that don't descend from any of them stay on their own.
+    # When a ministry has many candidate roots, e.g. after a merger, the farthest one wins, then the one with the
+    # lowest id.
+    # @param root_ids The ids of the chosen roots
+    # @return A dictionary of (root id, root name) tuples by ministry name
+    def load_roll_up(self, root_ids = None):
+        if root_ids:
+            placeholders = ', '.join('?' * len(root_ids))
+            where = 'ministry_lineage.ancestor_id IN ({})'.format(placeholders)
+            order = 'ministry_lineage.depth ASC'
+            values = list(root_ids)
+        else:
+            where = '''NOT EXISTS (
+                SELECT 1 FROM ministry_lineage AS predecessors
+                WHERE predecessors.descendant_id = ministry_lineage.ancestor_id AND predecessors.depth > 0
+            )'''
+            order = 'ministry_lineage.depth DESC'
+            values = []
+
+        rows = TransactionHandler.execute_tuples(self, '''
+            SELECT ministries.name, roots.id, roots.name FROM ministry_lineage
+            INNER JOIN ministries ON ministries.id = ministry_lineage.descendant_id
+            INNER JOIN ministries AS roots ON roots.id = ministry_lineage.ancestor_id
+            WHERE {where}
+            ORDER BY ministry_lineage.descendant_id, {order}, roots.id
+        '''.format(where=where, order=order), values)
+
+        roll_up = {ministry['name']: (ministry['id'], ministry['name']) for ministry in self.load_all()}
+        chosen = set()
+        for name, root_id, root_name in rows:
+            if name not in chosen:
+                roll_up[name] = (root_id, root_name)
+                chosen.add(name)
+
+        return roll_up
@@ -1,21 +1,73 @@
 from mmu.db.transaction import TransactionHandler
+from mmu.utility.helper import Helper
 
 # Handler class for creating, searching and editing persons data
 class PersonHandler(TransactionHandler):
 
     # Default constructor for Persons
-    def __init__(self, db_name = 'default'):
-        TransactionHandler.__init__(self, db_name)
+    def __init__(self, db_name = 'default', **options):
+        TransactionHandler.__init__(self, db_name, **options)
 
     # Loads a person from the database using his id
     def load_by_id(self, id):
         conditions = {'id' : [id]}
         return self.load_one(conditions)
 
-    # Loads a person from the database by matching his name
-    def load_by_name(self, name):
-        conditions = {'name' : ['%' + name + '%', 'LIKE']}
-        return self.load_one(conditions)
+    # Loads a person from the database by matching his name. Names are compared in their normalized form through a
+    # unique index.
+    # @param fuzzy Whether a person with the same first and last name is returned if there's no exact match, which
+    #   covers names written with or without a middle initial. Names that more than one person matches this way are
+    #   ambiguous, so no one is returned for them.
+    def load_by_name(self, name, fuzzy = False):
+        normalized_name = Helper.normalize_greek_name(name)
+        person = self.load_one({'normalized_name' : [normalized_name]})
+
+        if not person and fuzzy:
+            candidates = self.find_candidates(normalized_name, limit=2, same_first_last=True)
+            person = candidates[0] if len(candidates) == 1 else None
+
+        return person
+
+    # Finds persons whose names look like the one given, using the trigram index over their normalized names
+    # @param limit The maximum amount of candidates to return
+    # @param same_first_last Only returns persons with exactly the same first and last name
+    # @return A list of persons, best matches first. Persons with the same first and last name always come first.
+    def find_candidates(self, name, limit = 10, same_first_last = False):
+        name_parts = Helper.normalize_greek_name(name).split(" ")
+
+        # Trigrams can't match terms shorter than 3 characters, such as initials
+        terms = ['"{}"'.format(part) for part in name_parts if len(part) >= 3]
+        if not terms:
+            return []
+
+        # When looking for the same first and last name only those two have to appear in the name
+        if same_first_last:
+            if len(name_parts[0]) < 3 or len(name_parts[-1]) < 3:
+                return []
+            terms = ['"{}"'.format(part) for part in (name_parts[0], name_parts[-1])]
+
+        query = '''
+            SELECT persons.*
+            FROM persons_search
+            INNER JOIN persons ON persons.id = persons_search.rowid
+            WHERE persons_search MATCH ?
+            ORDER BY persons_search.rank
+            LIMIT ?
+        '''
+        # Some more candidates than needed are fetched, since the ones with the same first and last name move up
+        persons = TransactionHandler.execute_select_all(self, query, [" AND ".join(terms), limit * 5])
+
+        def same_first_and_last_name(person):
+            parts = person['normalized_name'].split(" ")
+            return parts[0] == name_parts[0] and parts[-1] == name_parts[-1]
+
+        if same_first_last:
+            persons = [person for person in persons if same_first_and_last_name(person)]
+        else:
+            # sorted is stable, so the full-text ranking is kept among each group
+            persons = sorted(persons, key=lambda person: not same_first_and_last_name(person))
+
+        return persons[:limit]
 
     # Selects (up to) one person who matches the conditions given
     def load_one(self, conditions = None):
@@ -25,24 +77,45 @@ class PersonHandler(TransactionHandler):
     def load_all(self, conditions = None):
         return TransactionHandler.select_all(self, table='persons', conditions=conditions)
 
-    # Creates a new person
+    # Creates a new person, unless a person with the same normalized name already exists
     def create(self, name, political_party, birthdate):
-        values = {'name' : name, 'political_party' : political_party, 'birthdate' : birthdate}
-        TransactionHandler.insert(self, table='persons', params=values)
+        self.create_multiple([{'name' : name, 'political_party' : political_party, 'birthdate' : birthdate}])
+
+    # Creates multiple persons at once, skipping the ones that already exist
+    # @param persons A list of dictionaries with the same keys as create's parameters
+    def create_multiple(self, persons):
+        values = [dict(person, normalized_name=Helper.normalize_greek_name(person['name'])) for person in persons]
+        TransactionHandler.upsert_multiple(self, 'persons', values, conflict_columns=['normalized_name'])
 
     # Updates a person's information
     def update(self, id, params):
         conditions = {'id' : [id]}
+
+        if 'name' in params:
+            params = dict(params, normalized_name=Helper.normalize_greek_name(params['name']))
+
         TransactionHandler.update(self, table='persons', params=params, conditions=conditions)
 
-    # Create a new position
+    # Create a new position, unless the same person already has the same role in the ministry from the same date
     def save_position(self, role, date_from, date_to, person_id, ministry_id, cabinet_id):
         values = {'role' : role, 'date_from' : date_from, 'date_to' : date_to, 'person_id' : person_id,
                   'ministry_id' : ministry_id, 'cabinet_id' : cabinet_id}
-        TransactionHandler.insert(self, table='positions', params=values)
+        self.save_positions([values])
+
+    # Creates multiple positions at once, skipping the ones that already exist
+    # @param positions A list of dictionaries with the same keys as save_position's parameters
+    def save_positions(self, positions):
+        TransactionHandler.upsert_multiple(self, 'positions', positions,
+                                           conflict_columns=['person_id', 'ministry_id', 'date_from', 'role'])
 
     # Loads a position given some conditions
     def load_position(self, conditions):
         return TransactionHandler.select_one(self, 'positions', conditions=conditions)
 
+    # Loads all positions that match the conditions given, along with the name of their ministry
+    def load_positions(self, conditions = None):
+        columns = ['positions.*', 'ministries.name AS ministry']
+        joins = {'ministries': ['LEFT', 'ministries.id = positions.ministry_id']}
+        return TransactionHandler.select_all(self, 'positions', columns=columns, conditions=conditions, joins=joins)
+
 
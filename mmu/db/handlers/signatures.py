@@ -4,8 +4,8 @@ from mmu.db.transaction import TransactionHandler
 class SignatureHandler(TransactionHandler):
 
     # Default constructor for the Signature Handler
-    def __init__(self, db_name = 'default'):
-        TransactionHandler.__init__(self, db_name)
+    def __init__(self, db_name = 'default', **options):
+        TransactionHandler.__init__(self, db_name, **options)
 
     # Loads a signature by id
     def load_by_id(self, id):
@@ -35,12 +35,21 @@ class SignatureHandler(TransactionHandler):
         params = {'person_id': person_id, 'issue_id': issue_id, 'data': data}
         TransactionHandler.insert(self, table='signatures', params=params)
 
-# Handler class for saving raw signatures
+# Handler class for saving raw signatures. Signatures are stored in the signature_facts table as integer references
+# to interned persons, roles, issues and regulations, while the raw_signatures view presents them as text.
 class RawSignatureHandler(TransactionHandler):
 
+    # The dimension table and its value column for each interned column of raw_signatures
+    dimensions = {'person_name': ('signature_persons', 'name'), 'role': ('signature_roles', 'title'),
+                  'issue_title': ('signature_issues', 'title'), 'regulation': ('signature_regulations', 'title')}
+
     # Default constructor for the Raw Signature Handler
-    def __init__(self, db_name='default'):
-        TransactionHandler.__init__(self, db_name)
+    def __init__(self, db_name='default', **options):
+        TransactionHandler.__init__(self, db_name, **options)
+
+        # Ids of the values that have already been interned, by connection. Each connection's cache holds the
+        # connection's rollback count when it was started, and the ids by column.
+        self.__interned = {}
 
     # Loads a signature by id
     def load_by_id(self, id):
@@ -65,18 +74,118 @@ class RawSignatureHandler(TransactionHandler):
         params = {'person_name': person_name, 'role': role, 'issue_title': issue_title, 'issue_date' : issue_date}
         TransactionHandler.insert(self, table='raw_signatures', params=params)
 
-    # Saves multiple signatures contained in a list
+    # Returns the id of a value in its dimension table, adding it to the table if it's not there yet
+    # @param column The raw_signatures column the value belongs to
+    # @param issue_date The issue's date, only needed when interning issue titles
+    def intern(self, column, value, issue_date=None):
+        if value is None:
+            return None
+
+        # Values interned before a rollback may have been rolled back with it, so the cache starts over
+        key = self.connection_key()
+        rollbacks = self.rollback_count()
+        if key not in self.__interned or self.__interned[key][0] != rollbacks:
+            self.__interned[key] = (rollbacks, {column: {} for column in self.dimensions})
+
+        interned = self.__interned[key][1][column]
+
+        if value not in interned:
+            table, value_column = self.dimensions[column]
+            params = {value_column: value}
+            if column == 'issue_title':
+                params['date'] = issue_date
+
+            existing = TransactionHandler.select_value(self, table, 'id', conditions={value_column: [value]})
+
+            if existing is None:
+                TransactionHandler.insert(self, table, params)
+                existing = TransactionHandler.select_value(self, table, 'id', conditions={value_column: [value]})
+
+            interned[value] = existing
+
+        return interned[value]
+
+    # Takes the next version from the signature version counter. It's written in the same transaction as the
+    # signatures that get it, so versions are committed in the order they're given out.
+    def next_version(self):
+        TransactionHandler.execute(self, 'UPDATE signature_version SET version = version + 1')
+        return TransactionHandler.select_value(self, 'signature_version', 'version')
+
+    # Saves multiple signatures contained in a list. Names, roles, titles and regulations are interned through an
+    # in-memory cache, so only the integer facts are written for values that have been seen before. A person signs a
+    # regulation of an issue only once, so saving the same signatures again has no effect.
+    # All the signatures get one version, which is taken after interning, since interning may commit.
     def create_multiple(self, inserts):
-        TransactionHandler.insert_multiple(self, 'raw_signatures', inserts)
+        facts = []
+
+        for signature in inserts:
+            facts.append({'person_id': self.intern('person_name', signature.get('person_name')),
+                          'role_id': self.intern('role', signature.get('role')),
+                          'issue_id': self.intern('issue_title', signature.get('issue_title'),
+                                                  signature.get('issue_date')),
+                          'regulation_id': self.intern('regulation', signature.get('regulation'))})
+
+        if not facts:
+            return
+
+        version = self.next_version()
+        for fact in facts:
+            fact['version'] = version
+
+        # Signatures that have already been saved, e.g. when an issue is analyzed again, are skipped
+        TransactionHandler.upsert_multiple(self, 'signature_facts', facts)
+
+    # Selects the integer facts of all signatures that match the conditions given, without resolving any text
+    def load_facts(self, conditions=None):
+        return TransactionHandler.select_all(self, table='signature_facts', conditions=conditions)
+
+    # Selects the integer facts of all signatures saved or changed after a given version, along with the year and type
+    # of their issue. Missing references are returned as -1, so that every value fits in an integer array.
+    # @param version The last version that is already known
+    # @return Tuples in the format (id, person_id, role_id, issue_id, regulation_id, year, type, version), ordered by
+    #   version
+    def load_facts_changed_after(self, version):
+        query = '''
+                    SELECT signature_facts.id,
+                    IFNULL(signature_facts.person_id, -1),
+                    IFNULL(signature_facts.role_id, -1),
+                    IFNULL(signature_facts.issue_id, -1),
+                    IFNULL(signature_facts.regulation_id, -1),
+                    CASE typeof(signature_issues.date)
+                        WHEN 'integer' THEN strftime('%Y', signature_issues.date, 'unixepoch')
+                        ELSE substr(signature_issues.date, 1, 4)
+                    END,
+                    issues.type,
+                    signature_facts.version
+                    FROM signature_facts
+                    LEFT JOIN signature_issues ON signature_issues.id = signature_facts.issue_id
+                    LEFT JOIN issues ON issues.title = signature_issues.title
+                    WHERE signature_facts.version > ?
+                    ORDER BY signature_facts.version
+                '''
+
+        return TransactionHandler.execute_tuples(self, query, [version]).fetchall()
+
+    # Loads the given columns of all signatures that match the conditions into NumPy arrays
+    def load_columns(self, columns, conditions=None):
+        return TransactionHandler.select_columns(self, table='raw_signatures', columns=columns, conditions=conditions)
+
+    # Loads a dimension table as a dictionary in the format id : value
+    # @param column The raw_signatures column whose values are needed, e.g. person_name
+    def load_dimension(self, column):
+        table, value_column = self.dimensions[column]
+        return dict(TransactionHandler.select_tuples(self, table, columns=['id', value_column]))
 
     # Updates database entries that match given conditions changing their values to given params
     def update(self, params, conditions=None):
         TransactionHandler.update(self, 'raw_signatures', params, conditions)
 
-    # Finds the most common role given a person's name and some conditions
-    def find_most_common_role(self, conditions, person_name):
+    # Builds the query that finds the most common role given a person's name and some conditions
+    # @return A tuple containing the query and the list of values that need to be bound to it
+    def most_common_role_query(self, conditions, person_name):
+        conditions = dict(conditions) if conditions else {}
         conditions['person_name'] = [person_name]
-        formatted_conditions = TransactionHandler.format_conditions(self, 'raw_signatures', conditions)
+        formatted_conditions, values = TransactionHandler.format_conditions(self, 'raw_signatures', conditions)
         query = ''' 
                     SELECT role,
                     COUNT(role) AS role_occurence 
@@ -87,4 +196,9 @@ class RawSignatureHandler(TransactionHandler):
                     LIMIT    1;
                 '''.format(conditions=formatted_conditions)
 
-        return TransactionHandler.execute_select_all(self, query=query)
\ No newline at end of file
+        return query, values
+
+    # Finds the most common role given a person's name and some conditions
+    def find_most_common_role(self, conditions, person_name):
+        query, values = self.most_common_role_query(conditions, person_name)
+        return TransactionHandler.execute_select_all(self, query=query, values=values)
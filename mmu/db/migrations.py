@@ -0,0 +1,553 @@
+import sqlite3
+
+from mmu.utility.helper import Helper
+
+# Versioned schema migrations, applied on top of install/default.sql. Every migration runs once, in its own
+# transaction, and the database's user_version is set to the migration's version afterwards, so existing databases
+# can be upgraded in place.
+__migrations = {}
+
+
+# Registers a function as the migration for the given version
+def migration(version):
+    def register(function):
+        __migrations[version] = function
+        return function
+
+    return register
+
+
+# Executes a script statement by statement, without committing like sqlite3's executescript does
+def execute_statements(db, script):
+    statement = ""
+
+    for line in script.splitlines(keepends=True):
+        statement += line
+        if sqlite3.complete_statement(statement):
+            db.execute(statement)
+            statement = ""
+
+    if statement.strip():
+        db.execute(statement)
+
+
+# Returns the schema version of a database
+def current_version(db):
+    cursor = db.cursor()
+    cursor.row_factory = None
+    return cursor.execute('PRAGMA user_version').fetchone()[0]
+
+
+# Returns the version the schema will have once all migrations are applied
+def latest_version():
+    return max(__migrations) if __migrations else 0
+
+
+# Applies all migrations the database hasn't gone through yet
+# @return The versions that were applied
+def migrate(db):
+    applied = []
+    db.commit()
+
+    for version in sorted(__migrations):
+        if version <= current_version(db):
+            continue
+
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            __migrations[version](db)
+            db.execute('PRAGMA user_version = {}'.format(version))
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
+        applied.append(version)
+
+    return applied
+
+
+# Indexes for the columns used in lookups, joins and filters, which were all full table scans before.
+@migration(1)
+def add_lookup_indexes(db):
+    # Titles identify issues, so duplicates are removed before making them unique
+    execute_statements(db, '''
+        DELETE FROM issues WHERE id NOT IN (SELECT MIN(id) FROM issues GROUP BY title);
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_issues_title ON issues (title);
+        CREATE INDEX IF NOT EXISTS idx_issues_analyzed_type ON issues (analyzed, type);
+        CREATE INDEX IF NOT EXISTS idx_issues_type_date ON issues (type, date, number);
+        CREATE INDEX IF NOT EXISTS idx_raw_signatures_person_role ON raw_signatures (person_name, role);
+        CREATE INDEX IF NOT EXISTS idx_raw_signatures_issue_title ON raw_signatures (issue_title);
+        CREATE INDEX IF NOT EXISTS idx_ministries_name ON ministries (name);
+        CREATE INDEX IF NOT EXISTS idx_cabinets_title ON cabinets (title);
+        CREATE INDEX IF NOT EXISTS idx_positions_person_ministry ON positions (person_id, ministry_id, date_from);
+        CREATE INDEX IF NOT EXISTS idx_signatures_issue ON signatures (issue_id);
+        CREATE INDEX IF NOT EXISTS idx_signatures_person ON signatures (person_id);
+    ''')
+
+
+# Replaces raw_signatures, which repeated the same names, roles, titles and regulations as text in every row, with
+# interned dimension tables and a compact integer fact table. A view with the same name and columns, along with
+# triggers for inserts, updates and deletes, keeps existing queries working.
+@migration(2)
+def normalize_raw_signatures(db):
+    execute_statements(db, '''
+        CREATE TABLE `signature_persons` (
+            `id` INTEGER,
+            `name` TEXT NOT NULL UNIQUE, -- The name of the signing person, as extracted from the pdf
+            PRIMARY KEY(`id`)
+        );
+        CREATE TABLE `signature_roles` (
+            `id` INTEGER,
+            `title` TEXT NOT NULL UNIQUE, -- The role of the minister signing
+            PRIMARY KEY(`id`)
+        );
+        CREATE TABLE `signature_regulations` (
+            `id` INTEGER,
+            `title` TEXT NOT NULL UNIQUE, -- The regulation's type and number, e.g. "ΝΟΜΟΣ ΥΠ’ ΑΡΙΘ. 4363"
+            PRIMARY KEY(`id`)
+        );
+        CREATE TABLE `signature_issues` (
+            `id` INTEGER,
+            `title` TEXT NOT NULL UNIQUE, -- The title of the issue the signatures were extracted from
+            `date` INTEGER NOT NULL, -- When the issue was published
+            PRIMARY KEY(`id`)
+        );
+        CREATE TABLE `signature_facts` (
+            `id` INTEGER,
+            `person_id` INTEGER,
+            `role_id` INTEGER,
+            `issue_id` INTEGER,
+            `regulation_id` INTEGER,
+            PRIMARY KEY(`id`),
+            FOREIGN KEY(`person_id`) REFERENCES `signature_persons`(`id`),
+            FOREIGN KEY(`role_id`) REFERENCES `signature_roles`(`id`),
+            FOREIGN KEY(`issue_id`) REFERENCES `signature_issues`(`id`),
+            FOREIGN KEY(`regulation_id`) REFERENCES `signature_regulations`(`id`)
+        );
+
+        INSERT INTO signature_persons (name)
+            SELECT DISTINCT person_name FROM raw_signatures WHERE person_name IS NOT NULL;
+        INSERT INTO signature_roles (title)
+            SELECT DISTINCT role FROM raw_signatures WHERE role IS NOT NULL;
+        INSERT INTO signature_regulations (title)
+            SELECT DISTINCT regulation FROM raw_signatures WHERE regulation IS NOT NULL;
+        INSERT INTO signature_issues (title, date)
+            SELECT issue_title, MIN(issue_date) FROM raw_signatures WHERE issue_title IS NOT NULL GROUP BY issue_title;
+
+        INSERT INTO signature_facts (id, person_id, role_id, issue_id, regulation_id)
+            SELECT raw_signatures.id, signature_persons.id, signature_roles.id, signature_issues.id,
+                   signature_regulations.id
+            FROM raw_signatures
+            LEFT JOIN signature_persons ON signature_persons.name = raw_signatures.person_name
+            LEFT JOIN signature_roles ON signature_roles.title = raw_signatures.role
+            LEFT JOIN signature_issues ON signature_issues.title = raw_signatures.issue_title
+            LEFT JOIN signature_regulations ON signature_regulations.title = raw_signatures.regulation;
+
+        DROP TABLE raw_signatures;
+
+        CREATE INDEX idx_signature_facts_person_role ON signature_facts (person_id, role_id);
+        CREATE INDEX idx_signature_facts_issue ON signature_facts (issue_id);
+        CREATE INDEX idx_signature_facts_regulation ON signature_facts (regulation_id);
+
+        CREATE VIEW raw_signatures AS
+            SELECT signature_facts.id AS id,
+                   signature_persons.name AS person_name,
+                   signature_roles.title AS role,
+                   signature_issues.title AS issue_title,
+                   signature_issues.date AS issue_date,
+                   signature_regulations.title AS regulation
+            FROM signature_facts
+            LEFT JOIN signature_persons ON signature_persons.id = signature_facts.person_id
+            LEFT JOIN signature_roles ON signature_roles.id = signature_facts.role_id
+            LEFT JOIN signature_issues ON signature_issues.id = signature_facts.issue_id
+            LEFT JOIN signature_regulations ON signature_regulations.id = signature_facts.regulation_id;
+
+        CREATE TRIGGER raw_signatures_insert INSTEAD OF INSERT ON raw_signatures
+        BEGIN
+            INSERT OR IGNORE INTO signature_persons (name) SELECT NEW.person_name WHERE NEW.person_name IS NOT NULL;
+            INSERT OR IGNORE INTO signature_roles (title) SELECT NEW.role WHERE NEW.role IS NOT NULL;
+            INSERT OR IGNORE INTO signature_regulations (title)
+                SELECT NEW.regulation WHERE NEW.regulation IS NOT NULL;
+            INSERT OR IGNORE INTO signature_issues (title, date)
+                SELECT NEW.issue_title, NEW.issue_date WHERE NEW.issue_title IS NOT NULL;
+            INSERT INTO signature_facts (id, person_id, role_id, issue_id, regulation_id) VALUES (
+                NEW.id,
+                (SELECT id FROM signature_persons WHERE name = NEW.person_name),
+                (SELECT id FROM signature_roles WHERE title = NEW.role),
+                (SELECT id FROM signature_issues WHERE title = NEW.issue_title),
+                (SELECT id FROM signature_regulations WHERE title = NEW.regulation)
+            );
+        END;
+
+        CREATE TRIGGER raw_signatures_update INSTEAD OF UPDATE ON raw_signatures
+        BEGIN
+            INSERT OR IGNORE INTO signature_persons (name) SELECT NEW.person_name WHERE NEW.person_name IS NOT NULL;
+            INSERT OR IGNORE INTO signature_roles (title) SELECT NEW.role WHERE NEW.role IS NOT NULL;
+            INSERT OR IGNORE INTO signature_regulations (title)
+                SELECT NEW.regulation WHERE NEW.regulation IS NOT NULL;
+            INSERT OR IGNORE INTO signature_issues (title, date)
+                SELECT NEW.issue_title, NEW.issue_date WHERE NEW.issue_title IS NOT NULL;
+            UPDATE signature_issues SET date = NEW.issue_date
+                WHERE title = NEW.issue_title AND NEW.issue_date IS NOT OLD.issue_date;
+            UPDATE signature_facts SET
+                person_id = (SELECT id FROM signature_persons WHERE name = NEW.person_name),
+                role_id = (SELECT id FROM signature_roles WHERE title = NEW.role),
+                issue_id = (SELECT id FROM signature_issues WHERE title = NEW.issue_title),
+                regulation_id = (SELECT id FROM signature_regulations WHERE title = NEW.regulation)
+            WHERE id = OLD.id;
+        END;
+
+        CREATE TRIGGER raw_signatures_delete INSTEAD OF DELETE ON raw_signatures
+        BEGIN
+            DELETE FROM signature_facts WHERE id = OLD.id;
+        END;
+    ''')
+
+
+# Persons were looked up with name LIKE '%...%', which can't use an index. A normalized_name column with a unique index
+# allows exact lookups, and a trigram full-text index over it serves fuzzy lookups.
+@migration(3)
+def add_person_name_indexes(db):
+    db.create_function('normalize_greek_name', 1, Helper.normalize_greek_name, deterministic=True)
+
+    execute_statements(db, '''
+        ALTER TABLE persons ADD COLUMN `normalized_name` TEXT; -- The name in uppercase, without accents or symbols
+        UPDATE persons SET normalized_name = normalize_greek_name(name);
+
+        -- Persons whose names only differed in accents or case are merged into the oldest record
+        UPDATE positions SET person_id = (
+            SELECT MIN(duplicate.id) FROM persons
+            INNER JOIN persons AS duplicate ON duplicate.normalized_name = persons.normalized_name
+            WHERE persons.id = positions.person_id
+        ) WHERE person_id IN (SELECT id FROM persons);
+        UPDATE signatures SET person_id = (
+            SELECT MIN(duplicate.id) FROM persons
+            INNER JOIN persons AS duplicate ON duplicate.normalized_name = persons.normalized_name
+            WHERE persons.id = signatures.person_id
+        ) WHERE person_id IN (SELECT id FROM persons);
+        DELETE FROM persons WHERE id NOT IN (SELECT MIN(id) FROM persons GROUP BY normalized_name);
+
+        CREATE UNIQUE INDEX idx_persons_normalized_name ON persons (normalized_name);
+
+        CREATE VIRTUAL TABLE persons_search USING fts5(normalized_name, content='persons', content_rowid='id',
+                                                       tokenize='trigram');
+        INSERT INTO persons_search (persons_search) VALUES ('rebuild');
+
+        CREATE TRIGGER persons_search_insert AFTER INSERT ON persons
+        BEGIN
+            INSERT INTO persons_search (rowid, normalized_name) VALUES (NEW.id, NEW.normalized_name);
+        END;
+
+        CREATE TRIGGER persons_search_delete AFTER DELETE ON persons
+        BEGIN
+            INSERT INTO persons_search (persons_search, rowid, normalized_name)
+                VALUES ('delete', OLD.id, OLD.normalized_name);
+        END;
+
+        CREATE TRIGGER persons_search_update AFTER UPDATE OF normalized_name ON persons
+        BEGIN
+            INSERT INTO persons_search (persons_search, rowid, normalized_name)
+                VALUES ('delete', OLD.id, OLD.normalized_name);
+            INSERT INTO persons_search (rowid, normalized_name) VALUES (NEW.id, NEW.normalized_name);
+        END;
+    ''')
+
+
+# Unique constraints on the natural keys of signatures, ministries, cabinets and positions, so that saving the same
+# entity twice (e.g. when extraction runs again on an issue) is a no-op instead of a duplicate row.
+@migration(4)
+def add_natural_key_constraints(db):
+    execute_statements(db, '''
+        DELETE FROM signature_facts WHERE id NOT IN (
+            SELECT MIN(id) FROM signature_facts GROUP BY issue_id, IFNULL(regulation_id, 0), person_id
+        );
+        CREATE UNIQUE INDEX idx_signature_facts_natural_key
+            ON signature_facts (issue_id, IFNULL(regulation_id, 0), person_id);
+
+        UPDATE positions SET ministry_id = (
+            SELECT MIN(duplicate.id) FROM ministries
+            INNER JOIN ministries AS duplicate ON duplicate.name = ministries.name
+            WHERE ministries.id = positions.ministry_id
+        ) WHERE ministry_id IN (SELECT id FROM ministries);
+        UPDATE ministry_origins SET ministry_id = (
+            SELECT MIN(duplicate.id) FROM ministries
+            INNER JOIN ministries AS duplicate ON duplicate.name = ministries.name
+            WHERE ministries.id = ministry_origins.ministry_id
+        ) WHERE ministry_id IN (SELECT id FROM ministries);
+        DELETE FROM ministries WHERE id NOT IN (SELECT MIN(id) FROM ministries GROUP BY name);
+        DROP INDEX IF EXISTS idx_ministries_name;
+        CREATE UNIQUE INDEX idx_ministries_name ON ministries (name);
+
+        UPDATE positions SET cabinet_id = (
+            SELECT MIN(duplicate.id) FROM cabinets
+            INNER JOIN cabinets AS duplicate ON duplicate.title = cabinets.title
+            WHERE cabinets.id = positions.cabinet_id
+        ) WHERE cabinet_id IN (SELECT id FROM cabinets);
+        DELETE FROM cabinets WHERE id NOT IN (SELECT MIN(id) FROM cabinets GROUP BY title);
+        DROP INDEX IF EXISTS idx_cabinets_title;
+        CREATE UNIQUE INDEX idx_cabinets_title ON cabinets (title);
+
+        DELETE FROM positions WHERE id NOT IN (
+            SELECT MIN(id) FROM positions GROUP BY person_id, ministry_id, date_from, role
+        );
+        DROP INDEX IF EXISTS idx_positions_person_ministry;
+        CREATE UNIQUE INDEX idx_positions_natural_key ON positions (person_id, ministry_id, date_from, role);
+
+        -- Inserting a signature that already exists through the raw_signatures view is ignored as well
+        DROP TRIGGER raw_signatures_insert;
+        CREATE TRIGGER raw_signatures_insert INSTEAD OF INSERT ON raw_signatures
+        BEGIN
+            INSERT OR IGNORE INTO signature_persons (name) SELECT NEW.person_name WHERE NEW.person_name IS NOT NULL;
+            INSERT OR IGNORE INTO signature_roles (title) SELECT NEW.role WHERE NEW.role IS NOT NULL;
+            INSERT OR IGNORE INTO signature_regulations (title)
+                SELECT NEW.regulation WHERE NEW.regulation IS NOT NULL;
+            INSERT OR IGNORE INTO signature_issues (title, date)
+                SELECT NEW.issue_title, NEW.issue_date WHERE NEW.issue_title IS NOT NULL;
+            INSERT OR IGNORE INTO signature_facts (id, person_id, role_id, issue_id, regulation_id) VALUES (
+                NEW.id,
+                (SELECT id FROM signature_persons WHERE name = NEW.person_name),
+                (SELECT id FROM signature_roles WHERE title = NEW.role),
+                (SELECT id FROM signature_issues WHERE title = NEW.issue_title),
+                (SELECT id FROM signature_regulations WHERE title = NEW.regulation)
+            );
+        END;
+    ''')
+
+
+# A durable queue of work items, e.g. issues waiting for signature extraction. Workers claim jobs by leasing them for
+# a while. Jobs whose lease expires, because their worker crashed or hung, can be claimed again until they run out of
+# attempts.
+@migration(5)
+def add_jobs_table(db):
+    execute_statements(db, '''
+        CREATE TABLE jobs (
+            id INTEGER PRIMARY KEY,
+            queue TEXT NOT NULL, -- The kind of work, e.g. signature_extraction
+            item_id INTEGER NOT NULL, -- The row the job works on, e.g. an issue's id
+            status TEXT NOT NULL DEFAULT 'pending', -- One of pending, running, done, failed
+            attempts INTEGER NOT NULL DEFAULT 0, -- How many times the job has been claimed
+            max_attempts INTEGER NOT NULL DEFAULT 3,
+            owner TEXT, -- The worker holding the lease of a running job
+            lease_until REAL, -- UNIX timestamp when the lease of a running job expires
+            available_at REAL NOT NULL DEFAULT 0, -- UNIX timestamp before which a pending job isn't claimed
+            error TEXT, -- The last error the job failed with
+            created_at REAL,
+            updated_at REAL
+        );
+        CREATE UNIQUE INDEX idx_jobs_queue_item ON jobs (queue, item_id);
+        CREATE INDEX idx_jobs_queue_status ON jobs (queue, status, available_at);
+    ''')
+
+
+# The text of every page of the analyzed issues, compressed, and a full-text index over it. The index is contentless,
+# so the text is only stored once. It indexes the text as normalized by Helper.normalize_greek_text, which
+# IssueHandler applies to both the pages and the search terms.
+@migration(6)
+def add_issue_pages(db):
+    execute_statements(db, '''
+        CREATE TABLE issue_pages (
+            id INTEGER PRIMARY KEY,
+            issue_id INTEGER NOT NULL,
+            page INTEGER NOT NULL, -- The page number, starting from 1
+            text BLOB NOT NULL -- The page's text, utf-8 encoded and compressed with zlib
+        );
+        CREATE UNIQUE INDEX idx_issue_pages_issue_page ON issue_pages (issue_id, page);
+
+        CREATE VIRTUAL TABLE issue_pages_search USING fts5(text, content='', tokenize='unicode61');
+    ''')
+
+
+# The transitive closure of ministry_origins: a row for every ministry and each of its predecessors, however many
+# renames or mergers apart, so that a ministry's whole lineage is found with one join. Every ministry is also its own
+# ancestor at depth 0. MinistryHandler keeps the table up to date as origins are added.
+@migration(7)
+def add_ministry_lineage(db):
+    execute_statements(db, '''
+        CREATE TABLE ministry_lineage (
+            ancestor_id INTEGER NOT NULL,
+            descendant_id INTEGER NOT NULL,
+            depth INTEGER NOT NULL, -- The number of renames or mergers between the two, using the shortest path
+            PRIMARY KEY (ancestor_id, descendant_id)
+        ) WITHOUT ROWID;
+        CREATE INDEX idx_ministry_lineage_descendant ON ministry_lineage (descendant_id, depth);
+
+        INSERT INTO ministry_lineage (ancestor_id, descendant_id, depth) SELECT id, id, 0 FROM ministries;
+
+        CREATE TRIGGER ministry_lineage_insert AFTER INSERT ON ministries
+        BEGIN
+            INSERT OR IGNORE INTO ministry_lineage (ancestor_id, descendant_id, depth) VALUES (NEW.id, NEW.id, 0);
+        END;
+
+        CREATE TRIGGER ministry_lineage_delete AFTER DELETE ON ministries
+        BEGIN
+            DELETE FROM ministry_lineage WHERE ancestor_id = OLD.id OR descendant_id = OLD.id;
+        END;
+    ''')
+
+
+# Caches the url of every issue's pdf once its download page's redirects are followed, so later crawls skip them
+@migration(8)
+def add_issue_links(db):
+    execute_statements(db, '''
+        CREATE TABLE issue_links (
+            title TEXT PRIMARY KEY, -- The title of the issue
+            url TEXT NOT NULL, -- The url of the issue's pdf
+            resolved_at INTEGER -- UNIX timestamp of when the redirects were followed
+        );
+    ''')
+
+
+# The SHA-256 of every issue's pdf, recorded when it's downloaded, so that only complete files are parsed
+@migration(9)
+def add_issue_checksums(db):
+    execute_statements(db, '''
+        ALTER TABLE issues ADD COLUMN sha256 TEXT;
+    ''')
+
+
+# The shards of the crawl: ranges of issue numbers of a type and year, each searched by one worker. Their progress is
+# kept in the jobs table, under the crawl queue, so an interrupted crawl resumes with the shards it didn't finish.
+@migration(10)
+def add_crawl_shards(db):
+    execute_statements(db, '''
+        CREATE TABLE crawl_shards (
+            id INTEGER PRIMARY KEY,
+            year INTEGER NOT NULL,
+            type INTEGER NOT NULL, -- The id of the issue type on the search page
+            number_from INTEGER NOT NULL,
+            number_to INTEGER NOT NULL,
+            results INTEGER -- The amount of issues found, once the shard is crawled
+        );
+        CREATE UNIQUE INDEX idx_crawl_shards_range ON crawl_shards (year, type, number_from);
+    ''')
+
+
+# A version for every signature, taken from a counter that goes up with every insert or change of a signature or of its
+# issue's date, so that the columnar export can pick up signatures that changed after they were first exported.
+# Existing signatures start with their id.
+@migration(11)
+def add_signature_versions(db):
+    execute_statements(db, '''
+        ALTER TABLE signature_facts ADD COLUMN version INTEGER NOT NULL DEFAULT 0;
+        UPDATE signature_facts SET version = id;
+        CREATE INDEX idx_signature_facts_version ON signature_facts (version);
+
+        CREATE TRIGGER signature_facts_version_insert AFTER INSERT ON signature_facts
+        BEGIN
+            UPDATE signature_facts SET version = (SELECT MAX(version) FROM signature_facts) + 1 WHERE id = NEW.id;
+        END;
+
+        CREATE TRIGGER signature_facts_version_update
+            AFTER UPDATE OF person_id, role_id, issue_id, regulation_id ON signature_facts
+        BEGIN
+            UPDATE signature_facts SET version = (SELECT MAX(version) FROM signature_facts) + 1 WHERE id = NEW.id;
+        END;
+
+        CREATE TRIGGER signature_issues_version_update AFTER UPDATE OF date ON signature_issues
+        BEGIN
+            UPDATE signature_facts SET version = (SELECT MAX(version) FROM signature_facts) + 1
+            WHERE issue_id = NEW.id;
+        END;
+    ''')
+
+
+# The raw_signatures triggers added issues with INSERT OR IGNORE, which also ignores the NOT NULL constraint of their
+# date, so a signature of a new issue without a date was saved without its issue. They now fail like
+# RawSignatureHandler.create_multiple does. A missing date is still fine for an issue that's already saved.
+@migration(12)
+def require_signature_issue_dates(db):
+    execute_statements(db, '''
+        DROP TRIGGER raw_signatures_insert;
+        CREATE TRIGGER raw_signatures_insert INSTEAD OF INSERT ON raw_signatures
+        BEGIN
+            SELECT RAISE(ABORT, 'NOT NULL constraint failed: signature_issues.date')
+                WHERE NEW.issue_title IS NOT NULL AND NEW.issue_date IS NULL
+                AND NOT EXISTS (SELECT 1 FROM signature_issues WHERE title = NEW.issue_title);
+            INSERT OR IGNORE INTO signature_persons (name) SELECT NEW.person_name WHERE NEW.person_name IS NOT NULL;
+            INSERT OR IGNORE INTO signature_roles (title) SELECT NEW.role WHERE NEW.role IS NOT NULL;
+            INSERT OR IGNORE INTO signature_regulations (title)
+                SELECT NEW.regulation WHERE NEW.regulation IS NOT NULL;
+            INSERT OR IGNORE INTO signature_issues (title, date)
+                SELECT NEW.issue_title, NEW.issue_date WHERE NEW.issue_title IS NOT NULL;
+            INSERT OR IGNORE INTO signature_facts (id, person_id, role_id, issue_id, regulation_id) VALUES (
+                NEW.id,
+                (SELECT id FROM signature_persons WHERE name = NEW.person_name),
+                (SELECT id FROM signature_roles WHERE title = NEW.role),
+                (SELECT id FROM signature_issues WHERE title = NEW.issue_title),
+                (SELECT id FROM signature_regulations WHERE title = NEW.regulation)
+            );
+        END;
+
+        DROP TRIGGER raw_signatures_update;
+        CREATE TRIGGER raw_signatures_update INSTEAD OF UPDATE ON raw_signatures
+        BEGIN
+            SELECT RAISE(ABORT, 'NOT NULL constraint failed: signature_issues.date')
+                WHERE NEW.issue_title IS NOT NULL AND NEW.issue_date IS NULL
+                AND NOT EXISTS (SELECT 1 FROM signature_issues WHERE title = NEW.issue_title);
+            INSERT OR IGNORE INTO signature_persons (name) SELECT NEW.person_name WHERE NEW.person_name IS NOT NULL;
+            INSERT OR IGNORE INTO signature_roles (title) SELECT NEW.role WHERE NEW.role IS NOT NULL;
+            INSERT OR IGNORE INTO signature_regulations (title)
+                SELECT NEW.regulation WHERE NEW.regulation IS NOT NULL;
+            INSERT OR IGNORE INTO signature_issues (title, date)
+                SELECT NEW.issue_title, NEW.issue_date WHERE NEW.issue_title IS NOT NULL;
+            UPDATE signature_issues SET date = NEW.issue_date
+                WHERE title = NEW.issue_title AND NEW.issue_date IS NOT OLD.issue_date;
+            UPDATE signature_facts SET
+                person_id = (SELECT id FROM signature_persons WHERE name = NEW.person_name),
+                role_id = (SELECT id FROM signature_roles WHERE title = NEW.role),
+                issue_id = (SELECT id FROM signature_issues WHERE title = NEW.issue_title),
+                regulation_id = (SELECT id FROM signature_regulations WHERE title = NEW.regulation)
+            WHERE id = OLD.id;
+        END;
+    ''')
+
+
+# NULLs are distinct from each other in unique indexes, so signatures without a person or an issue were never
+# deduplicated by the natural key of migration 4. All three columns of the key now count a missing reference as 0.
+@migration(13)
+def add_null_safe_signature_key(db):
+    execute_statements(db, '''
+        DELETE FROM signature_facts WHERE id NOT IN (
+            SELECT MIN(id) FROM signature_facts
+            GROUP BY IFNULL(issue_id, 0), IFNULL(regulation_id, 0), IFNULL(person_id, 0)
+        );
+        DROP INDEX idx_signature_facts_natural_key;
+        CREATE UNIQUE INDEX idx_signature_facts_natural_key
+            ON signature_facts (IFNULL(issue_id, 0), IFNULL(regulation_id, 0), IFNULL(person_id, 0));
+    ''')
+
+
+# Signature versions come from a counter instead of the highest version so far, which the insert trigger looked up and
+# then wrote for every single row. RawSignatureHandler.create_multiple takes one version from the counter for all the
+# signatures it saves, so the trigger only gives a version to rows inserted without one, e.g. through raw_signatures.
+@migration(14)
+def add_signature_version_counter(db):
+    execute_statements(db, '''
+        CREATE TABLE signature_version (
+            version INTEGER NOT NULL -- The last version given to a signature
+        );
+        INSERT INTO signature_version (version) SELECT IFNULL(MAX(version), 0) FROM signature_facts;
+
+        DROP TRIGGER signature_facts_version_insert;
+        CREATE TRIGGER signature_facts_version_insert AFTER INSERT ON signature_facts WHEN NEW.version = 0
+        BEGIN
+            UPDATE signature_version SET version = version + 1;
+            UPDATE signature_facts SET version = (SELECT version FROM signature_version) WHERE id = NEW.id;
+        END;
+
+        DROP TRIGGER signature_facts_version_update;
+        CREATE TRIGGER signature_facts_version_update
+            AFTER UPDATE OF person_id, role_id, issue_id, regulation_id ON signature_facts
+        BEGIN
+            UPDATE signature_version SET version = version + 1;
+            UPDATE signature_facts SET version = (SELECT version FROM signature_version) WHERE id = NEW.id;
+        END;
+
+        DROP TRIGGER signature_issues_version_update;
+        CREATE TRIGGER signature_issues_version_update AFTER UPDATE OF date ON signature_issues
+        BEGIN
+            UPDATE signature_version SET version = version + 1;
+            UPDATE signature_facts SET version = (SELECT version FROM signature_version) WHERE issue_id = NEW.id;
+        END;
+    ''')
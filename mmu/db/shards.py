@@ -0,0 +1,159 @@
+import os
+import re
+import glob
+import sqlite3
+import datetime
+import urllib.parse
+
+from mmu.db.transaction import TransactionHandler
+from mmu.db.migrations import migrate
+
+
+# Splits issues and their signatures into one database per year, next to the main database, e.g. mmu/data/default_2016.
+# Persons, ministries, cabinets and positions stay in the main database. Every shard can be vacuumed, backed up and
+# ingested on its own, while federated handlers attach the shards and see all years as one dataset.
+class Shards:
+
+    # The tables that are split by year
+    tables = ['issues', 'raw_signatures']
+
+    # @param db_name The main database, whose name the shards are named after
+    def __init__(self, db_name = 'default'):
+        self.__db_path = TransactionHandler.database_path(db_name)
+        self.__handlers = {}
+
+    # Returns the year of an issue date, given as a datetime, a unix timestamp, a year or text such as
+    # 2016-01-12 00:00:00 or 12.01.2016
+    @staticmethod
+    def year(date):
+        if isinstance(date, (datetime.date, datetime.datetime)):
+            return date.year
+
+        if isinstance(date, int) and date > 9999:
+            return datetime.datetime.utcfromtimestamp(date).year
+
+        match = re.search(r'\d{4}', str(date))
+        if not match:
+            raise ValueError("No year found in date {}".format(date))
+
+        return int(match.group(0))
+
+    # Returns the path of the shard that holds the given year
+    def path(self, year):
+        return "{path}_{year}".format(path=self.__db_path, year=year)
+
+    # Returns the years that have a shard, in ascending order
+    def years(self):
+        paths = glob.glob(glob.escape(self.__db_path) + '_[0-9][0-9][0-9][0-9]')
+        return sorted(int(path[-4:]) for path in paths)
+
+    # Creates the shard of a year if it doesn't exist yet and brings its schema up to date
+    # @return The shard's path, which handlers accept as their database name
+    def create(self, year):
+        path = self.path(year)
+
+        if not os.path.exists(path):
+            install_sql = os.path.join(os.path.dirname(__file__), '..', '..', 'install', 'default.sql')
+            db = sqlite3.connect(path)
+            db.executescript(open(install_sql, 'r', encoding='utf8').read())
+        else:
+            db = sqlite3.connect(path)
+
+        migrate(db)
+        db.close()
+
+        return path
+
+    # Returns a handler for the shard an issue date belongs to, creating the shard if needed. Handlers are reused,
+    # so writes routed to the same year share one connection and batch.
+    # @param handler_class The handler's class, e.g. IssueHandler
+    # @param date The date of the issue being written, see year()
+    def handler(self, handler_class, date, **options):
+        year = self.year(date)
+        key = (handler_class, year)
+
+        if key not in self.__handlers:
+            self.__handlers[key] = handler_class(self.create(year), **options)
+
+        return self.__handlers[key]
+
+    # Attaches the shards to a handler's connection and creates temporary views that combine the tables of the main
+    # database and the shards with UNION ALL, so that the handler's queries see all years as one dataset.
+    # The views belong to the connection, so they apply to every handler of the same database, mode and thread. Use
+    # read-only handlers, because rows can't be written through the views.
+    # sqlite can attach at most SQLITE_LIMIT_ATTACHED databases per connection, 10 by default. When there are more
+    # shards, the ones that don't fit are attached one at a time through a slot that's kept free, and their rows are
+    # copied into temporary tables, which hold them as they were at the time of the federation.
+    # @param handler The handler whose queries are federated
+    # @param years The years to include, all of them by default
+    def federate(self, handler, years = None):
+        years = self.years() if years is None else years
+        attached = handler.attached()
+        free = handler.connection().getlimit(sqlite3.SQLITE_LIMIT_ATTACHED) - len(attached)
+
+        if len([year for year in years if self.schema(year) not in attached]) > free:
+            free -= 1
+
+            if free < 0:
+                raise ValueError("Cannot attach any shard, all {} databases sqlite allows are attached".format(
+                    len(attached)))
+
+        schemas = ['main']
+        copied = []
+
+        for year in years:
+            schema = self.schema(year)
+
+            if schema not in attached:
+                if not free:
+                    copied.append(year)
+                    continue
+
+                handler.attach(self.path(year), schema)
+                free -= 1
+
+            schemas.append(schema)
+
+        for table in self.tables:
+            handler.drop_temp_table(self.copy_table(table))
+
+        for year in copied:
+            handler.attach(self.path(year), 'shard_copy')
+
+            for table in self.tables:
+                handler.copy_to_temp('shard_copy', table, self.copy_table(table))
+
+            handler.detach('shard_copy')
+
+        for table in self.tables:
+            handler.create_union_view(table, schemas, ['temp.' + self.copy_table(table)] if copied else [])
+
+        return handler
+
+    # Counts how many issues of the main database and of all shards refer to each file, e.g. for BlobStore.collect,
+    # which would otherwise delete the files of the issues that only the shards hold
+    # Every database is read through a connection of its own, since the handlers' connections may be federated.
+    # @return A dictionary of counts by file
+    def count_file_references(self):
+        references = {}
+
+        for path in [self.__db_path] + [self.path(year) for year in self.years()]:
+            db = sqlite3.connect('file:{path}?mode=ro'.format(path=urllib.parse.quote(path)), uri=True)
+
+            try:
+                for file, count in db.execute('SELECT file, COUNT(*) FROM issues GROUP BY file'):
+                    references[file] = references.get(file, 0) + count
+            finally:
+                db.close()
+
+        return references
+
+    # The name a shard is attached as
+    @staticmethod
+    def schema(year):
+        return 'shard_{}'.format(year)
+
+    # The temporary table that holds the rows of a table of the shards that couldn't be attached
+    @staticmethod
+    def copy_table(table):
+        return 'shards_{}'.format(table)
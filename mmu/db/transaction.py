@@ -1,134 +1,678 @@
 import sqlite3
 import os
+import itertools
+import keyword
+import threading
+import weakref
+import time
+import urllib.parse
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import Future
+
+
+# Keeps track of the writes that have not been committed yet while a connection is in batching mode
+class WriteBatch:
+
+    def __init__(self, size, interval):
+        self.size = size
+        self.interval = interval
+        self.pending = 0
+        self.depth = 1
+        self.started = time.monotonic()
+
+        # The savepoints of the nested batches that are active, innermost last
+        self.savepoints = []
+
+    # Registers a number of deferred writes
+    def add(self, count=1):
+        self.pending += count
+
+    # Whether or not enough writes have been deferred (or enough time has passed) to commit them
+    def is_due(self):
+        return self.pending >= self.size or time.monotonic() - self.started >= self.interval
+
+    # Starts counting again after a commit
+    def reset(self):
+        self.pending = 0
+        self.started = time.monotonic()
+
+
+# Identifies a thread for as long as it runs. Thread idents are reused once a thread ends, so they can't tell a new
+# thread from an old one that left a connection behind, but every thread gets a token of its own. The token is dropped
+# along with the thread's local data when the thread ends.
+class ThreadToken:
+
+    __ids = itertools.count(1)
+
+    def __init__(self):
+        self.id = next(ThreadToken.__ids)
+
+
+# Base class for the lightweight records returned by handlers whose row_type is 'record'. A subclass with __slots__ is
+# generated for every set of columns, so rows carry no per-instance dictionary but can still be read by column name.
+class Record:
+
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return getattr(self, key)
+        return getattr(self, self.__slots__[key])
+
+    def __len__(self):
+        return len(self.__slots__)
+
+    def __eq__(self, other):
+        return type(self) is type(other) and tuple(self) == tuple(other)
+
+    def __iter__(self):
+        for column in self.__slots__:
+            yield getattr(self, column)
+
+    def __repr__(self):
+        values = ", ".join("{}={!r}".format(column, getattr(self, column)) for column in self.__slots__)
+        return "{}({})".format(type(self).__name__, values)
+
+    def keys(self):
+        return list(self.__slots__)
+
 
 # This class defines all required transactions for saving, adding and altering entities in an SQLite database
 class TransactionHandler:
 
-    def __init__(self, db_name = 'default'):
+    # Pragmas applied to every new connection. WAL allows readers to keep working while a writer commits and, together
+    # with synchronous=NORMAL, only syncs to disk on checkpoints instead of on every commit. A crash may lose the last
+    # few commits but never leaves the database corrupted.
+    default_pragmas = {'journal_mode': 'WAL', 'synchronous': 'NORMAL', 'cache_size': -64000,
+                       'mmap_size': 268435456, 'temp_store': 'MEMORY', 'busy_timeout': 5000}
+
+    # Pragmas applied to read-only connections, used for analysis. Such connections never take write locks, so long
+    # scans can run next to a writer, and a large memory map lets them read pages straight from the OS page cache.
+    read_only_pragmas = {'query_only': 1, 'cache_size': -64000, 'mmap_size': 4294967296, 'temp_store': 'MEMORY',
+                         'busy_timeout': 5000}
+
+    # Connections shared by all handlers of the same database in the same thread, so that a batch covers writes
+    # made through different handlers. A thread's connections are closed when it ends, or earlier through
+    # close_thread_connections.
+    __connections = {}
+    __batches = {}
+
+    # Keys of the connections that are inside an explicit transaction
+    __transactions = set()
+
+    # How many times each connection was rolled back, so that caches of row ids can tell when rows they know about
+    # may be gone
+    __rollbacks = {}
+
+    # Built SQL statements, keyed by their shape (statement type, table, columns, operators etc.), least recently used
+    # first. Conditions with lists of values have a shape per length of the list, so only the max_cached_queries most
+    # recently used statements are kept.
+    __queries = OrderedDict()
+    __queries_lock = threading.Lock()
+    max_cached_queries = 512
+
+    # Generated record classes, keyed by their columns
+    __records = {}
+
+    # The ThreadToken of every thread that used a connection
+    __threads = threading.local()
+
+    # The type of the rows returned by selects. One of:
+    #   dict: A dictionary in the format column : value
+    #   row: An sqlite3.Row, which can be read by index or by column name
+    #   record: An instance of a generated class with __slots__, which can be read by attribute or column name
+    #   tuple: A plain tuple, the fastest option
+    row_type = 'dict'
+
+    # @param read_only Opens a read-only connection, which can't write and doesn't block writers
+    # @param immutable Treats the database as a frozen snapshot that nothing else modifies, so sqlite skips locking
+    #   and change detection altogether. Only use it on databases that were checkpointed and are no longer written.
+    # @param writer A DatabaseWriter of the same database, which applies the writes submitted through submit,
+    #   create_async and update_async
+    def __init__(self, db_name = 'default', pragmas = None, row_type = None, read_only = False, immutable = False,
+                 writer = None):
+        self.__db_path = self.database_path(db_name)
+        self.__mode = 'immutable' if immutable else 'ro' if read_only else 'rw'
+
+        if writer and writer.database_path() != self.__db_path:
+            raise ValueError("The writer of {} can't write to {}".format(writer.database_path(), self.__db_path))
+        self.__writer = writer
+
+        if row_type:
+            self.row_type = row_type
+
+        db = self.connection()
+
+        # Custom pragmas are applied on top of the defaults, even if the connection is already open
+        if pragmas:
+            self.apply_pragmas(db, pragmas)
+
+    # Returns the location of a database given its name. Absolute paths and :memory: are used as they are.
+    @staticmethod
+    def database_path(db_name):
+        if db_name == ':memory:' or os.path.isabs(db_name):
+            return db_name
+
         data_dir = os.path.abspath(os.path.join(os.path.dirname( __file__ ), '..', 'data'))
-        self.__db = sqlite3.connect(data_dir + "/" + db_name)
-        # Sets the function that turns tuples into key-value dictionaries
-        self.__db.row_factory = self.dict_factory
+        return data_dir + "/" + db_name
+
+    # Identifies the connection used by this handler: one per database, access mode and thread
+    def connection_key(self):
+        return self.__db_path, self.__mode, self.thread_id()
+
+    # The id of the calling thread's ThreadToken. The first time a thread asks for it, the thread's connections are
+    # set to be released once the thread ends and its token is dropped.
+    @staticmethod
+    def thread_id():
+        token = getattr(TransactionHandler.__threads, 'token', None)
+
+        if token is None:
+            token = TransactionHandler.__threads.token = ThreadToken()
+            weakref.finalize(token, TransactionHandler.release_thread, token.id)
+
+        return token.id
+
+    # Forgets the connections of a thread, along with its batches and transactions, and closes them
+    # @param thread_id The id of the thread's ThreadToken
+    # @param commit Whether to commit the pending writes first, which only works from the thread itself. Otherwise
+    #   they are discarded.
+    @staticmethod
+    def release_thread(thread_id, commit = False):
+        for key in [key for key in list(TransactionHandler.__connections) if key[2] == thread_id]:
+            db = TransactionHandler.__connections.pop(key)
+            TransactionHandler.__batches.pop(key, None)
+            TransactionHandler.__transactions.discard(key)
+            TransactionHandler.__rollbacks.pop(key, None)
+
+            try:
+                if commit:
+                    db.commit()
+                db.close()
+            except sqlite3.ProgrammingError:
+                # Connections can only be closed by their own thread, otherwise they're closed once they're collected
+                pass
+
+    # Closes all connections of the calling thread, committing anything still pending. Worker threads call this
+    # before they finish, so that their writes don't wait for the thread to be cleaned up.
+    @staticmethod
+    def close_thread_connections():
+        TransactionHandler.release_thread(TransactionHandler.thread_id(), commit=True)
+
+    # How many connections are open across all threads
+    @staticmethod
+    def connection_count():
+        return len(TransactionHandler.__connections)
+
+    # Returns the connection of this thread to the handler's database, opening it if needed
+    def connection(self):
+        key = self.connection_key()
+
+        if key not in TransactionHandler.__connections:
+            if self.__mode == 'rw' or self.__db_path == ':memory:':
+                db = sqlite3.connect(self.__db_path, cached_statements=256)
+                pragmas = TransactionHandler.default_pragmas
+            else:
+                # Read-only connections are opened through a URI, e.g. file:/path/default?mode=ro
+                uri = 'file:{path}?mode=ro'.format(path=urllib.parse.quote(self.__db_path))
+                if self.__mode == 'immutable':
+                    uri += '&immutable=1'
 
-    # Builds an INSERT statement for the SQLite database using the parameters specified in params
-    # @param table The table
-    # @param params A dictionary of all columns and their values accordingly
-    def insert(self, table, params):
-        cursor = self.__db.cursor()
-        columns = ""
-        values = ""
-        separator = ","
-        count = 0
+                db = sqlite3.connect(uri, uri=True, cached_statements=256)
+                pragmas = TransactionHandler.read_only_pragmas
 
-        for column_name in params:
+            # Sets the function that turns tuples into key-value dictionaries
+            db.row_factory = self.dict_factory
+            self.apply_pragmas(db, pragmas)
+            TransactionHandler.__connections[key] = db
 
-            # Doesn't use a comma after the last element
-            if count == len(params) - 1:
-                separator = ""
+        return TransactionHandler.__connections[key]
 
-            columns += column_name + separator
-            values += ":" + column_name + separator
+    # Whether or not this handler uses a read-only connection
+    def is_read_only(self):
+        return self.__mode != 'rw'
 
-            count += 1
+    # Attaches another database to this thread's connection, so that its tables can be queried as schema.table.
+    # Read-only connections attach it read-only as well. Attaching a database that is already attached does nothing.
+    # sqlite allows at most SQLITE_LIMIT_ATTACHED (10 by default) attached databases per connection.
+    # @param db_name The name or path of the database
+    # @param schema The name the database is attached as
+    def attach(self, db_name, schema):
+        db = self.connection()
+        path = self.database_path(db_name)
 
-        query = '''
-            INSERT INTO {t} ({c}) 
-            VALUES({v})
-        '''.format(t=table, c=columns, v=values)
+        if schema in self.attached():
+            return
+
+        if self.is_read_only():
+            path = 'file:{path}?mode=ro'.format(path=urllib.parse.quote(path))
+
+        db.execute('ATTACH DATABASE ? AS {schema}'.format(schema=schema), [path])
+
+    # Detaches a database from this thread's connection. Anything read from it so far is committed first, since sqlite
+    # can't detach a database in the middle of a transaction.
+    def detach(self, schema):
+        db = self.connection()
+
+        if schema not in self.attached():
+            return
+
+        db.commit()
+        db.execute('DETACH DATABASE {schema}'.format(schema=schema))
+
+    # Returns the databases attached to this thread's connection as a dictionary in the format schema : file
+    def attached(self):
+        return {row[1]: row[2] for row in self.execute_tuples('PRAGMA database_list')
+                if row[1] not in ('main', 'temp')}
+
+    # Allows writing to the temporary database of this thread's connection for the duration of a block. Temporary
+    # tables and views are allowed on read-only databases, but not while query_only is on.
+    @contextmanager
+    def temp_writes(self):
+        db = self.connection()
+
+        if self.is_read_only():
+            db.execute('PRAGMA query_only = 0')
+
+        try:
+            yield db
+        finally:
+            if self.is_read_only():
+                db.execute('PRAGMA query_only = 1')
+
+    # Copies the rows of a table of an attached database into a temporary table of this connection, which is created
+    # with the same columns if it doesn't exist yet
+    # @param schema The attached database, e.g. shard_2016
+    # @param table The table to copy
+    # @param temp_table The temporary table the rows are added to
+    def copy_to_temp(self, schema, table, temp_table):
+        with self.temp_writes() as db:
+            db.execute('CREATE TEMP TABLE IF NOT EXISTS {tt} AS SELECT * FROM {s}.{t} WHERE 0'.format(
+                tt=temp_table, s=schema, t=table))
+            db.execute('INSERT INTO temp.{tt} SELECT * FROM {s}.{t}'.format(tt=temp_table, s=schema, t=table))
+            db.commit()
+
+    # Drops a temporary table of this connection if it exists
+    def drop_temp_table(self, temp_table):
+        with self.temp_writes() as db:
+            db.execute('DROP TABLE IF EXISTS temp.{}'.format(temp_table))
+
+    # Creates a temporary view that combines a table of several databases with UNION ALL. Temporary views only exist
+    # in this connection and are found before the tables of the main database with the same name, so queries on the
+    # table see the rows of all databases.
+    # @param table The table, which must have the same columns in all databases
+    # @param schemas The databases the rows come from, e.g. ['main', 'shard_2016']
+    # @param tables Other tables whose rows are added, given as schema.table, e.g. temporary copies of databases that
+    #   couldn't be attached
+    def create_union_view(self, table, schemas, tables = ()):
+        columns = ",".join(row[1] for row in self.execute_tuples('PRAGMA main.table_info({})'.format(table)))
+        sources = ["{s}.{t}".format(s=schema, t=table) for schema in schemas] + list(tables)
+        selects = " UNION ALL ".join("SELECT {c} FROM {source}".format(c=columns, source=source)
+                                     for source in sources)
+
+        with self.temp_writes() as db:
+            db.execute('DROP VIEW IF EXISTS temp.{}'.format(table))
+            db.execute('CREATE TEMP VIEW {t} AS {s}'.format(t=table, s=selects))
+
+    # Executes PRAGMA statements on a connection
+    # @param pragmas A dictionary in the format pragma_name : value
+    @staticmethod
+    def apply_pragmas(db, pragmas):
+        for name in pragmas:
+            db.execute("PRAGMA {name} = {value}".format(name=name, value=pragmas[name])).fetchall()
+
+    # Closes this thread's connection to the database, committing anything still pending
+    def close(self):
+        key = self.connection_key()
+        db = TransactionHandler.__connections.pop(key, None)
+        TransactionHandler.__batches.pop(key, None)
+        TransactionHandler.__transactions.discard(key)
+
+        if db:
+            db.commit()
+            db.close()
+
+    # Starts batching mode. Writes are no longer committed one by one but together, as soon as there are `size`
+    # uncommitted writes or `interval` seconds have passed since the last commit.
+    # Starting a batch while another one is active groups the following writes, so that they are never committed
+    # separately from each other.
+    # @return False if a batch was already active, in which case the outer batch decides when to commit
+    def begin_batch(self, size = 1000, interval = 5):
+        key = self.connection_key()
+        batch = TransactionHandler.__batches.get(key)
+
+        if batch:
+            batch.depth += 1
+            return False
+
+        TransactionHandler.__batches[key] = WriteBatch(size, interval)
+        return True
+
+    # Commits all deferred writes and, once the outermost batch ends, returns to committing after every write
+    def end_batch(self):
+        key = self.connection_key()
+        batch = TransactionHandler.__batches.get(key)
+
+        if batch:
+            batch.depth -= 1
+
+            # Writes made inside a nested batch are only committed together, once the nested batch has ended
+            if batch.depth > 0:
+                if batch.depth == 1 and batch.is_due():
+                    self.commit()
+                return
+
+            del TransactionHandler.__batches[key]
+
+        self.commit()
+
+    # Context manager wrapping begin_batch and end_batch. If the block raises, its writes that aren't committed yet are
+    # rolled back instead. A nested batch keeps its writes under a savepoint, so that only they are rolled back.
+    @contextmanager
+    def batch(self, size = 1000, interval = 5):
+        outermost = self.begin_batch(size, interval)
+        batch = TransactionHandler.__batches[self.connection_key()]
+        savepoint = None if outermost else 'batch_{}'.format(batch.depth)
+
+        if savepoint:
+            self.connection().execute('SAVEPOINT {}'.format(savepoint))
+            batch.savepoints.append(savepoint)
+
+        try:
+            yield self
+        except BaseException:
+            # A commit inside the block, e.g. of a transaction, releases the savepoint along with everything before it
+            self.rollback(savepoint if savepoint in batch.savepoints else None)
+            raise
+        finally:
+            if savepoint in batch.savepoints:
+                self.connection().execute('RELEASE {}'.format(savepoint))
+                batch.savepoints.remove(savepoint)
+
+            self.end_batch()
+
+    # Runs a block in a single transaction, which is committed when the block ends and rolled back if it raises.
+    # BEGIN IMMEDIATE takes the write lock up front, so a block that reads before it writes can't fail half-way because
+    # another process wrote in between. Writes deferred by an active batch are committed before the transaction
+    # starts, while a transaction started inside another one just becomes part of it.
+    # @param immediate Whether the write lock is taken when the transaction starts instead of on its first write
+    @contextmanager
+    def transaction(self, immediate = True):
+        key = self.connection_key()
+
+        if key in TransactionHandler.__transactions:
+            with self.batch():
+                yield self
+            return
+
+        db = self.connection()
+        batch = TransactionHandler.__batches.get(key)
+
+        if db.in_transaction:
+            self.commit()
+
+        db.execute('BEGIN IMMEDIATE' if immediate else 'BEGIN')
+        TransactionHandler.__transactions.add(key)
+
+        # Writes are never committed by written() while the transaction is running
+        if batch:
+            batch.depth += 1
+        else:
+            TransactionHandler.__batches[key] = WriteBatch(float('inf'), float('inf'))
+
+        try:
+            yield self
+            db.commit()
+        except BaseException:
+            self.rollback()
+            raise
+        finally:
+            TransactionHandler.__transactions.discard(key)
+
+            if batch:
+                batch.depth -= 1
+                batch.reset()
+            else:
+                del TransactionHandler.__batches[key]
+
+    # Rolls back this thread's connection, or only the writes made since a savepoint
+    # @param savepoint The name of the savepoint, or None to roll back the whole transaction
+    def rollback(self, savepoint = None):
+        key = self.connection_key()
+        batch = TransactionHandler.__batches.get(key)
+
+        if savepoint:
+            self.connection().execute('ROLLBACK TO {}'.format(savepoint))
+        else:
+            self.connection().rollback()
+
+            if batch:
+                batch.savepoints.clear()
+
+        TransactionHandler.__rollbacks[key] = TransactionHandler.__rollbacks.get(key, 0) + 1
+
+    # How many times this thread's connection was rolled back. Rows inserted before a rollback may not exist anymore,
+    # and their ids may be given to other rows, so a cache of ids has to be emptied once this changes.
+    def rollback_count(self):
+        return TransactionHandler.__rollbacks.get(self.connection_key(), 0)
+
+    # Calls a method of the handler in the writer's thread, or right away if the handler has no writer
+    # @param method The method, e.g. self.create
+    # @return A Future that holds the method's result once it's committed
+    def submit(self, method, *args, **kwargs):
+        if self.__writer:
+            return self.__writer.submit(method, *args, **kwargs)
+
+        future = Future()
+        try:
+            future.set_result(method(*args, **kwargs))
+        except Exception as e:
+            future.set_exception(e)
+
+        return future
 
-        cursor.execute(query, params)
-        self.__db.commit()
+    # Calls the handler's create method through submit
+    def create_async(self, *args, **kwargs):
+        return self.submit(self.create, *args, **kwargs)
+
+    # Calls the handler's update method through submit
+    def update_async(self, *args, **kwargs):
+        return self.submit(self.update, *args, **kwargs)
+
+    # Commits all pending writes of this thread's connection
+    def commit(self):
+        key = self.connection_key()
+        batch = TransactionHandler.__batches.get(key)
+
+        self.connection().commit()
+
+        if batch:
+            batch.reset()
+            batch.savepoints.clear()
+
+    # Called after every write. Commits immediately unless a batch is active, in which case the commit happens only
+    # when the batch is due and no nested batch is grouping writes together.
+    # @param count The amount of rows written
+    def written(self, count = 1):
+        key = self.connection_key()
+        batch = TransactionHandler.__batches.get(key)
+
+        if not batch:
+            self.connection().commit()
+            return
+
+        batch.add(count)
+        if batch.depth == 1 and batch.is_due():
+            self.commit()
+
+    # Returns the statement built for a shape, or None if it isn't cached
+    def cached_query(self, shape):
+        with TransactionHandler.__queries_lock:
+            query = TransactionHandler.__queries.get(shape)
+
+            if query is not None:
+                TransactionHandler.__queries.move_to_end(shape)
+
+            return query
+
+    # Caches the statement built for a shape, dropping the least recently used one if the cache is full
+    # @return The statement
+    def cache_query(self, shape, query):
+        with TransactionHandler.__queries_lock:
+            TransactionHandler.__queries[shape] = query
+
+            while len(TransactionHandler.__queries) > self.max_cached_queries:
+                TransactionHandler.__queries.popitem(last=False)
+
+        return query
+
+    # Builds an INSERT statement with one named placeholder per column. Statements are cached by their shape so that
+    # the same SQL text is executed again, which lets sqlite reuse its prepared statement.
+    # @param table The table
+    # @param columns The names of the columns to insert
+    def insert_query(self, table, columns):
+        shape = ('insert', table, tuple(columns))
+        query = self.cached_query(shape)
+
+        if query is None:
+            query = self.cache_query(shape, "INSERT INTO {t} ({c}) VALUES ({v})".format(
+                t=table, c=",".join(columns), v=",".join(":" + column for column in columns)))
+
+        return query
+
+    # Builds an INSERT statement for the SQLite database using the parameters specified in params
+    # @param table The table
+    # @param params A dictionary of all columns and their values accordingly
+    def insert(self, table, params):
+        cursor = self.connection().cursor()
+        cursor.execute(self.insert_query(table, list(params)), params)
+        self.written()
 
     # Builds and executes multiple INSERT statements
     # @param table The table
     # @param inserts A list of dictionaries of all columns and their values accordingly
     def insert_multiple(self, table, inserts):
-        cursor = self.__db.cursor()
-        query = ""
-        for params in inserts[0:1]:
+        if not inserts:
+            return
 
-            columns = ""
-            values = ""
-            separator = ","
-            count = 0
+        cursor = self.connection().cursor()
 
-            # Build the query from the parameters
-            for column_name in params:
+        # Execute the query
+        cursor.executemany(self.insert_query(table, list(inserts[0])), inserts)
 
-                # Doesn't use a comma after the last element
-                if count == len(params) - 1:
-                    separator = ""
+        # Commits changes after all inserts are finished
+        self.written(len(inserts))
+
+    # Builds an INSERT statement that resolves conflicts with existing rows instead of failing
+    # @param conflict_columns The columns of the unique constraint to check. If not given, any constraint counts.
+    # @param update_columns The columns to overwrite with the new values on conflict. If not given, the existing row
+    #   is kept as it is.
+    def upsert_query(self, table, columns, conflict_columns = None, update_columns = None):
+        shape = ('upsert', table, tuple(columns), tuple(conflict_columns or ()), tuple(update_columns or ()))
+        query = self.cached_query(shape)
+
+        if query is None:
+            target = "({})".format(",".join(conflict_columns)) if conflict_columns else ""
+
+            if update_columns:
+                action = "DO UPDATE SET " + ",".join("{c} = excluded.{c}".format(c=column)
+                                                     for column in update_columns)
+            else:
+                action = "DO NOTHING"
 
-                columns += column_name + separator
-                values += ":" + column_name + separator
+            query = self.cache_query(shape, "{insert} ON CONFLICT {target} {action}".format(
+                insert=self.insert_query(table, columns), target=target, action=action))
 
-                count += 1
-                query = '''
-                    INSERT INTO {t} ({c}) 
-                    VALUES({v})
-                '''.format(t=table, c=columns, v=values)
+        return query
 
-        # Execute the query
-        cursor.executemany(query, inserts)
+    # Inserts a row, or resolves the conflict if it already exists. See upsert_query for the parameters.
+    def upsert(self, table, params, conflict_columns = None, update_columns = None):
+        self.upsert_multiple(table, [params], conflict_columns, update_columns)
 
-        # Commits changes after all inserts are finished
-        self.__db.commit()
+    # Inserts multiple rows in one statement execution, resolving conflicts with existing rows. Saving the same rows
+    # twice is a no-op. See upsert_query for the parameters.
+    # @param inserts A list of dictionaries of all columns and their values accordingly
+    def upsert_multiple(self, table, inserts, conflict_columns = None, update_columns = None):
+        if not inserts:
+            return
 
-    def is_number(self, s):
-        try:
-            float(s)
-            return True
-        except ValueError:
-            return False
-        except TypeError:
-            return False
+        cursor = self.connection().cursor()
+        cursor.executemany(self.upsert_query(table, list(inserts[0]), conflict_columns, update_columns), inserts)
+        self.written(len(inserts))
 
-    def format_value(self, value):
+    # Splits a condition in the format [condition_value, operator, separator] into its parts, filling in the defaults
+    def parse_condition(self, condition):
+        # Default operator if none given is =
+        operator = condition[1] if len(condition) > 1 else "="
 
-        if self.is_number(value):
-            return value
-        else:
-            return "'" + str(value) + "'"
+        # Default separator of none given is AND
+        separator = condition[2] if len(condition) == 3 else "AND"
 
-    def format_conditions(self, table, conditions = None):
-        formatted_conditions = "WHERE "
+        return condition[0], operator, separator
 
-        # The default case with no conditions specified will match everything
+    # Returns the parts of a set of conditions that affect the SQL text, i.e. everything but the values
+    def conditions_shape(self, conditions = None):
         if not conditions:
-            formatted_conditions = ""
-        else:
-            count = 0
-            num_conditions = len(conditions)
+            return ()
+
+        shape = []
+        for condition_name in conditions:
+            value, operator, separator = self.parse_condition(conditions[condition_name])
+
+            # IN conditions need as many placeholders as values
+            size = len(value) if operator.upper() in ('IN', 'NOT IN') else None
+            shape.append((condition_name, operator, separator, size))
 
+        return tuple(shape)
+
+    # Returns the values of a set of conditions in the order their placeholders appear
+    def conditions_values(self, conditions = None):
+        values = []
+
+        if conditions:
             for condition_name in conditions:
-                condition_value = self.format_value(conditions[condition_name][0])
+                value, operator, separator = self.parse_condition(conditions[condition_name])
 
-                # Default separator of none given is AND
-                if len(conditions[condition_name]) == 3:
-                    separator = " {} ".format(conditions[condition_name][2])
+                if operator.upper() in ('IN', 'NOT IN'):
+                    values.extend(value)
                 else:
-                    separator = " AND "
+                    values.append(value)
 
-                # Default operator if none given is =
-                operator = "="
-                if len(conditions[condition_name]) > 1:
-                    operator = conditions[condition_name][1]
+        return values
 
-                # No separator needed if this is the last condition
-                if count == num_conditions - 1:
-                    separator = ""
+    # Builds a WHERE clause with placeholders from a conditions shape
+    def format_conditions_shape(self, table, shape):
+        formatted_conditions = ""
+        num_conditions = len(shape)
 
-                # Only add rename attribute condition to table.attribute when no other table is being specified
-                if '.' not in condition_name:
-                    formatted_conditions += "{table}.{name} {operator} {value} {separator}".format(table= table,
-                        name=condition_name, operator=operator, value=condition_value, separator=separator)
-                else:
-                    formatted_conditions += "{name} {operator} {value} {separator}".format(table=table,
-                       name=condition_name, operator=operator, value=condition_value, separator=separator)
+        for count, (condition_name, operator, separator, size) in enumerate(shape):
+            placeholder = "({})".format(",".join("?" * size)) if size is not None else "?"
+
+            # No separator needed if this is the last condition
+            separator = " {} ".format(separator) if count < num_conditions - 1 else ""
 
-                count += 1
+            # Only add rename attribute condition to table.attribute when no other table is being specified
+            if '.' not in condition_name:
+                condition_name = "{table}.{name}".format(table=table, name=condition_name)
 
-        return formatted_conditions
+            formatted_conditions += "{name} {operator} {placeholder}{separator}".format(name=condition_name,
+                operator=operator, placeholder=placeholder, separator=separator)
+
+        return "WHERE " + formatted_conditions if formatted_conditions else ""
+
+    # Formats conditions into a WHERE clause with placeholders
+    # @param condtions A dictionary containing conditions in the format:
+    #   condition_name : [condition_value, operator, separator]. If separator is not given AND will be used
+    # @return A tuple containing the WHERE clause and the list of values that need to be bound to it
+    def format_conditions(self, table, conditions = None):
+        shape = ('where', table, self.conditions_shape(conditions))
+        query = self.cached_query(shape)
+
+        # The default case with no conditions specified will match everything
+        if query is None:
+            query = self.cache_query(shape, self.format_conditions_shape(table, shape[2]))
+
+        return query, self.conditions_values(conditions)
 
     # Builds an UPDATE statement for the SQLite database using the parameters given
     # @param table The table to update
@@ -136,32 +680,23 @@ class TransactionHandler:
     # @param condtions A dictionary containing conditions in the format:
     #   condition_name : [condition_value, operator, separator]. If separator is not given AND will be used
     def update(self, table, params, conditions = None):
-        cursor = self.__db
+        cursor = self.connection().cursor()
+        shape = ('update', table, tuple(params), self.conditions_shape(conditions))
+        query = self.cached_query(shape)
 
-        # Formatting the value changes for the UPDATE statement
-        values = ""
-        separator = ","
-        count = 0
-        num_params = len(params)
+        if query is None:
+            # Formatting the value changes for the UPDATE statement
+            values = ",".join("{} = ?".format(column_name) for column_name in params)
 
-        for column_name in params:
-            value = self.format_value(params[column_name])
-            if count ==  num_params - 1:
-                separator = ""
-            values += "{} = {}{}".format(column_name, value, separator)
-            count += 1
+            # Formatting the conditions for the UPDATE statement
+            formatted_conditions = self.format_conditions_shape(table, shape[3])
 
-        # Formatting the conditions for the UPDATE statement
-        formatted_conditions = self.format_conditions(table, conditions)
+            query = self.cache_query(shape, "UPDATE {t} SET {v} {c}".format(t=table, v=values,
+                                                                            c=formatted_conditions))
 
-        query = '''
-            UPDATE {t}
-            SET {v} 
-            {c}
-        '''.format(t=table, v=values, c=formatted_conditions)
-        cursor.execute(query)
+        cursor.execute(query, list(params.values()) + self.conditions_values(conditions))
 
-        self.__db.commit()
+        self.written(max(cursor.rowcount, 1))
 
     # Formats joins to be used in a SELECT query
     # @param joins A dictionary in the format table_name : [INNER/LEFT,ON]
@@ -183,35 +718,32 @@ class TransactionHandler:
     # @param condtions A dictionary containing conditions in the format:
     #   condition_name : [condition_value, operator, separator]. If separator is not given AND will be used
     # @param joins A dictionary in the format table_name : [INNER/LEFT,ON]
+    # @return A tuple containing the query and the list of values that need to be bound to it
     def select_query(self, table, columns=None, conditions=None, joins=None, group_by=None):
-
-        # If no columns are given we'll select all columns
-        formatted_columns = "*"
-
-        if columns:
-            formatted_columns = ""
-            separator = ","
-
-            for column_name in columns[:-1]:
-                formatted_columns += column_name + separator
-            else:
-                separator = ""
-                formatted_columns += columns[-1] + separator
-
-        # If no condition is given, we will match everything
-        formatted_conditions = self.format_conditions(table, conditions)
-        formatted_joins = self.format_joins(joins)
-        formatted_group = "GROUP BY {}".format(group_by) if group_by else ""
-
-        query = '''
-            SELECT {cols} 
-            FROM {t} 
-            {j} 
-            {cond}
-            {group}
-        '''.format(cols=formatted_columns, t=table,j=formatted_joins,cond=formatted_conditions,group=formatted_group)
-
-        return query
+        joins_shape = tuple((join_table, tuple(joins[join_table])) for join_table in joins) if joins else ()
+        shape = ('select', table, tuple(columns) if columns else (), self.conditions_shape(conditions), joins_shape,
+                 group_by)
+        query = self.cached_query(shape)
+
+        if query is None:
+            # If no columns are given we'll select all columns
+            formatted_columns = ",".join(columns) if columns else "*"
+
+            # If no condition is given, we will match everything
+            formatted_conditions = self.format_conditions_shape(table, shape[3])
+            formatted_joins = self.format_joins(joins)
+            formatted_group = "GROUP BY {}".format(group_by) if group_by else ""
+
+            query = self.cache_query(shape, '''
+                SELECT {cols}
+                FROM {t}
+                {j}
+                {cond}
+                {group}
+            '''.format(cols=formatted_columns, t=table, j=formatted_joins, cond=formatted_conditions,
+                       group=formatted_group))
+
+        return query, self.conditions_values(conditions)
 
     # Turns a row into a key : value dictionary from a tuple
     def dict_factory(self, cursor, row):
@@ -220,43 +752,127 @@ class TransactionHandler:
             d[col[0]] = row[idx]
         return d
 
+    # Whether a column can be a slot of a record, i.e. it's a valid attribute name that's neither a keyword, such as
+    # a column named class or from, nor the name of something every record has, such as keys or self, nor mangled
+    @staticmethod
+    def is_record_column(column):
+        return column.isidentifier() and not keyword.iskeyword(column) and column != 'self' \
+            and not column.startswith('__') and not hasattr(Record, column)
+
+    # Returns a class with __slots__ for the given columns, generating it the first time these columns are seen
+    # @return None if the columns can't be used as attribute names, e.g. when they're duplicated, contain
+    # expressions or are keywords
+    @staticmethod
+    def record_class(columns):
+        columns = tuple(columns)
+
+        if columns not in TransactionHandler.__records:
+            record_class = None
+
+            if all(TransactionHandler.is_record_column(column) for column in columns) \
+                    and len(set(columns)) == len(columns):
+                # A generated __init__ assigns each slot directly, which is much faster than a loop with setattr
+                source = "def __init__(self, {args}):\n    {body}\n".format(
+                    args=", ".join(columns), body="\n    ".join("self.{c} = {c}".format(c=c) for c in columns))
+                namespace = {}
+                exec(source, namespace)
+                record_class = type('Record', (Record,), {'__slots__': columns, '__init__': namespace['__init__']})
+
+            TransactionHandler.__records[columns] = record_class
+
+        return TransactionHandler.__records[columns]
+
+    # Returns the row factory for a cursor that has just executed a query, according to the handler's row type
+    def row_factory(self, cursor):
+        if self.row_type == 'tuple' or not cursor.description:
+            return None
+        elif self.row_type == 'row':
+            return sqlite3.Row
+
+        # Column names are only read once per query instead of once per row
+        columns = [description[0] for description in cursor.description]
+
+        if self.row_type == 'record':
+            record_class = self.record_class(columns)
+            if record_class:
+                return lambda cursor, row: record_class(*row)
+            return sqlite3.Row
+
+        return lambda cursor, row: dict(zip(columns, row))
+
+    # Executes a query and returns the cursor, set up to return rows of the handler's row type
+    # @param values The values bound to the query's placeholders
+    def execute(self, query, values=()):
+        cursor = self.connection().cursor()
+        cursor.execute(query, values)
+        cursor.row_factory = self.row_factory(cursor)
+        return cursor
+
     # Selects one element that matches given conditions
     def select_one(self, table, columns=None, conditions=None, joins=None):
-        cursor = self.__db.cursor()
-        query = self.select_query(table, columns, conditions, joins)
-        cursor.execute(query)
-        return cursor.fetchone()
+        query, values = self.select_query(table, columns, conditions, joins)
+        return self.execute(query, values).fetchone()
 
     # Selects many elements that match given conditions
     # @param amount The amount of elements to return
     def select_many(self, table, columns=None, conditions=None, joins=None, limit = 1):
-        cursor = self.__db.cursor()
-        query = self.select_query(table, columns, conditions, joins)
-        cursor.execute(query)
-        return cursor.fetchmany(limit)
+        query, values = self.select_query(table, columns, conditions, joins)
+        return self.execute(query, values).fetchmany(limit)
 
-    def execute_select_all(self, query):
-        cursor = self.__db.cursor()
-        cursor.execute(query)
-        return cursor.fetchall()
+    # Executes a query and returns all resulting rows
+    # @param values The values bound to the query's placeholders
+    def execute_select_all(self, query, values=()):
+        return self.execute(query, values).fetchall()
 
     # Selects all elements that match a query
     def select_all(self, table, columns=None, conditions=None, joins=None, group_by=None):
-        cursor = self.__db.cursor()
-        query = self.select_query(table, columns, conditions, joins, group_by)
-        cursor.execute(query)
-        return cursor.fetchall()
+        query, values = self.select_query(table, columns, conditions, joins, group_by)
+        return self.execute(query, values).fetchall()
+
+    # Executes a query and returns the cursor, set up to return plain tuples no matter the handler's row type
+    # @param values The values bound to the query's placeholders
+    def execute_tuples(self, query, values=()):
+        cursor = self.connection().cursor()
+        cursor.row_factory = None
+        return cursor.execute(query, values)
+
+    # Selects all rows that match the conditions as plain tuples, no matter the handler's row type
+    def select_tuples(self, table, columns=None, conditions=None, joins=None, group_by=None):
+        query, values = self.select_query(table, columns, conditions, joins, group_by)
+        return self.execute_tuples(query, values).fetchall()
+
+    # Selects the value of a single column from the first row that matches the conditions
+    # @return None if no row matches
+    def select_value(self, table, column, conditions=None, joins=None):
+        query, values = self.select_query(table, [column], conditions, joins)
+        cursor = self.connection().cursor()
+        cursor.row_factory = None
+        row = cursor.execute(query, values).fetchone()
+        return row[0] if row else None
+
+    # Selects the given columns of all rows that match the conditions into NumPy arrays, one per column, for
+    # analytical code that works on whole columns instead of rows.
+    # @param dtypes An optional dictionary in the format column : NumPy dtype
+    # @return A dictionary in the format column : array
+    def select_columns(self, table, columns, conditions=None, joins=None, dtypes=None):
+        import numpy as np
+
+        rows = self.select_tuples(table, columns, conditions, joins)
+        names = [column.split('.')[-1].split(' ')[-1] for column in columns]
+        dtypes = dtypes or {}
+        column_values = list(zip(*rows)) if rows else [()] * len(names)
+
+        return {name: np.array(column_values[index], dtype=dtypes.get(name))
+                for index, name in enumerate(names)}
 
     # Selects a random item from a table that has a primary key
     def select_random(self, table, conditions=None):
-        cursor = self.__db.cursor()
-        conditions = self.format_conditions(table=table, conditions=conditions)
+        formatted_conditions, values = self.format_conditions(table=table, conditions=conditions)
 
         query = '''
                 SELECT * FROM {table}
                 WHERE id >= (abs(random()) % (SELECT max(id) FROM {table} {conditions}))
                 LIMIT 1;
-                '''.format(table=table, conditions=conditions)
+                '''.format(table=table, conditions=formatted_conditions)
 
-        cursor.execute(query)
-        return cursor.fetchone()
+        return self.execute(query, values).fetchone()
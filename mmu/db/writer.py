@@ -0,0 +1,125 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from mmu.db.transaction import TransactionHandler
+
+
+# A background thread that owns the write connection of a database and applies writes submitted by other threads.
+# sqlite only allows one writer at a time, so instead of every thread competing for the write lock, writes are queued
+# and applied by this thread in groups, one transaction per group. The queue is bounded: once it's full, submitting a
+# write blocks until the writer catches up.
+class DatabaseWriter:
+
+    # @param max_pending How many writes can be queued before submit blocks
+    # @param group_size The maximum number of writes committed in one transaction
+    # @param group_interval How many seconds the writer waits for more writes before committing a group
+    def __init__(self, db_name = 'default', max_pending = 1000, group_size = 500, group_interval = 0.1):
+        self.__db_name = db_name
+        self.__queue = queue.Queue(maxsize=max_pending)
+        self.__group_size = group_size
+        self.__group_interval = group_interval
+        self.__closed = False
+
+        self.__thread = threading.Thread(target=self.run, name='DatabaseWriter', daemon=True)
+        self.__thread.start()
+
+    # The path of the database the writer writes to
+    def database_path(self):
+        return TransactionHandler.database_path(self.__db_name)
+
+    # Queues a write. The function is called in the writer's thread, so methods of handlers created in other threads
+    # use the writer's connection.
+    # @return A Future that holds the function's result once its transaction is committed
+    def submit(self, function, *args, **kwargs):
+        if self.__closed:
+            raise RuntimeError("The database writer has been closed")
+
+        future = Future()
+        self.__queue.put((function, args, kwargs, future))
+        return future
+
+    # Blocks until all writes queued so far are committed
+    def flush(self):
+        self.__queue.join()
+
+    # Commits the remaining writes and stops the writer's thread
+    def close(self):
+        if self.__closed:
+            return
+
+        self.__closed = True
+        self.__queue.put(None)
+        self.__thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    # Takes the next group of writes from the queue, waiting for the first one as long as it takes
+    # @return The writes and whether or not the writer was closed
+    def next_group(self):
+        commands = []
+        command = self.__queue.get()
+        deadline = time.monotonic() + self.__group_interval
+
+        while command is not None:
+            commands.append(command)
+            if len(commands) >= self.__group_size:
+                return commands, False
+
+            try:
+                command = self.__queue.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                return commands, False
+
+        # The sentinel put by close() is done as soon as it's taken
+        self.__queue.task_done()
+        return commands, True
+
+    # The writer thread's loop
+    def run(self):
+        handler = TransactionHandler(self.__db_name)
+        closed = False
+
+        while not closed:
+            commands, closed = self.next_group()
+            self.apply(handler, commands)
+
+        # Handlers used by the writes opened connections of this thread as well
+        TransactionHandler.close_thread_connections()
+
+    # Applies a group of writes in one transaction. Every write runs in its own savepoint, so a failing write is rolled
+    # back on its own and its exception is passed to its future, without affecting the rest of the group.
+    def apply(self, handler, commands):
+        results = []
+        db = handler.connection()
+
+        try:
+            with handler.transaction():
+                for function, args, kwargs, future in commands:
+                    db.execute('SAVEPOINT command')
+                    try:
+                        results.append((future, function(*args, **kwargs), None))
+                        db.execute('RELEASE command')
+                    except Exception as e:
+                        handler.rollback('command')
+                        db.execute('RELEASE command')
+                        results.append((future, None, e))
+
+            for future, result, exception in results:
+                if exception:
+                    future.set_exception(exception)
+                else:
+                    future.set_result(result)
+        except Exception as e:
+            # Nothing of the group was committed
+            for function, args, kwargs, future in commands:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            for command in commands:
+                self.__queue.task_done()
@@ -0,0 +1,145 @@
+import os
+import io
+import gzip
+import shutil
+import hashlib
+import tempfile
+
+from mmu.utility.helper import Helper
+
+
+# Stores files by the SHA-256 of their content, e.g. the pdfs of issues, so that a file downloaded twice is only kept
+# once. Files are spread over two levels of directories named after the first characters of their hash, which keeps
+# every directory small no matter how large the archive grows, and they can be gzipped on the way in. Rows refer to a
+# stored file with a reference in the form blob:<sha256>, which is what open and verify accept along with plain paths,
+# so files saved before the store existed can still be read.
+class BlobStore:
+
+    prefix = 'blob:'
+
+    # @param directory Where files are stored, by default pdfs/store under the working directory
+    # @param compress Whether new files are gzipped. Files stored either way can be read regardless.
+    def __init__(self, directory = None, compress = False):
+        self.__directory = directory or os.path.join(os.getcwd(), 'pdfs', 'store')
+        self.__compress = compress
+
+    # The reference rows store for a file's hash
+    @staticmethod
+    def reference(sha256):
+        return BlobStore.prefix + sha256
+
+    # Checks if a file reference points to the store
+    @staticmethod
+    def is_reference(file):
+        return isinstance(file, str) and file.startswith(BlobStore.prefix)
+
+    # The path of a file in the store, by its hash. Gzipped files have .gz added.
+    def path(self, sha256, compressed = False):
+        return os.path.join(self.__directory, sha256[0:2], sha256[2:4], sha256 + ('.gz' if compressed else ''))
+
+    # Finds where a file of the store is
+    # @return The path and whether the file is gzipped, or None if the store doesn't have the file
+    def locate(self, sha256):
+        for compressed in (False, True):
+            path = self.path(sha256, compressed)
+            if os.path.isfile(path):
+                return path, compressed
+
+        return None
+
+    # Checks if the store has a file
+    def exists(self, reference):
+        return self.locate(self.sha256(reference)) is not None
+
+    # The hash of a file reference
+    def sha256(self, reference):
+        return reference[len(self.prefix):] if self.is_reference(reference) else reference
+
+    # Moves a file into the store, unless the store already has a file with the same content, in which case the file
+    # is deleted
+    # @param sha256 The file's hash, if it's known already, e.g. from the download
+    # @return The reference of the stored file
+    def put(self, source_path, sha256 = None):
+        sha256 = sha256 or Helper.file_sha256(source_path)
+
+        if self.locate(sha256):
+            os.remove(source_path)
+            return self.reference(sha256)
+
+        path = self.path(sha256, self.__compress)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        if self.__compress:
+            # Written to a temporary file next to its path first, so a crash never leaves a truncated file behind
+            descriptor, temporary_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            try:
+                with open(source_path, 'rb') as source, os.fdopen(descriptor, 'wb') as target:
+                    with gzip.GzipFile(fileobj=target, mode='wb', mtime=0) as compressed:
+                        shutil.copyfileobj(source, compressed)
+
+                os.replace(temporary_path, path)
+            except BaseException:
+                os.remove(temporary_path)
+                raise
+
+            os.remove(source_path)
+        else:
+            os.replace(source_path, path)
+
+        return self.reference(sha256)
+
+    # Opens a stored file for reading, decompressing it if it's gzipped. Plain paths are opened as they are.
+    # @return A seekable binary file-like object
+    # @raise FileNotFoundError if the file doesn't exist
+    def open(self, file):
+        if not self.is_reference(file):
+            return open(file, 'rb')
+
+        location = self.locate(self.sha256(file))
+        if location is None:
+            raise FileNotFoundError("The store has no file " + file)
+
+        path, compressed = location
+        if not compressed:
+            return open(path, 'rb')
+
+        # pdf parsers seek all over the file, which gzip streams are slow at, so the file is decompressed in memory
+        with gzip.open(path, 'rb') as compressed_file:
+            return io.BytesIO(compressed_file.read())
+
+    # Checks that a file exists and that its content is the one it was stored with
+    # @param sha256 The hash a plain path should have, if it's known
+    def verify(self, file, sha256 = None):
+        if self.is_reference(file):
+            sha256 = self.sha256(file)
+            if not self.exists(file):
+                return False
+        elif not os.path.isfile(file):
+            return False
+
+        if not sha256:
+            return True
+
+        digest = hashlib.sha256()
+        with self.open(file) as stored_file:
+            for chunk in iter(lambda: stored_file.read(65536), b''):
+                digest.update(chunk)
+
+        return digest.hexdigest() == sha256
+
+    # Deletes the stored files that nothing refers to anymore
+    # @param references The counts of the references to files of every database issues are saved to, e.g.
+    #   IssueHandler.count_file_references, or Shards.count_file_references when issues are sharded by year
+    # @return How many files were deleted
+    def collect(self, references):
+        referenced = set(self.sha256(file) for file, count in references.items() if count and self.is_reference(file))
+        deleted = 0
+
+        for directory, directories, files in os.walk(self.__directory):
+            for name in files:
+                sha256 = name[:-3] if name.endswith('.gz') else name
+                if sha256 not in referenced and not name.endswith('.tmp'):
+                    os.remove(os.path.join(directory, name))
+                    deleted += 1
+
+        return deleted
@@ -0,0 +1,237 @@
+import os
+import time
+import hashlib
+import threading
+import http.client
+import urllib.parse
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+from mmu.utility.helper import Helper
+from mmu.utility.rate_limit import parse_retry_after
+
+
+# Raised when a file couldn't be downloaded completely. A partial file is kept, so the next attempt resumes it.
+class DownloadError(Exception):
+    pass
+
+
+# Downloads files over keep-alive connections, which are kept per thread and per host and reused by the next download
+# from the same host. A file is written to a .part file next to its path and only moved to its path once it's complete,
+# so a crash never leaves a truncated file behind, and the next download of the file resumes the .part file with a
+# Range request. The SHA-256 of every file is computed while it's written.
+class Downloader:
+
+    redirect_statuses = (301, 302, 303, 307, 308)
+
+    # @param rate_limiter A HostRateLimiter that's told how every response went, so that it slows down when the
+    #   server is overloaded. Waiting for the rate is left to the caller, e.g. DownloadPool.host_limit.
+    def __init__(self, timeout = 240, max_redirects = 5, chunk_size = 65536, rate_limiter = None):
+        self.__timeout = timeout
+        self.__max_redirects = max_redirects
+        self.__chunk_size = chunk_size
+        self.__local = threading.local()
+        self.__rate_limiter = rate_limiter
+
+    # The calling thread's open connection to a host, opened the first time it's needed
+    def connection(self, scheme, host):
+        if not hasattr(self.__local, 'connections'):
+            self.__local.connections = {}
+
+        connections = self.__local.connections
+
+        if (scheme, host) not in connections:
+            connection_class = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+            connections[(scheme, host)] = connection_class(host, timeout=self.__timeout)
+
+        return connections[(scheme, host)]
+
+    # Closes the calling thread's connection to a host, e.g. after an error left it in an unknown state
+    def drop_connection(self, scheme, host):
+        connection = getattr(self.__local, 'connections', {}).pop((scheme, host), None)
+        if connection:
+            connection.close()
+
+    # Sends a GET request, following http redirects. A connection that the server closed while it was idle is opened
+    # again once.
+    # @return The response and the url it came from
+    def request(self, url, headers = None):
+        for redirect in range(self.__max_redirects + 1):
+            parts = urllib.parse.urlsplit(url)
+            path = urllib.parse.urlunsplit(('', '', parts.path or '/', parts.query, ''))
+
+            for attempt in range(2):
+                connection = self.connection(parts.scheme, parts.netloc)
+                start = time.monotonic()
+                try:
+                    connection.request('GET', path, headers=headers or {})
+                    response = connection.getresponse()
+                    break
+                except (http.client.HTTPException, OSError) as e:
+                    self.drop_connection(parts.scheme, parts.netloc)
+                    if attempt:
+                        if self.__rate_limiter:
+                            self.__rate_limiter.feedback(url, None)
+                        raise DownloadError("Requesting {} failed: {}".format(url, e))
+
+            if self.__rate_limiter:
+                self.__rate_limiter.feedback(url, response.status, time.monotonic() - start,
+                                             parse_retry_after(response.getheader('Retry-After')))
+
+            if response.status not in self.redirect_statuses:
+                return response, url
+
+            response.read()
+            url = urllib.parse.urljoin(url, response.getheader('Location', ''))
+
+        raise DownloadError("Too many redirects for " + url)
+
+    # Computes the SHA-256 of a file that's already partly downloaded
+    def hash_file(self, digest, path):
+        with open(path, 'rb') as file:
+            for chunk in iter(lambda: file.read(self.__chunk_size), b''):
+                digest.update(chunk)
+
+    # Downloads a url into a file, resuming a partial download of it if there is one
+    # @return The SHA-256 of the file, as a hex string
+    # @raise DownloadError if the file couldn't be downloaded completely
+    def download(self, url, path):
+        part_path = path + '.part'
+        offset = os.path.getsize(part_path) if os.path.isfile(part_path) else 0
+        digest = hashlib.sha256()
+
+        response, url = self.request(url, {'Range': 'bytes={}-'.format(offset)} if offset else None)
+        parts = urllib.parse.urlsplit(url)
+        content_range = response.getheader('Content-Range', '')
+        total = content_range.rpartition('/')[2]
+
+        if response.status == 206 and offset and content_range.startswith('bytes {}-'.format(offset)):
+            self.hash_file(digest, part_path)
+            mode = 'ab'
+            expected = int(total) if total.isdigit() else None
+        elif response.status == 416 and offset and total == str(offset):
+            # The .part file was complete already, the crash happened before it was moved
+            response.read()
+            self.hash_file(digest, part_path)
+            os.replace(part_path, path)
+            return digest.hexdigest()
+        elif response.status == 200:
+            # Nothing was downloaded before, or the server ignored the range and the download starts over
+            offset = 0
+            mode = 'wb'
+            length = response.getheader('Content-Length')
+            expected = int(length) if length and length.isdigit() else None
+        else:
+            response.read()
+
+            # A range that doesn't continue the .part file means it doesn't belong to this file anymore
+            if response.status in (206, 416) and offset:
+                os.remove(part_path)
+
+            raise DownloadError("Downloading {} failed with HTTP status {}".format(url, response.status))
+
+        size = offset
+        try:
+            with open(part_path, mode) as file:
+                for chunk in iter(lambda: response.read(self.__chunk_size), b''):
+                    file.write(chunk)
+                    digest.update(chunk)
+                    size += len(chunk)
+        except (http.client.HTTPException, OSError) as e:
+            self.drop_connection(parts.scheme, parts.netloc)
+            raise DownloadError("Downloading {} was interrupted after {} bytes: {}".format(url, size, e))
+
+        if response.will_close:
+            self.drop_connection(parts.scheme, parts.netloc)
+
+        if expected is not None and size != expected:
+            raise DownloadError("Downloaded {} of {} bytes of {}".format(size, expected, url))
+
+        os.replace(part_path, path)
+        return digest.hexdigest()
+
+    # Closes the calling thread's connections
+    def close(self):
+        for scheme, host in list(getattr(self.__local, 'connections', {})):
+            self.drop_connection(scheme, host)
+
+
+# A bounded pool of threads for network work, such as following an issue's redirects and downloading its pdf. Requests
+# to the same host are limited separately from the size of the pool, so that many downloads run at once without
+# overloading any one server, and submitting blocks once too many tasks are pending, so that a crawl doesn't queue up
+# the links of thousands of pages before downloading any of them.
+class DownloadPool:
+
+    # @param max_workers How many tasks run at once
+    # @param per_host How many requests run at once against the same host
+    # @param max_pending How many tasks can be submitted, running or waiting, before submit blocks
+    # @param rate_limiter A HostRateLimiter every request waits for, e.g. one shared by the whole crawl
+    # @param timeout How many seconds a download may wait for the server, see Downloader
+    def __init__(self, max_workers = 16, per_host = 4, max_pending = None, rate_limiter = None, timeout = 240):
+        self.__executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='DownloadPool')
+        self.__per_host = per_host
+        self.__pending = threading.BoundedSemaphore(max_pending or max_workers * 2)
+        self.__hosts = {}
+        self.__hosts_lock = threading.Lock()
+        self.__downloader = Downloader(timeout=timeout, rate_limiter=rate_limiter)
+        self.__rate_limiter = rate_limiter
+
+    # The host part of a url, which requests are limited by
+    @staticmethod
+    def host(url):
+        return urllib.parse.urlsplit(url).netloc.lower()
+
+    # The semaphore that limits the requests to a url's host, created the first time the host is seen
+    def host_semaphore(self, url):
+        host = self.host(url)
+
+        with self.__hosts_lock:
+            if host not in self.__hosts:
+                self.__hosts[host] = threading.BoundedSemaphore(self.__per_host)
+
+            return self.__hosts[host]
+
+    # Holds a slot of a url's host for a request, waiting for the rate limit once the slot is free
+    @contextmanager
+    def host_limit(self, url):
+        with self.host_semaphore(url):
+            if self.__rate_limiter:
+                self.__rate_limiter.acquire(url)
+
+            yield
+
+    # Runs a function in the pool. Blocks while the pool has max_pending tasks already.
+    # @return A Future that holds the function's result
+    def submit(self, function, *args, **kwargs):
+        self.__pending.acquire()
+
+        try:
+            future = self.__executor.submit(function, *args, **kwargs)
+        except Exception:
+            self.__pending.release()
+            raise
+
+        future.add_done_callback(lambda future: self.__pending.release())
+        return future
+
+    # Gets the contents of a url, waiting for a free slot of its host first. Meant to be called from the pool's tasks.
+    def get_url_contents(self, url, content_type = ''):
+        with self.host_limit(url):
+            return Helper.get_url_contents(url, content_type)
+
+    # Downloads a url into a file, waiting for a free slot of its host first. Meant to be called from the pool's tasks.
+    # See Downloader.download.
+    # @return The SHA-256 of the file
+    def download(self, url, file_name, folder):
+        with self.host_limit(url):
+            return self.__downloader.download(url, os.path.join(folder, file_name))
+
+    # Waits for the running tasks and stops the pool's threads
+    def close(self):
+        self.__executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -7,6 +7,9 @@ import json
 import collections
 import datetime
 import re
+import unicodedata
+import hashlib
+import http.client
 
 # Helper class that defines useful formatting and file handling functions
 class Helper:
@@ -42,11 +45,36 @@ class Helper:
 
         return ' '.join(name.split())
 
+    # Translations used by normalize_greek_text, filled in as new characters are seen
+    greek_text_table = {}
+
+    # Converts text to uppercase without accents, with latin characters that look like greek ones replaced by them, so
+    # that it can be searched regardless of case and accents. Unlike normalize_greek_name, every character is replaced
+    # by exactly one character, so positions in the normalized text are the same as in the original.
+    @staticmethod
+    def normalize_greek_text(text):
+        table = Helper.greek_text_table
+        lookalikes = {'A': 'Α', 'B': 'Β', 'E': 'Ε', 'H': 'Η', 'I': 'Ι', 'K': 'Κ', 'M': 'Μ', 'N': 'Ν', 'O': 'Ο',
+                      'T': 'Τ', 'X': 'Χ', 'Y': 'Υ', 'Z': 'Ζ'}
+
+        for code in set(map(ord, text)) - table.keys():
+            char = unicodedata.normalize('NFD', chr(code))[0].upper()
+            char = lookalikes.get(char, char)
+            table[code] = char if len(char) == 1 else chr(code)
+
+        return text.translate(table)
+
     @staticmethod
     # Performs an http request and returns the response
-    def get_url_contents(link, content_type=''):
+    # @param rate_limiter A HostRateLimiter the request waits for, e.g. to keep to a site's limits
+    def get_url_contents(link, content_type='', rate_limiter=None):
         try:
-            with urllib.request.urlopen(link, data=None, timeout=240) as url:
+            if rate_limiter:
+                response = rate_limiter.open(link, timeout=240)
+            else:
+                response = urllib.request.urlopen(link, data=None, timeout=240)
+
+            with response as url:
                 response = url.read().decode("utf-8")
 
                 if content_type == 'json':
@@ -80,19 +108,42 @@ class Helper:
             return os.path.basename(urllib.parse.urlsplit(open_request.url)[2])
 
         request = Request(url)
-        r = urllib.request.urlopen(request)
+        try:
+            r = urllib.request.urlopen(request)
+        except urllib.error.URLError as e:
+            print(e)
+            return False
 
+        # The file is written next to its path and moved there once it's complete, so a failed download doesn't
+        # leave a truncated file behind
         try:
             if not file_name:
                 file_name = get_file_name(r)
 
             file_path = os.path.join(folder, file_name)
 
-            with open(file_path, 'wb') as f:
+            with open(file_path + '.part', 'wb') as f:
                 shutil.copyfileobj(r, f)
+
+            os.replace(file_path + '.part', file_path)
+        except (OSError, http.client.HTTPException) as e:
+            print(e)
+            return False
         finally:
             r.close()
-            return True
+
+        return True
+
+    # Computes the SHA-256 of a file
+    # @return The hash as a hex string
+    @staticmethod
+    def file_sha256(path):
+        digest = hashlib.sha256()
+        with open(path, 'rb') as file:
+            for chunk in iter(lambda: file.read(65536), b''):
+                digest.update(chunk)
+
+        return digest.hexdigest()
 
     # Clears wikipedia annotations from a string
     @staticmethod
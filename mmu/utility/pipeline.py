@@ -0,0 +1,106 @@
+import queue
+import threading
+
+
+# Runs items through a series of stages, each one with its own worker threads, connected by bounded queues. An item
+# moves on to the next stage as soon as a stage is done with it, so the stages work at the same time instead of one
+# after the other. Once a stage's queue is full, the stage before it blocks until there's room, which keeps a fast
+# stage from piling up work for a slow one.
+class Pipeline:
+
+    # @param on_worker_exit Called by every worker thread before it ends, e.g. to close the thread's connections
+    def __init__(self, on_worker_exit = None):
+        self.__on_worker_exit = on_worker_exit
+        self.__stages = []
+        self.__lock = threading.Lock()
+        self.__started = False
+        self.__closed = False
+
+    # Adds a stage after the ones added so far
+    # @param function Called with each item of the stage. What it returns is passed to the next stage, unless it's None.
+    # @param workers How many items the stage handles at once
+    # @param max_pending How many items can wait for the stage before the stage before it blocks
+    def add_stage(self, name, function, workers = 1, max_pending = 100):
+        if self.__started:
+            raise RuntimeError("Stages can't be added to a running pipeline")
+
+        self.__stages.append({'name': name, 'function': function, 'workers': workers,
+                              'queue': queue.Queue(maxsize=max_pending), 'threads': [], 'done': 0, 'failed': 0})
+        return self
+
+    # Starts the workers of all stages
+    def start(self):
+        if self.__started:
+            return
+
+        self.__started = True
+        for index, stage in enumerate(self.__stages):
+            stage['threads'] = [threading.Thread(target=self.work, args=(index,), daemon=True,
+                                                 name='{}-{}'.format(stage['name'], number))
+                                for number in range(stage['workers'])]
+            for thread in stage['threads']:
+                thread.start()
+
+    # Passes an item to the first stage, blocking while the stage's queue is full
+    def put(self, item):
+        if self.__closed:
+            raise RuntimeError("The pipeline has been closed")
+
+        self.start()
+        self.__stages[0]['queue'].put(item)
+
+    # Waits for all items put so far to go through every stage and stops the workers
+    def close(self):
+        if self.__closed:
+            return
+
+        self.__closed = True
+        self.start()
+
+        # A stage is only stopped once the stage before it is, since until then more items may come
+        for stage in self.__stages:
+            for thread in stage['threads']:
+                stage['queue'].put(None)
+            for thread in stage['threads']:
+                thread.join()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    # How many items each stage handled and how many of them failed
+    # @return A dictionary of the counts by the name of the stage
+    def counts(self):
+        with self.__lock:
+            return {stage['name']: {'done': stage['done'], 'failed': stage['failed']} for stage in self.__stages}
+
+    # A worker's loop. An item that fails is dropped, so one bad item doesn't stop the pipeline.
+    def work(self, index):
+        stage = self.__stages[index]
+        next_queue = self.__stages[index + 1]['queue'] if index + 1 < len(self.__stages) else None
+
+        try:
+            while True:
+                item = stage['queue'].get()
+                if item is None:
+                    break
+
+                try:
+                    result = stage['function'](item)
+                except Exception as e:
+                    print("The", stage['name'], "stage failed for", item, e)
+                    with self.__lock:
+                        stage['failed'] += 1
+                    continue
+
+                with self.__lock:
+                    stage['done'] += 1
+
+                if result is not None and next_queue is not None:
+                    next_queue.put(result)
+        finally:
+            if self.__on_worker_exit:
+                self.__on_worker_exit()
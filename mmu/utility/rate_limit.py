@@ -0,0 +1,199 @@
+import time
+import threading
+import datetime
+import email.utils
+import urllib.error
+import urllib.parse
+import urllib.request
+
+
+# Reads a Retry-After header, which is either a number of seconds or a date
+# @param maximum The longest wait that's honoured, so that a misconfigured server doesn't stall a crawl for hours
+# @return How many seconds to wait, or None if the header is missing or invalid
+def parse_retry_after(value, maximum = 300):
+    if not value:
+        return None
+
+    value = value.strip()
+    if value.isdigit():
+        return min(int(value), maximum)
+
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+
+    return min(max((date - datetime.datetime.now(datetime.timezone.utc)).total_seconds(), 0), maximum)
+
+
+# Limits how often something happens across all threads, e.g. the requests of a crawl, with a token bucket: tokens
+# are added at a steady rate up to a maximum, and every request takes one, waiting for it if there's none left. Waits
+# are reserved in order, so threads that wait together are spread out instead of all going at once.
+# The rate adapts to how the server copes: it's halved whenever the server says it's overloaded and lowered a bit when
+# its responses get slow, and it climbs back towards its maximum by a step with every response that's fine.
+class RateLimiter:
+
+    # @param rate How many requests are allowed per second on average, at most
+    # @param burst How many requests can be made at once after a quiet period
+    # @param min_rate The rate the limiter never slows down below, by default a tenth of rate
+    # @param slow_response How many seconds a response may take before the limiter slows down, or None to ignore
+    #   response times
+    def __init__(self, rate, burst = 1, min_rate = None, slow_response = None):
+        if rate <= 0:
+            raise ValueError("The rate must be positive")
+
+        self.__max_rate = rate
+        self.__rate = rate
+        self.__min_rate = min(min_rate or rate / 10, rate)
+        self.__slow_response = slow_response
+        self.__capacity = burst
+        self.__tokens = burst
+        self.__updated = time.monotonic()
+        self.__lock = threading.Lock()
+
+    # The current rate
+    def rate(self):
+        return self.__rate
+
+    # Adds the tokens earned since the last update. Called with the lock held.
+    def refill(self):
+        now = time.monotonic()
+        self.__tokens = min(self.__capacity, self.__tokens + (now - self.__updated) * self.__rate)
+        self.__updated = now
+
+    # Takes a token, waiting until one is available
+    # @return How many seconds were spent waiting
+    def acquire(self):
+        with self.__lock:
+            self.refill()
+
+            # A missing token is borrowed from the future, so that the next thread waits for the one after it
+            self.__tokens -= 1
+            wait = -self.__tokens / self.__rate if self.__tokens < 0 else 0
+
+        if wait:
+            time.sleep(wait)
+
+        return wait
+
+    # Slows down
+    # @param factor What the rate is multiplied by
+    # @param retry_after How many seconds the server asked to wait, in which case no token is given out until then
+    def throttle(self, factor = 0.5, retry_after = None):
+        with self.__lock:
+            self.refill()
+            self.__rate = max(self.__min_rate, self.__rate * factor)
+
+            # The wait is a debt of tokens, paid back at the new rate
+            if retry_after:
+                self.__tokens = min(self.__tokens, 0) - retry_after * self.__rate
+
+    # Speeds up by a twentieth of the maximum rate, up to the maximum
+    def recover(self):
+        with self.__lock:
+            self.refill()
+            self.__rate = min(self.__max_rate, self.__rate + self.__max_rate / 20)
+
+    # Adapts the rate to a response
+    # @param status The response's http status, or None if the request failed without one
+    # @param elapsed How many seconds the response took
+    # @param retry_after The seconds of the response's Retry-After header
+    def feedback(self, status, elapsed = None, retry_after = None):
+        if status is None or status == 429 or status >= 500:
+            self.throttle(retry_after=retry_after)
+        elif self.__slow_response and elapsed is not None and elapsed > self.__slow_response:
+            self.throttle(factor=0.8)
+        else:
+            self.recover()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+# Rate limits requests by host, with a RateLimiter per host, so that a slow or overloaded server only slows down the
+# requests that go to it. Shared by everything that requests pages from the same servers, e.g. the whole crawl.
+class HostRateLimiter:
+
+    # Statuses that mean the server is overloaded or failed for a while, after which a request is sent again
+    retry_statuses = (429, 500, 502, 503, 504)
+
+    # @param rate How many requests per second each host gets at most
+    # @param retries How many times open sends a request again after a status of retry_statuses
+    # @param options The options of every host's RateLimiter, e.g. min_rate and slow_response
+    def __init__(self, rate, burst = 1, retries = 2, **options):
+        if rate <= 0:
+            raise ValueError("The rate must be positive")
+
+        self.__rate = rate
+        self.__burst = burst
+        self.__retries = retries
+        self.__options = options
+        self.__limiters = {}
+        self.__lock = threading.Lock()
+
+    # The host part of a url or a urllib Request, which requests are limited by
+    @staticmethod
+    def host(url):
+        url = url.full_url if isinstance(url, urllib.request.Request) else url
+        return urllib.parse.urlsplit(url).netloc.lower()
+
+    # The RateLimiter of a url's host, created the first time the host is seen
+    def limiter(self, url):
+        host = self.host(url)
+
+        with self.__lock:
+            if host not in self.__limiters:
+                self.__limiters[host] = RateLimiter(self.__rate, self.__burst, **self.__options)
+
+            return self.__limiters[host]
+
+    # Waits for the rate of a url's host
+    # @return How many seconds were spent waiting
+    def acquire(self, url):
+        return self.limiter(url).acquire()
+
+    # Adapts the rate of a url's host to a response, see RateLimiter.feedback
+    def feedback(self, url, status, elapsed = None, retry_after = None):
+        self.limiter(url).feedback(status, elapsed, retry_after)
+
+    # Sends a request without waiting for the rate, e.g. because the caller waited already, and adapts the rate of
+    # its host to the response
+    # @param opener The urllib opener that sends it, e.g. one that keeps cookies
+    # @return The response
+    # @raise urllib.error.URLError like urlopen
+    def send(self, url, data = None, timeout = 60, opener = None):
+        start = time.monotonic()
+
+        try:
+            response = opener.open(url, data=data, timeout=timeout) if opener else \
+                urllib.request.urlopen(url, data=data, timeout=timeout)
+        except urllib.error.HTTPError as e:
+            retry_after = parse_retry_after(e.headers.get('Retry-After')) if e.headers else None
+            self.feedback(url, e.code, time.monotonic() - start, retry_after)
+            raise
+        except OSError:
+            self.feedback(url, None)
+            raise
+
+        self.feedback(url, response.status, time.monotonic() - start)
+        return response
+
+    # Waits for the rate of a url's host and sends a request. Requests the server turned down because it's overloaded
+    # are sent again, once the rate allows, up to retries times.
+    # @return The response
+    # @raise urllib.error.URLError like urlopen
+    def open(self, url, data = None, timeout = 60, opener = None):
+        for attempt in range(self.__retries + 1):
+            self.acquire(url)
+
+            try:
+                return self.send(url, data, timeout, opener)
+            except urllib.error.HTTPError as e:
+                if e.code not in self.retry_statuses or attempt == self.__retries:
+                    raise
+
+                e.close()
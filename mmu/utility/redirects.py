@@ -0,0 +1,90 @@
+import re
+import html
+import urllib.request
+import urllib.error
+import urllib.parse
+from contextlib import nullcontext
+
+
+# Follows the <meta http-equiv="REFRESH"> redirects of interstitial pages, like the ones between an issue's download
+# page and its pdf. Only the start of each page is read, up to the end of its head where the meta tag has to be, and
+# the tag is found with precompiled patterns instead of parsing the whole document.
+class RedirectResolver:
+
+    meta_pattern = re.compile(rb'<meta\b[^>]*>', re.IGNORECASE)
+    refresh_pattern = re.compile(rb'http-equiv\s*=\s*["\']?refresh\b', re.IGNORECASE)
+    url_pattern = re.compile(rb'content\s*=\s*["\']?\s*\d*\s*;?\s*url\s*=\s*([^"\'>\s]+)', re.IGNORECASE)
+    head_end_pattern = re.compile(rb'</head\s*>|<body\b', re.IGNORECASE)
+
+    # @param host_limit A function that returns a context manager to hold while requesting a url, e.g.
+    #   DownloadPool.host_limit so that the redirects count towards the limit of their host
+    # @param max_head The maximum amount of bytes read from a page when its head doesn't end sooner
+    # @param rate_limiter A HostRateLimiter that's told how every response went. Waiting for the rate is left to
+    #   host_limit.
+    def __init__(self, host_limit = None, max_head = 65536, chunk_size = 4096, timeout = 240, rate_limiter = None):
+        self.__host_limit = host_limit
+        self.__rate_limiter = rate_limiter
+        self.__max_head = max_head
+        self.__chunk_size = chunk_size
+        self.__timeout = timeout
+
+    # Reads a page up to the end of its head
+    # @return The bytes read
+    def read_head(self, url):
+        head = b''
+
+        if self.__rate_limiter:
+            response = self.__rate_limiter.send(url, timeout=self.__timeout)
+        else:
+            response = urllib.request.urlopen(url, timeout=self.__timeout)
+
+        with response:
+            while len(head) < self.__max_head:
+                chunk = response.read(self.__chunk_size)
+                if not chunk:
+                    break
+
+                # The end of the head may be split between this chunk and the previous one
+                start = max(len(head) - 16, 0)
+                head += chunk
+                if self.head_end_pattern.search(head, start):
+                    break
+
+        return head
+
+    # Finds the url a page's meta refresh points to
+    # @param head The start of the page, as read_head returns it
+    # @param url The page's url, which relative refresh urls are resolved against
+    # @return The url, or None if the page has no meta refresh
+    def refresh_url(self, head, url = ''):
+        for meta in self.meta_pattern.finditer(head):
+            tag = meta.group(0)
+            if not self.refresh_pattern.search(tag):
+                continue
+
+            match = self.url_pattern.search(tag)
+            if match:
+                return urllib.parse.urljoin(url, html.unescape(match.group(1).decode('utf-8', errors='replace')))
+
+        return None
+
+    # Follows the meta refreshes starting from a page
+    # @param hops How many redirects are followed at most
+    # @return The url of the first page without a meta refresh, which is the page itself if it has none, or None if
+    #   a page couldn't be loaded
+    def resolve(self, url, hops = 2):
+        for hop in range(hops):
+            try:
+                with self.__host_limit(url) if self.__host_limit else nullcontext():
+                    head = self.read_head(url)
+            except urllib.error.URLError as e:
+                print(e)
+                return None
+
+            next_url = self.refresh_url(head, url)
+            if next_url is None:
+                break
+
+            url = next_url
+
+        return url
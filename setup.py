@@ -10,6 +10,7 @@ sys.path.insert(0, os.path.join(os.path.join(
     os.path.abspath(__file__).replace(__file__, '')), 'mmu'))
 
 from mmu.utility.helper import Helper
+from mmu.db.migrations import migrate
 
 
 # Sets up required elements for the application
@@ -24,7 +25,11 @@ def setup():
             print("Deleting SQLite Database")
             delete_sqlite_database()
 
-        print("Setting up local database from scratch")
+        # if --migrate is specified then an existing database is upgraded to the latest schema version.
+        if arg1 == '--migrate':
+            print("Upgrading local database to the latest schema version")
+        else:
+            print("Setting up local database from scratch")
         setup_local_db()
 
     download_latest_chromedriver_release()
@@ -60,6 +65,12 @@ def setup_local_db():
 
     db.commit()
     cursor.close()
+
+    # Brings the schema up to date, whether the database was just created or already existed
+    applied = migrate(db)
+    if applied:
+        print("Applied database migrations:", ", ".join(str(version) for version in applied))
+
     db.close()
 
 
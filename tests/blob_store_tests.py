@@ -0,0 +1,89 @@
+import unittest
+import os
+import sys
+import hashlib
+import tempfile
+import shutil
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from mmu.utility.blob_store import BlobStore
+
+class BlobStoreTest(unittest.TestCase):
+
+    content = b'%PDF-1.4 ' + bytes(range(256)) * 100
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.store = BlobStore(os.path.join(self.directory, 'store'))
+        self.sha256 = hashlib.sha256(self.content).hexdigest()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write_file(self, name, content = None):
+        path = os.path.join(self.directory, name)
+        with open(path, 'wb') as file:
+            file.write(content if content is not None else self.content)
+
+        return path
+
+    def test_put(self):
+        reference = self.store.put(self.write_file('ΦΕΚ A 1 - 12.01.2016.pdf'))
+
+        self.assertEqual(reference, 'blob:' + self.sha256)
+        self.assertEqual(self.store.path(self.sha256),
+                         os.path.join(self.directory, 'store', self.sha256[0:2], self.sha256[2:4], self.sha256))
+        with self.store.open(reference) as file:
+            self.assertEqual(file.read(), self.content)
+
+    # The same content is stored once
+    def test_deduplication(self):
+        first_path = self.write_file('a.pdf')
+        second_path = self.write_file('b.pdf')
+
+        self.assertEqual(self.store.put(first_path), self.store.put(second_path, self.sha256))
+        self.assertFalse(os.path.exists(second_path))
+        self.assertEqual(sum(len(files) for directory, directories, files in os.walk(os.path.join(self.directory, 'store'))), 1)
+
+    def test_compression(self):
+        store = BlobStore(os.path.join(self.directory, 'store'), compress=True)
+        reference = store.put(self.write_file('a.pdf'))
+
+        self.assertTrue(os.path.isfile(store.path(self.sha256, compressed=True)))
+        self.assertLess(os.path.getsize(store.path(self.sha256, compressed=True)), len(self.content))
+        with self.store.open(reference) as file:
+            file.seek(9)
+            self.assertEqual(file.read(3), bytes([0, 1, 2]))
+
+        self.assertTrue(self.store.verify(reference))
+
+    def test_verify(self):
+        reference = self.store.put(self.write_file('a.pdf'))
+        self.assertTrue(self.store.verify(reference))
+
+        with open(self.store.path(self.sha256), 'ab') as file:
+            file.write(b'garbage')
+        self.assertFalse(self.store.verify(reference))
+        self.assertFalse(self.store.verify('blob:' + '0' * 64))
+
+    # Files saved before the store are read from their paths
+    def test_plain_paths(self):
+        path = self.write_file('a.pdf')
+
+        self.assertTrue(self.store.verify(path))
+        self.assertTrue(self.store.verify(path, self.sha256))
+        self.assertFalse(self.store.verify(path, '0' * 64))
+        self.assertFalse(self.store.verify(os.path.join(self.directory, 'missing.pdf')))
+        with self.store.open(path) as file:
+            self.assertEqual(file.read(), self.content)
+
+    # Files that no issue refers to are deleted
+    def test_collect(self):
+        kept = self.store.put(self.write_file('a.pdf'))
+        deleted = self.store.put(self.write_file('b.pdf', b'another pdf'))
+
+        self.assertEqual(self.store.collect({kept: 2, deleted: 0, 'N/A': 5}), 1)
+        self.assertTrue(self.store.exists(kept))
+        self.assertFalse(self.store.exists(deleted))
+
+if __name__ == '__main__':
+    unittest.main()
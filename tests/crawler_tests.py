@@ -0,0 +1,152 @@
+import unittest
+import os
+import sys
+import sqlite3
+import threading
+import time
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from tests.database_test_case import DatabaseTestCase
+from mmu.db.handlers.crawl import CrawlShardHandler
+from mmu.db.handlers.job import JobHandler
+from mmu.automations.crawler import CrawlScheduler
+
+class CrawlSchedulerTest(DatabaseTestCase):
+
+    def setUp(self):
+        DatabaseTestCase.setUp(self)
+
+        self.shard_handler = CrawlShardHandler(self.db_path)
+
+        # How many issues of each year and type have been published
+        self.published = {(2016, 1): 450, (2016, 2): 0, (2017, 1): 130}
+        self.crawled = []
+        self.lock = threading.Lock()
+        self.active = 0
+        self.max_active = 0
+
+    def tearDown(self):
+        self.shard_handler.close()
+        DatabaseTestCase.tearDown(self)
+
+    # Stands in for Loader.crawl_range, finding the published issues with numbers in the range
+    def crawl(self, type, year, number_from, number_to, heartbeat):
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            self.crawled.append((year, type, number_from))
+
+        time.sleep(0.02)
+
+        with self.lock:
+            self.active -= 1
+
+        published = self.published[(year, type)]
+        return max(0, min(number_to, published) - number_from + 1)
+
+    def scheduler(self, workers = 4):
+        return CrawlScheduler(self.crawl, self.db_path, workers=workers, shard_size=200, poll_interval=0.01)
+
+    def shards(self):
+        return sorted((shard['year'], shard['type'], shard['number_from'], shard['results'])
+                      for shard in self.shard_handler.load_all())
+
+    def test_run(self):
+        scheduler = self.scheduler()
+        scheduler.plan([2016, 2017], [1, 2])
+        self.published[(2017, 2)] = 0
+
+        self.assertEqual(scheduler.run(), {'done': 8})
+        self.assertEqual(self.shards(), [(2016, 1, 1, 200), (2016, 1, 201, 200), (2016, 1, 401, 50),
+                                         (2016, 1, 601, 0), (2016, 2, 1, 0), (2017, 1, 1, 130),
+                                         (2017, 1, 201, 0), (2017, 2, 1, 0)])
+        self.assertGreater(self.max_active, 1)
+
+    # A crawl started again only crawls the shards the last one didn't finish
+    def test_resume(self):
+        scheduler = self.scheduler()
+        scheduler.plan([2016], [1, 2])
+        scheduler.run()
+
+        # A shard left running by a crawl that crashed is taken over once its lease expires
+        self.published[(2016, 3)] = 10
+        scheduler.plan([2016], [3])
+        crashed = JobHandler(self.db_path, owner='crashed', lease=0)
+        crashed.claim(CrawlScheduler.queue)
+
+        self.crawled = []
+        scheduler = self.scheduler()
+        scheduler.plan([2016], [1, 2, 3])
+        scheduler.run()
+
+        self.assertEqual(sorted(self.crawled), [(2016, 3, 1), (2016, 3, 201)])
+
+    # Reopening a year searches again the shards where new issues may have been published
+    def test_reopen(self):
+        scheduler = self.scheduler(workers=1)
+        scheduler.plan([2017], [1])
+        scheduler.run()
+
+        self.published[(2017, 1)] = 260
+        self.crawled = []
+        scheduler.reopen(2017)
+        scheduler.run()
+
+        self.assertEqual(sorted(self.crawled), [(2017, 1, 1), (2017, 1, 201), (2017, 1, 401)])
+        self.assertEqual(self.shards(), [(2017, 1, 1, 200), (2017, 1, 201, 60), (2017, 1, 401, 0)])
+
+    # A failing shard is retried until it runs out of attempts
+    def test_failing_shard(self):
+        attempts = []
+
+        def crawl(type, year, number_from, number_to, heartbeat):
+            attempts.append(number_from)
+            raise ValueError('The search page changed')
+
+        scheduler = CrawlScheduler(crawl, self.db_path, workers=2, retry_delay=0, poll_interval=0.01)
+        scheduler.plan([2016], [1])
+
+        self.assertEqual(scheduler.run(), {'failed': 1})
+        self.assertEqual(len(attempts), 3)
+
+    # A shard that takes longer than its lease keeps it through its heartbeats, so no other worker crawls it as well
+    def test_shard_outlives_lease(self):
+        attempts = []
+
+        def crawl(type, year, number_from, number_to, heartbeat):
+            attempts.append(number_from)
+            for page in range(5):
+                time.sleep(0.1)
+                heartbeat()
+
+            return 0
+
+        scheduler = CrawlScheduler(crawl, self.db_path, workers=2, lease=0.25, poll_interval=0.01)
+        scheduler.plan([2016], [1])
+
+        self.assertEqual(scheduler.run(), {'done': 1})
+        self.assertEqual(attempts, [1])
+
+    # A worker whose shard was taken over stops crawling it and leaves it to the other worker
+    def test_lost_lease(self):
+        attempts = []
+
+        def crawl(type, year, number_from, number_to, heartbeat):
+            attempts.append(number_from)
+            if len(attempts) == 1:
+                db = sqlite3.connect(self.db_path)
+                db.execute("UPDATE jobs SET owner = 'other', lease_until = 0")
+                db.commit()
+                db.close()
+                heartbeat()
+                attempts.append('not stopped')
+
+            return 0
+
+        scheduler = CrawlScheduler(crawl, self.db_path, workers=1, poll_interval=0.01)
+        scheduler.plan([2016], [1])
+
+        self.assertEqual(scheduler.run(), {'done': 1})
+        self.assertEqual(attempts, [1, 1])
+
+if __name__ == '__main__':
+    unittest.main()
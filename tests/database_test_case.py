@@ -0,0 +1,37 @@
+import unittest
+import os
+import sys
+import sqlite3
+import tempfile
+import shutil
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from mmu.db.migrations import migrate
+
+
+# Creates a database with the default schema
+# @param migrated Whether the migrations are applied as well
+def create_database(db_path, migrated = True):
+    install_sql = os.path.join(os.path.dirname(__file__), '..', 'install', 'default.sql')
+    db = sqlite3.connect(db_path)
+    db.executescript(open(install_sql, 'r', encoding='utf8').read())
+
+    if migrated:
+        migrate(db)
+
+    db.close()
+
+
+# Base class of tests that need a database. Every test gets a new one at db_path, in a temporary directory that's
+# removed once the test is done. Subclasses that close handlers in tearDown call DatabaseTestCase.tearDown after.
+class DatabaseTestCase(unittest.TestCase):
+
+    # Whether the database is migrated before the test, or left to the test
+    migrated = True
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.directory, 'test')
+        create_database(self.db_path, self.migrated)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
@@ -0,0 +1,269 @@
+import unittest
+import os
+import sys
+import re
+import time
+import tempfile
+import shutil
+import threading
+import hashlib
+import datetime
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from tests.database_test_case import create_database
+from mmu.utility.downloads import DownloadPool, Downloader, DownloadError
+from mmu.utility.blob_store import BlobStore
+from mmu.automations.loader import Loader
+
+
+# Stands in for the gazette's server: a download page redirects twice through meta refreshes before the pdf, and
+# every response takes a while, like a real round-trip. Slow pages take much longer than that.
+class GazetteRequestHandler(BaseHTTPRequestHandler):
+
+    latency = 0.05
+    slow_latency = 1
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+
+        # Only the latency counts as active, since a client that got the response may send its next request before
+        # the handler is done
+        try:
+            time.sleep(self.latency)
+        finally:
+            with server.lock:
+                server.active -= 1
+
+        match = re.match(r'/(slow|page|redirect|file)/(\d+)', self.path)
+
+        if not match:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        if match.group(1) == 'slow':
+            time.sleep(self.slow_latency)
+
+        if match.group(1) in ('slow', 'page'):
+            body = self.refresh('/redirect/' + match.group(2))
+        elif match.group(1) == 'redirect':
+            body = self.refresh('/file/{}.pdf'.format(match.group(2)))
+        else:
+            body = b'%PDF-1.4 issue ' + match.group(2).encode()
+
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def refresh(self, path):
+        url = 'http://{}:{}{}'.format(self.server.server_address[0], self.server.server_address[1], path)
+        return '<html><head><meta http-equiv="REFRESH" content="0;url={}"></head></html>'.format(url).encode()
+
+    def log_message(self, format, *args):
+        pass
+
+
+# Serves a file over keep-alive connections, supporting Range requests. While the server is set to fail, responses
+# are cut off half way.
+class FileRequestHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+    content = bytes(range(256)) * 400
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append((self.client_address, self.path, self.headers.get('Range')))
+
+        if self.path != '/file.pdf':
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        start = 0
+        if self.headers.get('Range'):
+            start = int(re.match(r'bytes=(\d+)-', self.headers['Range']).group(1))
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes {}-{}/{}'.format(start, len(self.content) - 1, len(self.content)))
+        else:
+            self.send_response(200)
+
+        body = self.content[start:]
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+
+        if server.failing:
+            self.wfile.write(body[:len(body) // 2])
+            self.close_connection = True
+        else:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class DownloaderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), FileRequestHandler)
+        self.server.requests = []
+        self.server.failing = False
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = 'http://127.0.0.1:{}/file.pdf'.format(self.server.server_address[1])
+        self.path = os.path.join(self.directory, 'file.pdf')
+        self.downloader = Downloader()
+
+    def tearDown(self):
+        self.downloader.close()
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.directory)
+
+    def read_file(self, path):
+        with open(path, 'rb') as file:
+            return file.read()
+
+    def test_download(self):
+        sha256 = self.downloader.download(self.url, self.path)
+
+        self.assertEqual(self.read_file(self.path), FileRequestHandler.content)
+        self.assertEqual(sha256, hashlib.sha256(FileRequestHandler.content).hexdigest())
+        self.assertFalse(os.path.exists(self.path + '.part'))
+
+    # Downloads from the same host reuse the connection
+    def test_keep_alive(self):
+        self.downloader.download(self.url, self.path)
+        self.downloader.download(self.url, os.path.join(self.directory, 'copy.pdf'))
+
+        self.assertEqual(len(set(address for address, path, range in self.server.requests)), 1)
+
+    # An interrupted download is reported, leaves no file behind and is resumed by the next attempt
+    def test_resume(self):
+        self.server.failing = True
+        with self.assertRaises(DownloadError):
+            self.downloader.download(self.url, self.path)
+
+        self.assertFalse(os.path.exists(self.path))
+        part_size = os.path.getsize(self.path + '.part')
+        self.assertEqual(part_size, len(FileRequestHandler.content) // 2)
+
+        self.server.failing = False
+        sha256 = self.downloader.download(self.url, self.path)
+
+        self.assertEqual(self.server.requests[-1][2], 'bytes={}-'.format(part_size))
+        self.assertEqual(self.read_file(self.path), FileRequestHandler.content)
+        self.assertEqual(sha256, hashlib.sha256(FileRequestHandler.content).hexdigest())
+
+    def test_missing_file(self):
+        with self.assertRaises(DownloadError):
+            self.downloader.download(self.url.replace('file.pdf', 'missing.pdf'), self.path)
+
+        self.assertFalse(os.path.exists(self.path))
+
+
+class DownloadPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), GazetteRequestHandler)
+        self.server.lock = threading.Lock()
+        self.server.active = 0
+        self.server.max_active = 0
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.base_url = 'http://127.0.0.1:{}'.format(self.server.server_address[1])
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.directory)
+
+    # Follows the two redirects of an issue and downloads it, the way Loader.handle_download does
+    def download_issue(self, pool, number):
+        link = '{}/page/{}'.format(self.base_url, number)
+        for redirect in range(2):
+            link = re.search(r'content="0;url=([^"]+)"', pool.get_url_contents(link)).group(1)
+
+        pool.download(link, '{}.pdf'.format(number), self.directory)
+        return number
+
+    # A pdf link saved by an earlier crawl that doesn't work anymore is replaced by following the redirects again
+    def test_moved_pdf_link(self):
+        loader = Loader(self.base_url, rate_limit=None, blob_store=BlobStore(os.path.join(self.directory, 'store')),
+                        db_name=os.path.join(self.directory, 'test'))
+        loader.download_folder = self.directory
+        params = {'issue_title': 'ΦΕΚ A 7 - 01.02.2016', 'pdf_link': self.base_url + '/moved/7.pdf'}
+
+        issue_file, download_link, sha256 = loader.handle_download(self.base_url + '/page/7', params)
+
+        self.assertEqual(download_link, self.base_url + '/file/7.pdf')
+        self.assertEqual(sha256, hashlib.sha256(b'%PDF-1.4 issue 7').hexdigest())
+        self.assertEqual(issue_file, BlobStore.reference(sha256))
+
+    # A download page that times out leaves its issue to the next crawl, and the rest of the results are still saved
+    def test_download_timeout(self):
+        db_path = os.path.join(self.directory, 'test')
+        create_database(db_path)
+
+        saved = []
+        loader = Loader(self.base_url, rate_limit=None, blob_store=BlobStore(os.path.join(self.directory, 'store')),
+                        on_issue_saved=saved.append, db_name=db_path, timeout=GazetteRequestHandler.slow_latency / 4)
+        loader.download_folder = self.directory
+        rows = [{'title': 'ΦΕΚ A {} - 01.02.2016'.format(number), 'date': datetime.datetime(2016, 2, 1),
+                 'number': number, 'link': '{}/{}/{}'.format(self.base_url, 'slow' if number == 2 else 'page', number)}
+                for number in range(1, 4)]
+
+        loader.handle_results(rows, 'Α')
+
+        self.assertEqual(sorted(saved), ['ΦΕΚ A 1 - 01.02.2016', 'ΦΕΚ A 3 - 01.02.2016'])
+        self.assertFalse(loader.is_known('ΦΕΚ A 2 - 01.02.2016', datetime.datetime(2016, 2, 1)))
+
+    def test_concurrent_downloads(self):
+        issues = 40
+
+        with DownloadPool(max_workers=8, per_host=8) as pool:
+            start = time.monotonic()
+            futures = [pool.submit(self.download_issue, pool, number) for number in range(issues)]
+            numbers = sorted(future.result(timeout=30) for future in futures)
+            elapsed = time.monotonic() - start
+
+        print('\n{:.1f} issues/second'.format(issues / elapsed))
+        self.assertEqual(numbers, list(range(issues)))
+        self.assertEqual(len(os.listdir(self.directory)), issues)
+        with open(os.path.join(self.directory, '7.pdf'), 'rb') as file:
+            self.assertEqual(file.read(), b'%PDF-1.4 issue 7')
+
+        # One after another, every issue takes three round-trips
+        self.assertLess(elapsed, issues * 3 * GazetteRequestHandler.latency / 2)
+
+    def test_per_host_limit(self):
+        with DownloadPool(max_workers=8, per_host=2) as pool:
+            futures = [pool.submit(self.download_issue, pool, number) for number in range(12)]
+            for future in futures:
+                future.result(timeout=30)
+
+        self.assertEqual(self.server.max_active, 2)
+
+    # Submitting blocks while the pool has max_pending tasks
+    def test_bounded_submit(self):
+        release = threading.Event()
+
+        with DownloadPool(max_workers=1, max_pending=1) as pool:
+            pool.submit(release.wait)
+            producer = threading.Thread(target=pool.submit, args=(time.sleep, 0))
+            producer.start()
+            producer.join(timeout=0.2)
+            self.assertTrue(producer.is_alive())
+
+            release.set()
+            producer.join(timeout=10)
+            self.assertFalse(producer.is_alive())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,8 @@
 import unittest
 from mmu.utility.helper import Helper
 import datetime
+import tempfile
+import os
 
 class HelperTest(unittest.TestCase):
 
@@ -8,6 +10,10 @@ class HelperTest(unittest.TestCase):
         self.assertEqual(Helper.normalize_greek_name("Παναγιώτης Καμμένος"), "ΠΑΝΑΓΙΩΤΗΣ ΚΑΜΜΕΝΟΣ")
         self.assertEqual(Helper.normalize_greek_name("Αγλαΐα Τεστ"), "ΑΓΛΑΙΑ ΤΕΣΤ")
 
+    def test_normalize_greek_text(self):
+        self.assertEqual(Helper.normalize_greek_text("Ο Υπουργός Εσωτερικών, 4363/2016"), "Ο ΥΠΟΥΡΓΟΣ ΕΣΩΤΕΡΙΚΩΝ, 4363/2016")
+        self.assertEqual(Helper.normalize_greek_text("ΝOMOΣ Αγλαΐα"), "ΝΟΜΟΣ ΑΓΛΑΙΑ")
+
     def test_date_to_unix_timestamp(self):
         self.assertEqual(Helper.date_to_unix_timestamp("22 Ιανουαρίου 2016"), datetime.datetime(2016, 1, 22))
         self.assertEqual(Helper.date_to_unix_timestamp("08 Αυγούστου 1922"), datetime.datetime(1922, 8, 8))
@@ -32,6 +38,15 @@ class HelperTest(unittest.TestCase):
         test2 = "2015"
         self.assertFalse(Helper.date_match(2015).match(test) is not None)
 
+    def test_file_sha256(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'issue.pdf')
+            with open(path, 'wb') as file:
+                file.write(b'abc')
+
+            self.assertEqual(Helper.file_sha256(path),
+                             'ba7816bf8f01cfea414140de5dae2223b00361a396177a9cb410ff61f20015ad')
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,90 @@
+import unittest
+import os
+import sys
+import datetime
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from tests.database_test_case import DatabaseTestCase
+from mmu.db.handlers.person import PersonHandler
+from mmu.db.handlers.ministry import MinistryHandler
+from mmu.db.handlers.cabinet import CabinetHandler
+from mmu.analysis.intervals import IntervalIndex, SignerIndex
+
+class IntervalIndexTest(unittest.TestCase):
+
+    def test_find(self):
+        index = IntervalIndex()
+        index.add(1, '2015-01-27 00:00:00', '2015-08-28 00:00:00', 'Εσωτερικών')
+        index.add(1, '2015-09-23 00:00:00', '2016-11-05 00:00:00', 'Οικονομικών')
+        index.add(1, '2016-11-05 00:00:00', 0, 'Υγείας')
+
+        self.assertEqual(index.find(1, '2015-03-01 00:00:00'), 'Εσωτερικών')
+        self.assertEqual(index.find(1, '2015-08-28 00:00:00'), 'Εσωτερικών')
+        self.assertIsNone(index.find(1, '2015-09-01 00:00:00'))
+        self.assertEqual(index.find(1, '2020-01-01 00:00:00'), 'Υγείας')
+        self.assertIsNone(index.find(1, '2014-01-01 00:00:00'))
+        self.assertIsNone(index.find(2, '2015-03-01 00:00:00'))
+
+        # On the day of a reshuffle the newest position wins
+        self.assertEqual(index.find(1, '2016-11-05 00:00:00'), 'Υγείας')
+        self.assertEqual(list(index.find_all(1, '2016-11-05 00:00:00')), ['Υγείας', 'Οικονομικών'])
+
+    # A long interval is found even when shorter ones started after it
+    def test_find_overlapping(self):
+        index = IntervalIndex()
+        index.add(1, '2010-01-01 00:00:00', '2019-12-31 00:00:00', 'long')
+        index.add(1, '2011-01-01 00:00:00', '2011-02-01 00:00:00', 'short')
+        index.add(1, '2012-01-01 00:00:00', '2012-02-01 00:00:00', 'short')
+
+        self.assertEqual(index.find(1, '2013-01-01 00:00:00'), 'long')
+
+    def test_date_key(self):
+        self.assertEqual(IntervalIndex.date_key(datetime.datetime(2016, 1, 12)), '2016-01-12 00:00:00')
+        self.assertEqual(IntervalIndex.date_key(1452556800), '2016-01-12 00:00:00')
+        self.assertEqual(IntervalIndex.date_key(0, IntervalIndex.open_end), IntervalIndex.open_end)
+
+
+class SignerIndexTest(DatabaseTestCase):
+
+    def setUp(self):
+        DatabaseTestCase.setUp(self)
+
+        self.person_handler = PersonHandler(self.db_path)
+        self.cabinet_handler = CabinetHandler(self.db_path)
+        ministry_handler = MinistryHandler(self.db_path)
+
+        self.person_handler.create('Νικόλαος Τόσκας', 'ΣΥΡΙΖΑ', 0)
+        ministry_handler.create_multiple([
+            {'name': 'Υπουργείο Εσωτερικών', 'description': '', 'established': 0, 'disbanded': 0},
+            {'name': 'Υπουργείο Προστασίας του Πολίτη', 'description': '', 'established': 0, 'disbanded': 0}])
+        self.cabinet_handler.create('Κυβέρνηση Αλέξη Τσίπρα Σεπτεμβρίου 2015', '',
+                                    datetime.datetime(2015, 9, 21), 0)
+
+        person_id = self.person_handler.load_by_name('Νικόλαος Τόσκας')['id']
+        ministry_ids = {ministry['name']: ministry['id'] for ministry in ministry_handler.load_all()}
+        self.person_handler.save_positions([
+            {'role': 'Αναπληρωτής Υπουργός', 'date_from': datetime.datetime(2015, 9, 23),
+             'date_to': datetime.datetime(2016, 11, 5), 'person_id': person_id,
+             'ministry_id': ministry_ids['Υπουργείο Εσωτερικών'], 'cabinet_id': None},
+            {'role': 'Υπουργός', 'date_from': datetime.datetime(2016, 11, 5), 'date_to': 0, 'person_id': person_id,
+             'ministry_id': ministry_ids['Υπουργείο Προστασίας του Πολίτη'], 'cabinet_id': None}])
+
+    def tearDown(self):
+        self.person_handler.close()
+        DatabaseTestCase.tearDown(self)
+
+    def test_resolve(self):
+        index = SignerIndex(self.person_handler, self.cabinet_handler)
+        signatures = index.resolve([
+            {'person_name': 'ΝΙΚΟΛΑΟΣ ΤΟΣΚΑΣ', 'issue_date': '2016-02-01 00:00:00'},
+            {'person_name': 'ΝΙΚΟΛΑΟΣ Κ ΤΟΣΚΑΣ', 'issue_date': '2017-02-01 00:00:00'},
+            {'person_name': 'ΠΡΟΚΟΠΙΟΣ ΠΑΥΛΟΠΟΥΛΟΣ', 'issue_date': '2015-01-01 00:00:00'}])
+
+        self.assertEqual(signatures[0]['position']['ministry'], 'Υπουργείο Εσωτερικών')
+        self.assertEqual(signatures[1]['position']['ministry'], 'Υπουργείο Προστασίας του Πολίτη')
+        self.assertIsNone(signatures[2]['position'])
+
+        self.assertEqual(signatures[0]['cabinet']['title'], 'Κυβέρνηση Αλέξη Τσίπρα Σεπτεμβρίου 2015')
+        self.assertIsNone(signatures[2]['cabinet'])
+
+if __name__ == '__main__':
+    unittest.main()
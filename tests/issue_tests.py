@@ -0,0 +1,110 @@
+import unittest
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from tests.database_test_case import DatabaseTestCase
+from mmu.db.handlers.issue import IssueHandler
+
+class IssueHandlerTest(DatabaseTestCase):
+
+    def setUp(self):
+        DatabaseTestCase.setUp(self)
+
+        self.handler = IssueHandler(self.db_path)
+        self.handler.create('ΦΕΚ A 1 - 12.01.2016', 'Α', 1, 'a1.pdf', '2016-01-12 00:00:00')
+        self.handler.create('ΦΕΚ A 2 - 14.01.2016', 'Α', 2, 'a2.pdf', '2016-01-14 00:00:00')
+        self.first_id = self.handler.load_by_title('ΦΕΚ A 1 - 12.01.2016')['id']
+        self.second_id = self.handler.load_by_title('ΦΕΚ A 2 - 14.01.2016')['id']
+
+    def tearDown(self):
+        self.handler.close()
+        DatabaseTestCase.tearDown(self)
+
+    def test_save_pages(self):
+        pages = ['ΕΦΗΜΕΡΙΣ ΤΗΣ ΚΥΒΕΡΝΗΣΕΩΣ', 'Ο Υπουργός Εσωτερικών\nΠαναγιώτης Κουρουμπλής']
+        self.handler.save_pages(self.first_id, pages)
+
+        self.assertEqual(self.handler.load_pages(self.first_id), pages)
+        self.assertEqual(self.handler.load_pages(self.second_id), [])
+
+    # Words are found regardless of case and accents
+    def test_search_text(self):
+        self.handler.save_pages(self.first_id, ['Περιεχόμενα', 'Ο Υπουργός Εσωτερικών\nΠαναγιώτης Κουρουμπλής'])
+        self.handler.save_pages(self.second_id, ['Ο ΥΠΟΥΡΓΟΣ ΟΙΚΟΝΟΜΙΚΩΝ'])
+
+        hits = self.handler.search_text('ΥΠΟΥΡΓΟΣ εσωτερικων')
+        self.assertEqual(len(hits), 1)
+        self.assertEqual((hits[0]['issue_id'], hits[0]['title'], hits[0]['page']),
+                         (self.first_id, 'ΦΕΚ A 1 - 12.01.2016', 2))
+        self.assertEqual(hits[0]['snippet'], 'Ο [Υπουργός] Εσωτερικών Παναγιώτης Κουρουμπλής')
+
+        self.assertEqual(len(self.handler.search_text('υπουργ*')), 2)
+        self.assertEqual(self.handler.search_text('Υγείας'), [])
+        self.assertEqual(self.handler.search_text('"*'), [])
+
+    # Saving the pages of an issue again replaces them in the index
+    def test_save_pages_again(self):
+        self.handler.save_pages(self.first_id, ['Ο Υπουργός Εσωτερικών'])
+        self.handler.save_pages(self.first_id, ['Ο Υπουργός Υγείας'])
+
+        self.assertEqual(self.handler.search_text('Εσωτερικών'), [])
+        self.assertEqual(len(self.handler.search_text('Υγείας')), 1)
+
+    def test_snippet(self):
+        text = 'α' * 100 + ' Εσωτερικών ' + 'β' * 100
+        self.assertEqual(self.handler.snippet(text, ['ΕΣΩΤΕΡΙΚΩΝ'], size=5), '…αααα [Εσωτερικών] ββββ…')
+
+    def test_load_titles(self):
+        self.handler.create('ΦΕΚ A 1 - 04.01.2017', 'Α', 1, 'N/A', '2017-01-04 00:00:00')
+
+        self.assertEqual(self.handler.load_titles('2016-01-01', '2017-01-01'),
+                         {'ΦΕΚ A 1 - 12.01.2016', 'ΦΕΚ A 2 - 14.01.2016'})
+        self.assertEqual(self.handler.load_titles('2017-01-01', '2018-01-01'), {'ΦΕΚ A 1 - 04.01.2017'})
+
+    def test_count_by_type(self):
+        self.handler.create('ΦΕΚ B 1 - 12.01.2016', 'Β', 1, 'N/A', '2016-01-12 00:00:00')
+        self.handler.create('ΦΕΚ A 1 - 04.01.2017', 'Α', 1, 'N/A', '2017-01-04 00:00:00')
+
+        self.assertEqual(self.handler.count_by_type('2016-01-01', '2017-01-01'), {'Α': 2, 'Β': 1})
+        self.assertEqual(self.handler.count_by_type('2018-01-01', '2019-01-01'), {})
+
+    def test_save_link(self):
+        self.handler.save_link('ΦΕΚ A 1 - 12.01.2016', 'http://www.et.gr/a1.pdf')
+        self.handler.save_link('ΦΕΚ A 1 - 12.01.2016', 'http://www.et.gr/a1-new.pdf')
+
+        self.assertEqual(self.handler.load_links(), {'ΦΕΚ A 1 - 12.01.2016': 'http://www.et.gr/a1-new.pdf'})
+
+    def test_count_file_references(self):
+        self.handler.create('ΦΕΚ A 3 - 15.01.2016', 'Α', 3, 'a1.pdf', '2016-01-15 00:00:00')
+
+        self.assertEqual(self.handler.count_file_references(), {'a1.pdf': 2, 'a2.pdf': 1})
+
+    # Issues that already have an analyzed flag, e.g. ones crawled again, are still saved as not analyzed
+    def test_create_multiple(self):
+        self.handler.create_multiple([{'title': 'ΦΕΚ A 3 - 15.01.2016', 'type': 'Α', 'number': 3, 'file': 'a3.pdf',
+                                       'date': '2016-01-15 00:00:00', 'analyzed': 1},
+                                      {'title': 'ΦΕΚ A 1 - 12.01.2016', 'type': 'Α', 'number': 1, 'file': 'a1.pdf',
+                                       'date': '2016-01-12 00:00:00', 'analyzed': 0}])
+
+        issue = self.handler.load_by_title('ΦΕΚ A 3 - 15.01.2016')
+        self.assertEqual(issue['analyzed'], 0)
+        self.assertIsNone(issue['sha256'])
+        self.assertEqual(len(self.handler.load_all()), 3)
+
+    def test_load_unanalyzed(self):
+        self.handler.create('ΦΕΚ B 1 - 12.01.2016', 'Β', 1, 'N/A', '2016-01-12 00:00:00')
+        self.handler.create('ΦΕΚ Γ 1 - 12.01.2016', 'Γ', 1, 'N/A', '2016-01-12 00:00:00')
+        self.handler.set_analyzed(self.first_id)
+
+        self.assertEqual(sorted(issue['title'] for issue in self.handler.load_unanalyzed(['Α', 'Β'])),
+                         ['ΦΕΚ A 2 - 14.01.2016', 'ΦΕΚ B 1 - 12.01.2016'])
+        self.assertEqual(len(self.handler.load_unanalyzed(['Α'])), 1)
+
+    def test_load_without_pages(self):
+        self.handler.create('ΦΕΚ A 3 - 15.01.2016', 'Α', 3, 'N/A', '2016-01-15 00:00:00')
+        self.handler.save_pages(self.first_id, ['Περιεχόμενα'])
+
+        self.assertEqual([issue['id'] for issue in self.handler.load_without_pages()], [self.second_id])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,155 @@
+import unittest
+import os
+import sys
+import sqlite3
+import threading
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from tests.database_test_case import DatabaseTestCase
+from mmu.db.handlers.job import JobHandler
+from mmu.db.handlers.issue import IssueHandler
+
+class JobHandlerTest(DatabaseTestCase):
+
+    def setUp(self):
+        DatabaseTestCase.setUp(self)
+
+        self.handler = JobHandler(self.db_path, owner='worker-1')
+
+    def tearDown(self):
+        self.handler.close()
+        DatabaseTestCase.tearDown(self)
+
+    def test_enqueue(self):
+        self.handler.enqueue('extraction', [1, 2, 3])
+        self.handler.enqueue('extraction', [3, 4])
+        self.handler.enqueue('other', [1])
+
+        self.assertEqual(self.handler.count_by_status('extraction'), {'pending': 4})
+
+    def test_claim(self):
+        self.handler.enqueue('extraction', [10, 20])
+        other_worker = JobHandler(self.db_path, owner='worker-2')
+
+        first_job = self.handler.claim('extraction')
+        second_job = other_worker.claim('extraction')
+
+        self.assertEqual((first_job['item_id'], first_job['owner'], first_job['attempts']), (10, 'worker-1', 1))
+        self.assertEqual((second_job['item_id'], second_job['owner']), (20, 'worker-2'))
+        self.assertIsNone(self.handler.claim('extraction'))
+
+    # Jobs are completed only by the worker holding their lease
+    def test_complete(self):
+        self.handler.enqueue('extraction', [10])
+        job = self.handler.claim('extraction')
+
+        self.assertFalse(JobHandler(self.db_path, owner='worker-2').complete(job['id']))
+        self.assertTrue(self.handler.heartbeat(job['id']))
+        self.assertTrue(self.handler.complete(job['id']))
+        self.assertFalse(self.handler.complete(job['id']))
+        self.assertEqual(self.handler.count_by_status('extraction'), {'done': 1})
+
+    # Jobs whose lease expired are claimed by other workers, and the previous owner can no longer complete them
+    def test_expired_lease(self):
+        expiring_worker = JobHandler(self.db_path, owner='worker-2', lease=-1)
+        expiring_worker.enqueue('extraction', [10], max_attempts=2)
+
+        job = expiring_worker.claim('extraction')
+        reclaimed_job = self.handler.claim('extraction')
+
+        self.assertEqual((reclaimed_job['id'], reclaimed_job['attempts']), (job['id'], 2))
+        self.assertFalse(expiring_worker.complete(job['id']))
+        self.assertFalse(expiring_worker.heartbeat(job['id']))
+        self.assertTrue(self.handler.complete(job['id']))
+
+    def test_expired_lease_out_of_attempts(self):
+        expiring_worker = JobHandler(self.db_path, owner='worker-2', lease=-1)
+        expiring_worker.enqueue('extraction', [10], max_attempts=1)
+        job = expiring_worker.claim('extraction')
+
+        self.assertIsNone(self.handler.claim('extraction'))
+        self.assertEqual(self.handler.load_by_id(job['id'])['status'], 'failed')
+
+    def test_fail(self):
+        self.handler.enqueue('extraction', [10], max_attempts=2)
+
+        job = self.handler.claim('extraction')
+        self.assertTrue(self.handler.fail(job['id'], 'Corrupted file', retry_delay=0))
+        self.assertEqual(self.handler.load_by_id(job['id'])['error'], 'Corrupted file')
+
+        job = self.handler.claim('extraction')
+        self.assertTrue(self.handler.fail(job['id'], 'Corrupted file', retry_delay=0))
+        self.assertEqual(self.handler.count_by_status('extraction'), {'failed': 1})
+
+    def test_fail_retry_delay(self):
+        self.handler.enqueue('extraction', [10])
+        job = self.handler.claim('extraction')
+        self.handler.fail(job['id'], 'Timeout', retry_delay=60)
+
+        self.assertIsNone(self.handler.claim('extraction'))
+        self.assertEqual(self.handler.count_by_status('extraction'), {'pending': 1})
+
+    # Writes made in a transaction are rolled back along with the job's completion
+    def test_transaction_rollback(self):
+        issue_handler = IssueHandler(self.db_path)
+        self.handler.enqueue('extraction', [10])
+        job = self.handler.claim('extraction')
+
+        with self.assertRaises(RuntimeError):
+            with issue_handler.transaction():
+                self.handler.complete(job['id'])
+                issue_handler.create('ΦΕΚ A 1 - 12.01.2016', 'Α', 1, 'N/A', '2016-01-12 00:00:00')
+                raise RuntimeError()
+
+        self.assertEqual(self.handler.load_by_id(job['id'])['status'], 'running')
+        self.assertIsNone(issue_handler.load_by_title('ΦΕΚ A 1 - 12.01.2016'))
+
+    # A transaction inside a batch commits the batch's writes along with its own once it ends
+    def test_transaction_in_batch(self):
+        issue_handler = IssueHandler(self.db_path)
+
+        with issue_handler.batch(size=100, interval=60):
+            issue_handler.create('ΦΕΚ A 1 - 12.01.2016', 'Α', 1, 'N/A', '2016-01-12 00:00:00')
+
+            with issue_handler.transaction():
+                issue_handler.create('ΦΕΚ A 2 - 12.01.2016', 'Α', 2, 'N/A', '2016-01-12 00:00:00')
+                with issue_handler.transaction():
+                    issue_handler.create('ΦΕΚ A 3 - 12.01.2016', 'Α', 3, 'N/A', '2016-01-12 00:00:00')
+
+                self.assertEqual(self.count_committed_issues(), 1)
+
+            self.assertEqual(self.count_committed_issues(), 3)
+
+    # Workers in different threads, each with its own connection, never claim the same job
+    def test_concurrent_claims(self):
+        self.handler.enqueue('extraction', range(100))
+        claimed = []
+
+        def work(owner):
+            worker = JobHandler(self.db_path, owner=owner)
+            job = worker.claim('extraction')
+
+            while job:
+                claimed.append(job['item_id'])
+                worker.complete(job['id'])
+                job = worker.claim('extraction')
+
+            worker.close()
+
+        threads = [threading.Thread(target=work, args=('worker-{}'.format(i),)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(claimed), list(range(100)))
+        self.assertEqual(self.handler.count_by_status('extraction'), {'done': 100})
+
+    # Counts the issues that can be seen from a separate connection
+    def count_committed_issues(self):
+        db = sqlite3.connect(self.db_path)
+        count = db.execute('SELECT COUNT(*) FROM issues').fetchone()[0]
+        db.close()
+        return count
+
+if __name__ == '__main__':
+    unittest.main()
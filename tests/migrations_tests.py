@@ -0,0 +1,80 @@
+import unittest
+import os
+import sys
+import sqlite3
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from tests.database_test_case import DatabaseTestCase
+from mmu.db.migrations import migrate, current_version, latest_version
+from mmu.db.handlers.issue import IssueHandler
+from mmu.db.handlers.signatures import RawSignatureHandler
+
+class MigrationsTest(DatabaseTestCase):
+
+    # The tests migrate the database themselves
+    migrated = False
+
+    def setUp(self):
+        DatabaseTestCase.setUp(self)
+        self.db = sqlite3.connect(self.db_path)
+
+    def tearDown(self):
+        self.db.close()
+        DatabaseTestCase.tearDown(self)
+
+    def test_migrate(self):
+        self.assertEqual(current_version(self.db), 0)
+        self.assertEqual(migrate(self.db)[-1], latest_version())
+        self.assertEqual(current_version(self.db), latest_version())
+
+        # Running the migrations again does nothing
+        self.assertEqual(migrate(self.db), [])
+
+    # Existing databases are upgraded in place, keeping their data
+    def test_upgrade_existing_database(self):
+        self.db.execute("INSERT INTO issues (title, type, number, file, analyzed, date) "
+                        "VALUES ('ΦΕΚ A 1 - 12.01.2016', 'Α', 1, 'N/A', 0, '2016-01-12 00:00:00')")
+        self.db.execute("INSERT INTO issues (title, type, number, file, analyzed, date) "
+                        "VALUES ('ΦΕΚ A 1 - 12.01.2016', 'Α', 1, 'N/A', 0, '2016-01-12 00:00:00')")
+        self.db.commit()
+
+        self.db.execute("INSERT INTO raw_signatures (person_name, role, issue_title, issue_date, regulation) "
+                        "VALUES ('ΝΙΚΟΛΑΟΣ ΤΟΣΚΑΣ', 'ΥΠΟΥΡΓΟΣ ΕΣΩΤΕΡΙΚΩΝ', 'ΦΕΚ A 1 - 12.01.2016', "
+                        "'2016-01-12 00:00:00', 'ΠΡΟΕΔΡΙΚΟ ΔΙΑΤΑΓΜΑ ΥΠ’ ΑΡΙΘΜ. 1')")
+        self.db.commit()
+
+        migrate(self.db)
+        self.assertEqual(self.db.execute('SELECT COUNT(*) FROM issues').fetchone()[0], 1)
+        self.assertEqual(self.db.execute('SELECT person_name, role, issue_title, issue_date, regulation '
+                                         'FROM raw_signatures').fetchall(),
+                         [('ΝΙΚΟΛΑΟΣ ΤΟΣΚΑΣ', 'ΥΠΟΥΡΓΟΣ ΕΣΩΤΕΡΙΚΩΝ', 'ΦΕΚ A 1 - 12.01.2016',
+                           '2016-01-12 00:00:00', 'ΠΡΟΕΔΡΙΚΟ ΔΙΑΤΑΓΜΑ ΥΠ’ ΑΡΙΘΜ. 1')])
+
+    # Makes sure the queries that run once per issue or signature use an index instead of scanning whole tables
+    def test_hot_queries_use_indexes(self):
+        migrate(self.db)
+        issue_handler = IssueHandler(self.db_path)
+        raw_signature_handler = RawSignatureHandler(self.db_path)
+
+        queries = [
+            issue_handler.select_query('issues', conditions={'title': ['ΦΕΚ A 1 - 12.01.2016']}),
+            issue_handler.select_query('issues', conditions={'analyzed': [0], 'type': ['Α']}),
+            issue_handler.select_query('issues', conditions={'type': ['Α'], 'date': ['2016', '>='],
+                                                              'issues.date': ['2017', '<']}),
+            raw_signature_handler.select_query('raw_signatures', conditions={'person_name': ['ΝΙΚΟΛΑΟΣ ΤΟΣΚΑΣ']}),
+            raw_signature_handler.most_common_role_query(None, 'ΝΙΚΟΛΑΟΣ ΤΟΣΚΑΣ'),
+            issue_handler.select_query('issues', joins={'raw_signatures': ['INNER',
+                                                                           'raw_signatures.issue_title = issues.title']},
+                                       conditions={'type': ['Α']}, group_by='raw_signatures.person_name'),
+        ]
+
+        for query, values in queries:
+            for detail in self.query_plan(query, values):
+                self.assertNotRegex(detail, r'^SCAN (issues|raw_signatures|signature_\w+)$', msg=query)
+
+        issue_handler.close()
+
+    def query_plan(self, query, values):
+        return [row[3] for row in self.db.execute('EXPLAIN QUERY PLAN ' + query, values).fetchall()]
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import unittest
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from tests.database_test_case import DatabaseTestCase
+from mmu.db.handlers.ministry import MinistryHandler
+
+class MinistryLineageTest(DatabaseTestCase):
+
+    def setUp(self):
+        DatabaseTestCase.setUp(self)
+
+        self.handler = MinistryHandler(self.db_path)
+        names = ['Υπουργείο Εθνικής Οικονομίας', 'Υπουργείο Οικονομικών', 'Υπουργείο Οικονομίας και Οικονομικών',
+                 'Υπουργείο Υγείας']
+        self.handler.create_multiple([{'name': name, 'description': '', 'established': 0, 'disbanded': 0}
+                                      for name in names])
+        self.ids = {ministry['name']: ministry['id'] for ministry in self.handler.load_all()}
+
+        # Two ministries merged into one, that was later renamed
+        self.handler.create('Υπουργείο Οικονομίας', '')
+        self.ids['Υπουργείο Οικονομίας'] = self.handler.load_by_name('Υπουργείο Οικονομίας')['id']
+        self.handler.add_origin(self.ids['Υπουργείο Οικονομίας και Οικονομικών'], 'Merger',
+                                [self.ids['Υπουργείο Εθνικής Οικονομίας'], self.ids['Υπουργείο Οικονομικών']])
+        self.handler.add_origin(self.ids['Υπουργείο Οικονομίας'], 'Renaming',
+                                [self.ids['Υπουργείο Οικονομίας και Οικονομικών']])
+
+    def tearDown(self):
+        self.handler.close()
+        DatabaseTestCase.tearDown(self)
+
+    def test_lineage(self):
+        ancestors = self.handler.load_lineage(self.ids['Υπουργείο Οικονομίας'])
+        self.assertEqual(ancestors, {self.ids['Υπουργείο Οικονομίας']: 0,
+                                     self.ids['Υπουργείο Οικονομίας και Οικονομικών']: 1,
+                                     self.ids['Υπουργείο Εθνικής Οικονομίας']: 2,
+                                     self.ids['Υπουργείο Οικονομικών']: 2})
+
+        descendants = self.handler.load_lineage(self.ids['Υπουργείο Οικονομικών'], descendants=True)
+        self.assertEqual(set(descendants), {self.ids['Υπουργείο Οικονομικών'],
+                                            self.ids['Υπουργείο Οικονομίας και Οικονομικών'],
+                                            self.ids['Υπουργείο Οικονομίας']})
+
+        self.assertEqual(self.handler.load_lineage(self.ids['Υπουργείο Υγείας']), {self.ids['Υπουργείο Υγείας']: 0})
+
+    # Adding an origin before the older ones links the whole chain
+    def test_add_origin_to_root(self):
+        self.handler.create('Υπουργείο Συντονισμού', '')
+        coordination_id = self.handler.load_by_name('Υπουργείο Συντονισμού')['id']
+        self.handler.add_origin(self.ids['Υπουργείο Εθνικής Οικονομίας'], 'Renaming', [coordination_id])
+
+        self.assertEqual(self.handler.load_lineage(self.ids['Υπουργείο Οικονομίας'])[coordination_id], 3)
+
+    # A circular origin is turned down as a whole, even along with a valid predecessor
+    def test_circular_origin(self):
+        lineage = self.lineage_rows()
+        origins = self.handler.load_origin_edges()
+
+        with self.assertRaises(ValueError):
+            self.handler.add_origin(self.ids['Υπουργείο Οικονομικών'], 'Merger',
+                                    [self.ids['Υπουργείο Υγείας'], self.ids['Υπουργείο Οικονομίας']])
+
+        self.assertEqual(self.lineage_rows(), lineage)
+        self.assertEqual(self.handler.load_origin_edges(), origins)
+
+    def test_rebuild_lineage(self):
+        before = self.lineage_rows()
+        self.handler.rebuild_lineage()
+        self.assertEqual(self.lineage_rows(), before)
+
+    def test_roll_up(self):
+        roll_up = self.handler.load_roll_up()
+
+        # Of the two roots of the merger, the one with the lowest id is chosen
+        root = (self.ids['Υπουργείο Εθνικής Οικονομίας'], 'Υπουργείο Εθνικής Οικονομίας')
+        self.assertEqual(roll_up['Υπουργείο Οικονομίας'], root)
+        self.assertEqual(roll_up['Υπουργείο Οικονομίας και Οικονομικών'], root)
+        self.assertEqual(roll_up['Υπουργείο Οικονομικών'], (self.ids['Υπουργείο Οικονομικών'], 'Υπουργείο Οικονομικών'))
+        self.assertEqual(roll_up['Υπουργείο Υγείας'], (self.ids['Υπουργείο Υγείας'], 'Υπουργείο Υγείας'))
+
+    def test_roll_up_to_chosen_roots(self):
+        merger_id = self.ids['Υπουργείο Οικονομίας και Οικονομικών']
+        roll_up = self.handler.load_roll_up([merger_id, self.ids['Υπουργείο Οικονομικών']])
+
+        self.assertEqual(roll_up['Υπουργείο Οικονομίας'], (merger_id, 'Υπουργείο Οικονομίας και Οικονομικών'))
+        self.assertEqual(roll_up['Υπουργείο Οικονομικών'], (self.ids['Υπουργείο Οικονομικών'], 'Υπουργείο Οικονομικών'))
+        self.assertEqual(roll_up['Υπουργείο Εθνικής Οικονομίας'],
+                         (self.ids['Υπουργείο Εθνικής Οικονομίας'], 'Υπουργείο Εθνικής Οικονομίας'))
+
+    def lineage_rows(self):
+        return sorted(self.handler.execute_tuples('SELECT * FROM ministry_lineage').fetchall())
+
+if __name__ == '__main__':
+    unittest.main()
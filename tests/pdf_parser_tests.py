@@ -128,6 +128,23 @@ class PdfParserTest(unittest.TestCase):
       self.assertEqual(self.get_names_from_regulation(third), third_names, msg="Names extracted from the 3rd regulation are wrong")
 
 
+    # One pass over the layout finds the signatures of the issue along with the text of its pages
+    def test_pages_and_signatures(self):
+        file_path = self.get_file_path('ΦΕΚ A 12 - 01.02.2016.pdf')
+        pages, regulations = self.parser.get_pages_and_signatures(file_path, str(2016))
+        correct_names = ['ΠΡΟΚΟΠΙΟΣ Β ΠΑΥΛΟΠΟΥΛΟΣ', 'ΝΙΚΟΛΑΟΣ ΤΟΣΚΑΣ', 'ΓΕΩΡΓΙΟΣ ΣΤΑΘΑΚΗΣ', 'ΕΛΕΝΑ ΚΟΥΝΤΟΥΡΑ',
+                         'ΝΙΚΟΛΑΟΣ ΚΟΤΖΙΑΣ', 'ΝΙΚΟΛΑΟΣ ΠΑΡΑΣΚΕΥΟΠΟΥΛΟΣ', 'ΓΕΩΡΓΙΟΣ ΚΑΤΡΟΥΓΚΑΛΟΣ',
+                         'ΕΥΚΛΕΙΔΗΣ ΤΣΑΚΑΛΩΤΟΣ', 'ΘΕΟΔΩΡΟΣ ΔΡΙΤΣΑΣ']
+
+        self.assertEqual(len(regulations), 1)
+        self.assertListEqual(self.get_names_from_regulation(regulations[0]), correct_names)
+        self.assertEqual(regulations[0]['number'], '4363')
+        self.assertEqual(regulations[0]['type'], 'NOMOΣ ΥΠ’ ΑΡΙΘ.')
+
+        self.assertTrue(pages)
+        self.assertTrue(all(page.endswith('\f') for page in pages))
+        self.assertIn('4363', ''.join(pages))
+
     # Helper method to get all names from a single signature set
     def get_names_from_regulation(self, regulation):
         names = []
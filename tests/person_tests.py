@@ -0,0 +1,83 @@
+import unittest
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from tests.database_test_case import DatabaseTestCase
+from mmu.db.handlers.person import PersonHandler
+
+class PersonHandlerTest(DatabaseTestCase):
+
+    def setUp(self):
+        DatabaseTestCase.setUp(self)
+
+        self.handler = PersonHandler(self.db_path)
+        self.handler.create('Νίκος Τόσκας', 'ΣΥΡΙΖΑ', 0)
+        self.handler.create('Νικόλαος Τόσκας', 'ΣΥΡΙΖΑ', 0)
+        self.handler.create('Γεώργιος Σταθάκης', 'ΣΥΡΙΖΑ', 0)
+        self.handler.create('Προκόπιος Β. Παυλόπουλος', 'Νέα Δημοκρατία', 0)
+
+    def tearDown(self):
+        self.handler.close()
+        DatabaseTestCase.tearDown(self)
+
+    def test_load_by_name(self):
+        self.assertEqual(self.handler.load_by_name('ΝΙΚΟΣ ΤΟΣΚΑΣ')['name'], 'Νίκος Τόσκας')
+        self.assertEqual(self.handler.load_by_name('νικόλαος τόσκας')['name'], 'Νικόλαος Τόσκας')
+
+    # Partial names don't match whoever happens to contain them anymore
+    def test_load_by_partial_name(self):
+        self.assertIsNone(self.handler.load_by_name('ΤΟΣΚΑΣ'))
+        self.assertIsNone(self.handler.load_by_name('ΝΙΚΟ'))
+
+    def test_load_by_name_without_middle_initial(self):
+        self.assertEqual(self.handler.load_by_name('ΠΡΟΚΟΠΙΟΣ ΠΑΥΛΟΠΟΥΛΟΣ', fuzzy=True)['name'],
+                         'Προκόπιος Β. Παυλόπουλος')
+
+        # Only exact matches are returned unless fuzzy matching is asked for
+        self.assertIsNone(self.handler.load_by_name('ΠΡΟΚΟΠΙΟΣ ΠΑΥΛΟΠΟΥΛΟΣ'))
+
+    # A name that several persons with the same first and last name match could be any of them
+    def test_load_by_ambiguous_name(self):
+        self.handler.create('Προκόπιος Α. Παυλόπουλος', '', 0)
+
+        self.assertIsNone(self.handler.load_by_name('ΠΡΟΚΟΠΙΟΣ ΠΑΥΛΟΠΟΥΛΟΣ', fuzzy=True))
+        self.assertEqual(self.handler.load_by_name('ΠΡΟΚΟΠΙΟΣ Α ΠΑΥΛΟΠΟΥΛΟΣ', fuzzy=True)['name'],
+                         'Προκόπιος Α. Παυλόπουλος')
+
+    def test_find_candidates(self):
+        candidates = self.handler.find_candidates('ΤΟΣΚΑΣ')
+        self.assertEqual(sorted(candidate['name'] for candidate in candidates), sorted(['Νικόλαος Τόσκας', 'Νίκος Τόσκας']))
+
+        # Persons with the same first and last name are ranked first
+        candidates = self.handler.find_candidates('ΝΙΚΟΣ Γ ΤΟΣΚΑΣ')
+        self.assertEqual(candidates[0]['name'], 'Νίκος Τόσκας')
+
+    def test_create_existing_person(self):
+        self.handler.create('ΝΙΚΟΣ ΤΟΣΚΑΣ', '', 0)
+        self.handler.create_multiple([{'name': 'Νίκος Τόσκας', 'political_party': '', 'birthdate': 0},
+                                      {'name': 'Ευκλείδης Τσακαλώτος', 'political_party': '', 'birthdate': 0}])
+
+        self.assertEqual(len(self.handler.load_all()), 5)
+        self.assertEqual(self.handler.load_by_name('ΝΙΚΟΣ ΤΟΣΚΑΣ')['political_party'], 'ΣΥΡΙΖΑ')
+
+    def test_save_positions(self):
+        person = self.handler.load_by_name('ΝΙΚΟΣ ΤΟΣΚΑΣ')
+        position = {'role': 'Υπουργός', 'date_from': '2016-11-05 00:00:00', 'date_to': 0,
+                    'person_id': person['id'], 'ministry_id': 1, 'cabinet_id': None}
+
+        self.handler.save_positions([position, dict(position, ministry_id=2)])
+        self.handler.save_positions([position])
+        self.handler.save_position(**position)
+
+        self.assertEqual(len(self.handler.select_all('positions')), 2)
+
+    def test_update_name(self):
+        person = self.handler.load_by_name('ΓΕΩΡΓΙΟΣ ΣΤΑΘΑΚΗΣ')
+        self.handler.update(person['id'], {'name': 'Γιώργος Σταθάκης'})
+
+        self.assertIsNone(self.handler.load_by_name('ΓΕΩΡΓΙΟΣ ΣΤΑΘΑΚΗΣ'))
+        self.assertEqual(self.handler.load_by_name('ΓΙΩΡΓΟΣ ΣΤΑΘΑΚΗΣ')['id'], person['id'])
+        self.assertEqual(self.handler.find_candidates('ΣΤΑΘΑΚΗΣ')[0]['id'], person['id'])
+
+if __name__ == '__main__':
+    unittest.main()
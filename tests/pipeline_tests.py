@@ -0,0 +1,82 @@
+import unittest
+import os
+import sys
+import threading
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from mmu.utility.pipeline import Pipeline
+
+class PipelineTest(unittest.TestCase):
+
+    # Every item goes through every stage, and items a stage returns None for are dropped
+    def test_stages(self):
+        results = []
+        lock = threading.Lock()
+
+        def store(item):
+            with lock:
+                results.append(item)
+
+        pipeline = Pipeline()
+        pipeline.add_stage('double', lambda item: item * 2, workers=3, max_pending=5)
+        pipeline.add_stage('odd', lambda item: item if item % 4 else None, workers=2)
+        pipeline.add_stage('store', store)
+
+        with pipeline:
+            for item in range(100):
+                pipeline.put(item)
+
+        self.assertEqual(sorted(results), [item * 2 for item in range(100) if item % 2])
+        self.assertEqual(pipeline.counts(), {'double': {'done': 100, 'failed': 0}, 'odd': {'done': 100, 'failed': 0},
+                                             'store': {'done': 50, 'failed': 0}})
+
+    # Once a stage's queue is full, putting an item blocks until the stage catches up
+    def test_backpressure(self):
+        release = threading.Event()
+        started = threading.Event()
+        pipeline = Pipeline().add_stage('slow', lambda item: started.set() or release.wait(), max_pending=1)
+
+        pipeline.put(1)
+        started.wait(5)
+        pipeline.put(2)
+
+        producer = threading.Thread(target=pipeline.put, args=(3,))
+        producer.start()
+        producer.join(0.2)
+        self.assertTrue(producer.is_alive())
+
+        release.set()
+        producer.join(5)
+        self.assertFalse(producer.is_alive())
+
+        pipeline.close()
+        self.assertEqual(pipeline.counts()['slow']['done'], 3)
+
+    # An item that fails is dropped without stopping its stage
+    def test_failures(self):
+        results = []
+        pipeline = Pipeline()
+        pipeline.add_stage('parse', lambda item: 10 // item, workers=2)
+        pipeline.add_stage('store', results.append)
+
+        with pipeline:
+            for item in [1, 0, 2, 0, 5]:
+                pipeline.put(item)
+
+        self.assertEqual(sorted(results), [2, 5, 10])
+        self.assertEqual(pipeline.counts()['parse'], {'done': 3, 'failed': 2})
+        self.assertRaises(RuntimeError, pipeline.put, 1)
+
+    # Every worker calls on_worker_exit from its own thread once the pipeline is closed
+    def test_worker_exit(self):
+        threads = []
+        pipeline = Pipeline(on_worker_exit=lambda: threads.append(threading.current_thread().name))
+        pipeline.add_stage('parse', lambda item: item, workers=2)
+        pipeline.add_stage('store', lambda item: None)
+
+        with pipeline:
+            pipeline.put(1)
+
+        self.assertEqual(sorted(threads), ['parse-0', 'parse-1', 'store-0'])
+
+if __name__ == '__main__':
+    unittest.main()
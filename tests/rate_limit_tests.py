@@ -0,0 +1,156 @@
+import unittest
+import os
+import sys
+import time
+import threading
+import urllib.error
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from mmu.utility.rate_limit import RateLimiter, HostRateLimiter, parse_retry_after
+
+
+# Answers with the statuses queued on the server, or 200 once there are none left
+class StatusRequestHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        status = self.server.statuses.pop(0) if self.server.statuses else 200
+        self.server.requests.append(time.monotonic())
+
+        self.send_response(status)
+        if status == 429:
+            self.send_header('Retry-After', '1')
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'ok')
+
+    def log_message(self, format, *args):
+        pass
+
+
+class RateLimiterTest(unittest.TestCase):
+
+    def test_rate(self):
+        limiter = RateLimiter(rate=50, burst=1)
+        start = time.monotonic()
+        for request in range(11):
+            limiter.acquire()
+
+        # The first request doesn't wait, the next 10 are 20ms apart
+        self.assertGreaterEqual(time.monotonic() - start, 0.19)
+
+    def test_burst(self):
+        limiter = RateLimiter(rate=1, burst=5)
+        self.assertEqual([limiter.acquire() for request in range(5)], [0] * 5)
+
+    # Threads share the rate
+    def test_threads(self):
+        limiter = RateLimiter(rate=100, burst=1)
+        times = []
+
+        def request():
+            for number in range(5):
+                limiter.acquire()
+                times.append(time.monotonic())
+
+        threads = [threading.Thread(target=request) for thread in range(4)]
+        start = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertGreaterEqual(max(times) - start, 0.18)
+
+    def test_invalid_rate(self):
+        with self.assertRaises(ValueError):
+            RateLimiter(rate=0)
+        with self.assertRaises(ValueError):
+            HostRateLimiter(rate=-1)
+
+    # Overloaded responses halve the rate down to its minimum, and fine responses bring it back up step by step
+    def test_adaptive_rate(self):
+        limiter = RateLimiter(rate=10, min_rate=2, slow_response=1)
+
+        limiter.feedback(503)
+        self.assertEqual(limiter.rate(), 5)
+        limiter.feedback(429)
+        limiter.feedback(None)
+        self.assertEqual(limiter.rate(), 2)
+
+        limiter.feedback(200, elapsed=0.1)
+        self.assertEqual(limiter.rate(), 2.5)
+        for response in range(100):
+            limiter.feedback(200, elapsed=0.1)
+        self.assertEqual(limiter.rate(), 10)
+
+        limiter.feedback(200, elapsed=2)
+        self.assertEqual(limiter.rate(), 8)
+
+    # No request goes through until the time the server asked to wait has passed
+    def test_retry_after(self):
+        limiter = RateLimiter(rate=100, burst=10)
+        limiter.feedback(429, retry_after=0.2)
+
+        self.assertGreaterEqual(limiter.acquire(), 0.19)
+
+    def test_parse_retry_after(self):
+        self.assertEqual(parse_retry_after('120'), 120)
+        self.assertEqual(parse_retry_after('100000'), 300)
+        self.assertEqual(parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT'), 0)
+        self.assertIsNone(parse_retry_after('soon'))
+        self.assertIsNone(parse_retry_after(None))
+
+
+class HostRateLimiterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StatusRequestHandler)
+        self.server.statuses = []
+        self.server.requests = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = 'http://127.0.0.1:{}/page'.format(self.server.server_address[1])
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    # Every host has its own rate
+    def test_hosts(self):
+        limiter = HostRateLimiter(rate=1)
+        limiter.feedback('http://slow.example.com/a', 503)
+
+        self.assertIs(limiter.limiter('http://slow.example.com/b'), limiter.limiter('http://SLOW.example.com/c'))
+        self.assertEqual(limiter.limiter('http://slow.example.com/').rate(), 0.5)
+        self.assertEqual(limiter.limiter('http://fast.example.com/').rate(), 1)
+        self.assertEqual(limiter.acquire('http://fast.example.com/'), 0)
+
+    # Overloaded responses are sent again once the server's Retry-After has passed
+    def test_open_retries(self):
+        limiter = HostRateLimiter(rate=100)
+        self.server.statuses = [503, 429]
+
+        with limiter.open(self.url, timeout=5) as response:
+            self.assertEqual(response.read(), b'ok')
+
+        self.assertEqual(len(self.server.requests), 3)
+        self.assertGreaterEqual(self.server.requests[2] - self.server.requests[1], 0.9)
+        self.assertLess(limiter.limiter(self.url).rate(), 100)
+
+    def test_open_gives_up(self):
+        limiter = HostRateLimiter(rate=100, retries=1)
+        self.server.statuses = [500, 502, 200]
+
+        with self.assertRaises(urllib.error.HTTPError) as context:
+            limiter.open(self.url, timeout=5)
+
+        self.assertEqual(context.exception.code, 502)
+        self.assertEqual(len(self.server.requests), 2)
+
+        # Statuses that don't mean the server is overloaded are not sent again
+        self.server.statuses = [404]
+        with self.assertRaises(urllib.error.HTTPError):
+            limiter.open(self.url, timeout=5)
+        self.assertEqual(len(self.server.requests), 3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import unittest
+import os
+import sys
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from mmu.utility.redirects import RedirectResolver
+
+
+# Serves interstitial pages that redirect through meta refreshes, like the ones before an issue's pdf. The body of
+# every page is long, to check that only its head is read.
+class RedirectRequestHandler(BaseHTTPRequestHandler):
+
+    pages = {
+        '/download': '<html><head><title>Λήψη</title>'
+                     '<meta http-equiv="REFRESH" content="0;url=/idocs-nph/redirect?args=1&amp;lang=el">'
+                     '</head><body>{}</body></html>',
+        '/idocs-nph/redirect': '<html><head><meta content="0; URL=http://{host}/file.pdf" http-equiv="refresh"></head>'
+                               '<body>{}</body></html>',
+        '/plain': '<html><head><title>Σελίδα</title></head><body>{}</body></html>',
+    }
+
+    def do_GET(self):
+        path = self.path.split('?')[0]
+        if path not in self.pages:
+            self.send_error(404)
+            return
+
+        body = self.pages[path].replace('{host}', '127.0.0.1:{}'.format(self.server.server_address[1]))
+        body = body.replace('{}', 'x' * 200000).encode('utf-8')
+
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except ConnectionError:
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+class RedirectResolverTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), RedirectRequestHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = 'http://127.0.0.1:{}'.format(self.server.server_address[1])
+        self.resolver = RedirectResolver()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_resolve(self):
+        self.assertEqual(self.resolver.resolve(self.base_url + '/download'), self.base_url + '/file.pdf')
+
+    def test_resolve_one_hop(self):
+        self.assertEqual(self.resolver.resolve(self.base_url + '/download', hops=1),
+                         self.base_url + '/idocs-nph/redirect?args=1&lang=el')
+
+    def test_page_without_refresh(self):
+        self.assertEqual(self.resolver.resolve(self.base_url + '/plain'), self.base_url + '/plain')
+
+    def test_missing_page(self):
+        self.assertIsNone(self.resolver.resolve(self.base_url + '/missing'))
+
+    # Reading stops at the end of the head
+    def test_read_head(self):
+        head = self.resolver.read_head(self.base_url + '/download')
+
+        self.assertIn(b'</head>', head)
+        self.assertLess(len(head), 10000)
+
+    def test_refresh_url(self):
+        head = b'<head><meta charset="utf-8"><META HTTP-EQUIV=Refresh CONTENT="0;url=file.pdf"></head>'
+        self.assertEqual(self.resolver.refresh_url(head, 'http://www.et.gr/idocs-nph/search/download.html'),
+                         'http://www.et.gr/idocs-nph/search/file.pdf')
+        self.assertIsNone(self.resolver.refresh_url(b'<head><meta charset="utf-8"></head>'))
+
+if __name__ == '__main__':
+    unittest.main()
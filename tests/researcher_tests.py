@@ -0,0 +1,108 @@
+import unittest
+import os
+import sys
+import threading
+import urllib.error
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from tests.database_test_case import DatabaseTestCase
+from mmu.db.handlers.ministry import MinistryHandler
+from mmu.db.handlers.person import PersonHandler
+from mmu.automations.researcher import Researcher
+
+
+# Stands in for wikipedia: every search finds one article, ministry articles list the people given and person
+# articles have a political party. Searches for the names given as failing raise like a lost connection.
+class StubResearcher(Researcher):
+
+    def __init__(self, db_name, ministries, failing = ()):
+        Researcher.__init__(self, db_name)
+        self.ministries = ministries
+        self.failing = failing
+        self.searches = []
+        self.lock = threading.Lock()
+
+    def wiki_search(self, keyword, limit = 10, lang = 'el'):
+        with self.lock:
+            self.searches.append(keyword)
+
+        if keyword in self.failing:
+            raise urllib.error.URLError('Connection reset')
+
+        return [keyword, [keyword], [''], ['https://el.wikipedia.org/wiki/' + keyword]]
+
+    def wiki_article_info(self, link):
+        ministry = link.rpartition('/')[2]
+        return [[{'Όνομα': name, 'Κυβέρνηση': None} for name in self.ministries[ministry]]]
+
+    def wiki_synopsis_info(self, link):
+        return {'πολιτικό κόμμα': 'ΚΟΜΜΑ ' + link.rpartition('/')[2]}
+
+
+class ResearcherTest(DatabaseTestCase):
+
+    def setUp(self):
+        DatabaseTestCase.setUp(self)
+
+        self.ministries = {'Υπουργείο Εσωτερικών': ['ΝΙΚΟΛΑΟΣ ΤΟΣΚΑΣ', 'ΠΑΝΑΓΙΩΤΗΣ ΚΟΥΡΟΥΜΠΛΗΣ'],
+                           'Υπουργείο Οικονομικών': ['ΕΥΚΛΕΙΔΗΣ ΤΣΑΚΑΛΩΤΟΣ', 'ΝΙΚΟΛΑΟΣ ΤΟΣΚΑΣ'],
+                           'Υπουργείο Υγείας': ['ΑΝΔΡΕΑΣ ΞΑΝΘΟΣ']}
+
+        self.ministry_handler = MinistryHandler(self.db_path)
+        self.ministry_handler.create_multiple([{'name': name, 'description': '', 'established': 0, 'disbanded': 0}
+                                               for name in self.ministries])
+        self.person_handler = PersonHandler(self.db_path)
+
+    def tearDown(self):
+        self.ministry_handler.close()
+        DatabaseTestCase.tearDown(self)
+
+    # The positions of every person and ministry found
+    def positions(self):
+        return sorted((position['ministry'], self.person_handler.load_by_id(position['person_id'])['name'])
+                      for position in self.person_handler.load_positions())
+
+    # People listed by several ministries are looked up once
+    def test_research_positions(self):
+        researcher = StubResearcher(self.db_path, self.ministries)
+        researcher.research_positions()
+
+        self.assertEqual(self.positions(), [('Υπουργείο Εσωτερικών', 'ΝΙΚΟΛΑΟΣ ΤΟΣΚΑΣ'),
+                                            ('Υπουργείο Εσωτερικών', 'ΠΑΝΑΓΙΩΤΗΣ ΚΟΥΡΟΥΜΠΛΗΣ'),
+                                            ('Υπουργείο Οικονομικών', 'ΕΥΚΛΕΙΔΗΣ ΤΣΑΚΑΛΩΤΟΣ'),
+                                            ('Υπουργείο Οικονομικών', 'ΝΙΚΟΛΑΟΣ ΤΟΣΚΑΣ'),
+                                            ('Υπουργείο Υγείας', 'ΑΝΔΡΕΑΣ ΞΑΝΘΟΣ')])
+        self.assertEqual(researcher.searches.count('ΝΙΚΟΛΑΟΣ ΤΟΣΚΑΣ'), 1)
+        self.assertEqual(self.person_handler.load_by_name('ΝΙΚΟΛΑΟΣ ΤΟΣΚΑΣ')['political_party'],
+                         'ΚΟΜΜΑ ΝΙΚΟΛΑΟΣ ΤΟΣΚΑΣ')
+
+        # People saved by an earlier research aren't looked up again
+        researcher = StubResearcher(self.db_path, self.ministries)
+        researcher.research_positions()
+        self.assertEqual(sorted(researcher.searches), sorted(self.ministries))
+
+    # People are looked up once per researcher, whatever the form of their name
+    def test_fetch_person(self):
+        researcher = StubResearcher(self.db_path, self.ministries)
+
+        person = researcher.fetch_person('Νικόλαος Τόσκας')
+        self.assertEqual(person['name'], 'ΝΙΚΟΛΑΟΣ ΤΟΣΚΑΣ')
+        self.assertIs(researcher.fetch_person('ΝΙΚΟΛΑΟΣ ΤΟΣΚΑΣ'), person)
+        self.assertEqual(researcher.searches, ['Νικόλαος Τόσκας'])
+
+    # A ministry or a person whose article fails is skipped, and everything else is saved
+    def test_failed_articles(self):
+        researcher = StubResearcher(self.db_path, self.ministries, failing=['Υπουργείο Υγείας', 'ΕΥΚΛΕΙΔΗΣ ΤΣΑΚΑΛΩΤΟΣ'])
+        researcher.research_positions()
+
+        self.assertEqual(self.positions(), [('Υπουργείο Εσωτερικών', 'ΝΙΚΟΛΑΟΣ ΤΟΣΚΑΣ'),
+                                            ('Υπουργείο Εσωτερικών', 'ΠΑΝΑΓΙΩΤΗΣ ΚΟΥΡΟΥΜΠΛΗΣ'),
+                                            ('Υπουργείο Οικονομικών', 'ΝΙΚΟΛΑΟΣ ΤΟΣΚΑΣ')])
+        self.assertIsNone(self.person_handler.load_by_name('ΕΥΚΛΕΙΔΗΣ ΤΣΑΚΑΛΩΤΟΣ'))
+
+        # Failed people aren't remembered, so the next research looks them up again
+        researcher.failing = []
+        self.assertEqual(researcher.fetch_person('ΕΥΚΛΕΙΔΗΣ ΤΣΑΚΑΛΩΤΟΣ')['political_party'],
+                         'ΚΟΜΜΑ ΕΥΚΛΕΙΔΗΣ ΤΣΑΚΑΛΩΤΟΣ')
+
+if __name__ == '__main__':
+    unittest.main()
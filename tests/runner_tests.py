@@ -0,0 +1,102 @@
+import unittest
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from tests.database_test_case import DatabaseTestCase
+from mmu.db.handlers.issue import IssueHandler
+from mmu.db.handlers.signatures import RawSignatureHandler
+from mmu.automations.runner import PipelineRunner
+
+
+# Stands in for the analyzer, extracting one page and one signature from every issue instead of parsing its pdf
+class StubAnalyzer:
+
+    def __init__(self, db_path):
+        self.issue_handler = IssueHandler(db_path)
+        self.raw_signature_handler = RawSignatureHandler(db_path)
+        self.extractions = 0
+
+    def is_extractable(self, issue):
+        return issue['type'] == 'Α'
+
+    def is_verified(self, issue):
+        return True
+
+    def extract_issue(self, issue):
+        signature = {'person_name': 'ΝΙΚΟΛΑΟΣ ΤΟΣΚΑΣ', 'role': 'ΥΠΟΥΡΓΟΣ ΕΣΩΤΕΡΙΚΩΝ', 'issue_title': issue['title'],
+                     'issue_date': issue['date'], 'regulation': 'ΝΟΜΟΣ ΥΠ’ ΑΡΙΘ. ' + str(issue['number'])}
+        return ['Κείμενο του ' + issue['title']], [signature]
+
+    def save_extraction(self, issue, pages, raw_signatures):
+        self.issue_handler.save_pages(issue['id'], pages)
+        self.raw_signature_handler.create_multiple(raw_signatures)
+        self.issue_handler.set_analyzed(issue['id'])
+
+    def start_signature_extraction(self):
+        self.extractions += 1
+
+
+# Stands in for the crawl, saving the issues given as if they had been found on the search page
+class StubRunner(PipelineRunner):
+
+    def __init__(self, db_path, issues, fail = False):
+        PipelineRunner.__init__(self, 'http://127.0.0.1', rate_limit=None, db_name=db_path)
+        self.stub_analyzer = StubAnalyzer(db_path)
+        self.issue_handler = IssueHandler(db_path)
+        self.issues = issues
+        self.fail = fail
+
+    def analyzer(self):
+        return self.stub_analyzer
+
+    def crawl(self, year_start, year_end, types):
+        for title, type, number in self.issues:
+            self.issue_handler.create(title, type, number, 'blob:' + str(number), '2016-02-01 00:00:00')
+            self.issue_saved(title)
+
+        if self.fail:
+            raise RuntimeError('Search page unavailable')
+
+
+class PipelineRunnerTest(DatabaseTestCase):
+
+    def setUp(self):
+        DatabaseTestCase.setUp(self)
+
+        self.issue_handler = IssueHandler(self.db_path)
+        self.raw_signature_handler = RawSignatureHandler(self.db_path)
+        self.issues = [('ΦΕΚ A 12 - 01.02.2016', 'Α', 12), ('ΦΕΚ A 13 - 01.02.2016', 'Α', 13),
+                       ('ΦΕΚ B 200 - 01.02.2016', 'Β', 200)]
+
+    def tearDown(self):
+        self.issue_handler.close()
+        DatabaseTestCase.tearDown(self)
+
+    # Issues saved by the crawl are parsed and their extractions are stored while the crawl goes on
+    def test_run(self):
+        runner = StubRunner(self.db_path, self.issues)
+
+        self.assertEqual(runner.run(), {'parse': {'done': 3, 'failed': 0}, 'store': {'done': 2, 'failed': 0}})
+        self.assertEqual(runner.stub_analyzer.extractions, 1)
+
+        issue = self.issue_handler.load_by_title('ΦΕΚ A 12 - 01.02.2016')
+        self.assertTrue(issue['analyzed'])
+        self.assertEqual(self.issue_handler.load_pages(issue['id']), ['Κείμενο του ΦΕΚ A 12 - 01.02.2016'])
+        self.assertEqual(sorted(signature['issue_title'] for signature in self.raw_signature_handler.load_all()),
+                         ['ΦΕΚ A 12 - 01.02.2016', 'ΦΕΚ A 13 - 01.02.2016'])
+
+        # Issues of types whose signatures aren't extracted are left alone
+        self.assertFalse(self.issue_handler.load_by_title('ΦΕΚ B 200 - 01.02.2016')['analyzed'])
+
+    # What was extracted before the crawl failed is saved, and the extraction that follows the crawl doesn't run
+    def test_failed_crawl(self):
+        runner = StubRunner(self.db_path, self.issues[:2], fail=True)
+
+        with self.assertRaises(RuntimeError):
+            runner.run()
+
+        self.assertEqual(len(self.raw_signature_handler.load_all()), 2)
+        self.assertEqual(runner.stub_analyzer.extractions, 0)
+
+if __name__ == '__main__':
+    unittest.main()
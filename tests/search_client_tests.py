@@ -0,0 +1,103 @@
+import unittest
+import os
+import sys
+import datetime
+import threading
+import urllib.parse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from mmu.automations.search_client import SearchClient, SearchPage
+
+pages_directory = os.path.join(os.path.dirname(__file__), 'search_pages')
+
+
+def read_page(name):
+    with open(os.path.join(pages_directory, name), 'r', encoding='utf8') as file:
+        return file.read()
+
+
+# Serves recorded pages of the gazette's search: the form on GET, and results depending on the posted fields
+class SearchRequestHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        self.respond('form.html')
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        fields = dict(urllib.parse.parse_qsl(self.rfile.read(length).decode('utf-8')))
+        self.server.posts.append(fields)
+
+        if fields.get('fekNumberFrom') != '1':
+            self.respond('no_results.html')
+        else:
+            self.respond('results_2.html' if fields.get('page') == '2' else 'results_1.html')
+
+    def respond(self, name):
+        body = read_page(name).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class SearchClientTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), SearchRequestHandler)
+        self.server.posts = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = 'http://127.0.0.1:{}'.format(self.server.server_address[1])
+        self.client = SearchClient(self.base_url + '/idocs-nph/search/fekForm.html')
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_issue_type(self):
+        self.assertEqual(self.client.issue_type(1), 'ΠΡΩΤΟ (Α)')
+        self.assertIsNone(self.client.issue_type(15))
+
+    def test_search(self):
+        page = self.client.search(1, 2016, 1, 201)
+
+        self.assertEqual(self.server.posts[0], {'mode': 'search', 'year': '2016', 'chbIssue_1': '1',
+                                                'fekNumberFrom': '1', 'fekNumberTo': '201', 'search': 'Αναζήτηση'})
+        self.assertEqual(page.num_results(), 3)
+        self.assertEqual(page.rows()[0], {
+            'title': 'ΦΕΚ A 1 - 12.01.2016', 'number': '1', 'date': datetime.datetime(2016, 1, 12),
+            'link': self.base_url + '/idocs-nph/search/download.html?args=1'})
+
+    # Every page of results is loaded by posting the search again along with the page's field
+    def test_pages(self):
+        pages = list(self.client.pages(self.client.search(1, 2016, 1, 201)))
+
+        self.assertEqual([[row['title'] for row in page.rows()] for page in pages],
+                         [['ΦΕΚ A 1 - 12.01.2016', 'ΦΕΚ A 2 - 14.01.2016'], ['ΦΕΚ A 3 - 15.01.2016']])
+        self.assertEqual(self.server.posts[1]['page'], '2')
+        self.assertEqual(self.server.posts[1]['fekNumberFrom'], '1')
+
+    def test_no_results(self):
+        page = self.client.search(1, 2016, 201, 401)
+
+        self.assertEqual(page.num_results(), 0)
+        self.assertEqual(page.rows(), [])
+
+
+class SearchPageTest(unittest.TestCase):
+
+    # Pages without pagination only have a header row
+    def test_rows_without_pagination(self):
+        html = '''<table id="result_table">
+            <tr><th>#</th><th>Τίτλος</th><th>Αρχείο</th></tr>
+            <tr><td>1</td><td><b>ΦΕΚ B 12 - 05.02.2016</b></td><td><a href="/download?args=12">Λήψη</a></td></tr>
+        </table>'''
+        rows = SearchPage(html, 'http://www.et.gr').rows()
+
+        self.assertEqual([(row['number'], row['link']) for row in rows], [('12', 'http://www.et.gr/download?args=12')])
+
+if __name__ == '__main__':
+    unittest.main()
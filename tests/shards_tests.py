@@ -0,0 +1,149 @@
+import unittest
+import os
+import sys
+import sqlite3
+import datetime
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from tests.database_test_case import DatabaseTestCase
+from mmu.db.migrations import current_version, latest_version
+from mmu.db.shards import Shards
+from mmu.db.handlers.issue import IssueHandler
+from mmu.db.handlers.signatures import RawSignatureHandler
+from mmu.utility.blob_store import BlobStore
+
+class ShardsTest(DatabaseTestCase):
+
+    def setUp(self):
+        DatabaseTestCase.setUp(self)
+
+        self.shards = Shards(self.db_path)
+        self.handlers = []
+
+    def tearDown(self):
+        for handler in self.handlers:
+            handler.close()
+
+        DatabaseTestCase.tearDown(self)
+
+    def test_year(self):
+        self.assertEqual(Shards.year('2016-01-12 00:00:00'), 2016)
+        self.assertEqual(Shards.year('12.01.2016'), 2016)
+        self.assertEqual(Shards.year(datetime.datetime(2017, 3, 1)), 2017)
+        self.assertEqual(Shards.year(1483228800), 2017)
+        self.assertEqual(Shards.year(2018), 2018)
+
+    # Writes go to the shard of the issue's year, which is created with the latest schema
+    def test_routing(self):
+        self.create_issue(1, '12.01.2016')
+        self.create_issue(2, '14.01.2016')
+        self.create_issue(1, '02.01.2017')
+
+        self.assertEqual(self.shards.years(), [2016, 2017])
+        self.assertEqual(len(self.shard_handler(2016).load_all()), 2)
+        self.assertEqual(len(self.shard_handler(2017).load_all()), 1)
+        self.assertEqual(self.count_issues(self.db_path), 0)
+
+        db = sqlite3.connect(self.shards.path(2017))
+        self.assertEqual(current_version(db), latest_version())
+        db.close()
+
+    # A federated handler sees the rows of the main database and all shards
+    def test_federate(self):
+        self.create_issue(1, '12.01.2016')
+        self.create_issue(1, '02.01.2017')
+        self.shards.handler(RawSignatureHandler, '2017').create('ΝΙΚΟΛΑΟΣ ΤΟΣΚΑΣ', 'ΑΝΑΠΛΗΡΩΤΗΣ ΥΠΟΥΡΓΟΣ ΕΣΩΤΕΡΙΚΩΝ',
+                                                                'ΦΕΚ A 1 - 02.01.2017', '2017-01-02 00:00:00')
+        main_handler = IssueHandler(self.db_path)
+        self.handlers.append(main_handler)
+        main_handler.create('ΦΕΚ A 1 - 03.01.2015', 'Α', 1, 'N/A', '2015-01-03 00:00:00')
+
+        handler = IssueHandler(self.db_path, read_only=True)
+        self.handlers.append(handler)
+        self.shards.federate(handler)
+
+        self.assertEqual(len(handler.load_all()), 3)
+        self.assertEqual(handler.load_by_title('ΦΕΚ A 1 - 02.01.2017')['number'], 1)
+        self.assertEqual(sorted(handler.attached()), ['shard_2016', 'shard_2017'])
+
+        # Other read-only handlers of the same database share the federated connection
+        signatures = RawSignatureHandler(self.db_path, read_only=True).load_all()
+        self.assertEqual([signature['person_name'] for signature in signatures], ['ΝΙΚΟΛΑΟΣ ΤΟΣΚΑΣ'])
+
+        # Federating again picks up new shards without attaching the existing ones twice
+        self.create_issue(1, '05.01.2018')
+        self.shards.federate(handler)
+        self.assertEqual(len(handler.load_all()), 4)
+
+        with self.assertRaises(sqlite3.OperationalError):
+            handler.create('ΦΕΚ A 2 - 03.01.2015', 'Α', 2, 'N/A', '2015-01-03 00:00:00')
+
+    # Shards beyond the amount of databases sqlite can attach are federated through copies of their rows
+    def test_federate_limit(self):
+        for year in range(2010, 2015):
+            self.create_issue(1, '12.01.{}'.format(year))
+            self.create_issue(2, '14.01.{}'.format(year))
+        self.shards.handler(RawSignatureHandler, '2014').create('ΝΙΚΟΛΑΟΣ ΤΟΣΚΑΣ', 'ΥΠΟΥΡΓΟΣ ΕΣΩΤΕΡΙΚΩΝ',
+                                                                'ΦΕΚ A 1 - 12.01.2014', '2014-01-12 00:00:00')
+
+        handler = IssueHandler(self.db_path, read_only=True)
+        self.handlers.append(handler)
+        handler.connection().setlimit(sqlite3.SQLITE_LIMIT_ATTACHED, 3)
+        self.shards.federate(handler)
+
+        self.assertEqual(sorted(handler.attached()), ['shard_2010', 'shard_2011'])
+        self.assertEqual(len(handler.load_all()), 10)
+        self.assertEqual(handler.load_by_title('ΦΕΚ A 2 - 14.01.2013')['number'], 2)
+
+        signatures = RawSignatureHandler(self.db_path, read_only=True).load_all()
+        self.assertEqual([signature['person_name'] for signature in signatures], ['ΝΙΚΟΛΑΟΣ ΤΟΣΚΑΣ'])
+
+        # Federating again doesn't copy the same rows twice
+        self.shards.federate(handler)
+        self.assertEqual(len(handler.load_all()), 10)
+
+        # Without a free slot no shard can be federated
+        handler.connection().setlimit(sqlite3.SQLITE_LIMIT_ATTACHED, 2)
+        with self.assertRaises(ValueError):
+            self.shards.federate(handler)
+
+    # Files referred to only by the issues of a shard aren't collected
+    def test_count_file_references(self):
+        store = BlobStore(os.path.join(self.directory, 'store'))
+        files = []
+        for content in [b'%PDF-1.4 main', b'%PDF-1.4 2016', b'%PDF-1.4 unused']:
+            path = os.path.join(self.directory, 'issue.pdf')
+            with open(path, 'wb') as file:
+                file.write(content)
+            files.append(store.put(path))
+
+        main_handler = IssueHandler(self.db_path)
+        self.handlers.append(main_handler)
+        main_handler.create('ΦΕΚ A 1 - 03.01.2015', 'Α', 1, files[0], '2015-01-03 00:00:00')
+        self.shard_handler('2016').create('ΦΕΚ A 1 - 12.01.2016', 'Α', 1, files[1], '2016-01-12 00:00:00')
+        self.create_issue(2, '14.01.2016')
+
+        self.assertEqual(self.shards.count_file_references(), {files[0]: 1, files[1]: 1, 'N/A': 1})
+        self.assertEqual(store.collect(self.shards.count_file_references()), 1)
+        self.assertTrue(store.exists(files[1]))
+        self.assertFalse(store.exists(files[2]))
+
+    def create_issue(self, number, date):
+        day, month, year = date.split('.')
+        issue_date = '{}-{}-{} 00:00:00'.format(year, month, day)
+        self.shard_handler(issue_date).create('ΦΕΚ A {} - {}'.format(number, date), 'Α', number, 'N/A', issue_date)
+
+    def shard_handler(self, date):
+        handler = self.shards.handler(IssueHandler, date)
+        if handler not in self.handlers:
+            self.handlers.append(handler)
+
+        return handler
+
+    def count_issues(self, path):
+        db = sqlite3.connect(path)
+        count = db.execute('SELECT COUNT(*) FROM issues').fetchone()[0]
+        db.close()
+        return count
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,175 @@
+import unittest
+import os
+import sys
+import sqlite3
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from tests.database_test_case import DatabaseTestCase
+from mmu.db.handlers.signatures import RawSignatureHandler
+from mmu.db.writer import DatabaseWriter
+
+class RawSignatureHandlerTest(DatabaseTestCase):
+
+    def setUp(self):
+        DatabaseTestCase.setUp(self)
+
+        self.handler = RawSignatureHandler(self.db_path)
+
+    def tearDown(self):
+        self.handler.close()
+        DatabaseTestCase.tearDown(self)
+
+    def test_create_multiple(self):
+        self.handler.create_multiple(self.signatures())
+
+        signatures = self.handler.load_all()
+        self.assertEqual(len(signatures), 3)
+        self.assertEqual(signatures[0], {'id': 1, 'person_name': 'ΠΡΟΚΟΠΙΟΣ Β ΠΑΥΛΟΠΟΥΛΟΣ',
+                                         'role': 'Ο ΠΡΟΕΔΡΟΣ ΤΗΣ ΔΗΜΟΚΡΑΤΙΑΣ', 'issue_title': 'ΦΕΚ A 12 - 01.02.2016',
+                                         'issue_date': '2016-02-01 00:00:00', 'regulation': 'NOMOΣ ΥΠ’ ΑΡΙΘ. 4363'})
+
+        # Repeated values are only stored once
+        self.assertEqual(len(self.handler.load_dimension('person_name')), 2)
+        self.assertEqual(len(self.handler.load_dimension('issue_title')), 2)
+        self.assertEqual(len(self.handler.load_dimension('regulation')), 2)
+
+    # Analyzing an issue again doesn't duplicate its signatures
+    def test_create_multiple_twice(self):
+        self.handler.create_multiple(self.signatures())
+        self.handler.create_multiple(self.signatures())
+        self.handler.create('ΝΙΚΟΛΑΟΣ ΤΟΣΚΑΣ', 'ΑΝΑΠΛΗΡΩΤΗΣ ΥΠΟΥΡΓΟΣ ΕΣΩΤΕΡΙΚΩΝ', 'ΦΕΚ A 14 - 05.02.2016',
+                            '2016-02-05 00:00:00')
+        self.handler.create('ΝΙΚΟΛΑΟΣ ΤΟΣΚΑΣ', 'ΑΝΑΠΛΗΡΩΤΗΣ ΥΠΟΥΡΓΟΣ ΕΣΩΤΕΡΙΚΩΝ', 'ΦΕΚ A 14 - 05.02.2016',
+                            '2016-02-05 00:00:00')
+
+        self.assertEqual(len(self.handler.load_all()), 4)
+
+    # Signatures whose person or issue wasn't found aren't duplicated either
+    def test_create_multiple_twice_without_person(self):
+        signatures = [dict(self.signature('ΑΛΦΑ'), person_name=None), dict(self.signature('ΑΛΦΑ'), issue_title=None)]
+        self.handler.create_multiple(signatures)
+        self.handler.create_multiple(signatures)
+        self.handler.create(None, 'ΥΠΟΥΡΓΟΣ', 'ΦΕΚ A 12 - 01.02.2016', '2016-02-01 00:00:00')
+        self.handler.create(None, 'ΥΠΟΥΡΓΟΣ', 'ΦΕΚ A 12 - 01.02.2016', '2016-02-01 00:00:00')
+
+        self.assertEqual(len(self.handler.load_all()), 3)
+
+    def test_load_all_by_person_name(self):
+        self.handler.create_multiple(self.signatures())
+        signatures = self.handler.load_all_by_person_name('ΝΙΚΟΛΑΟΣ ΤΟΣΚΑΣ')
+        self.assertEqual([signature['issue_title'] for signature in signatures], ['ΦΕΚ A 12 - 01.02.2016'])
+
+    # Inserts and updates through the raw_signatures view still work
+    def test_compatibility_view(self):
+        self.handler.create('ΝΙΚΟΛΑΟΣ ΤΟΣΚΑΣ', 'ΑΝΑΠΛΗΡΩΤΗΣ ΥΠΟΥΡΓΟΣ ΕΣΩΤΕΡΙΚΩΝ', 'ΦΕΚ A 14 - 05.02.2016',
+                            '2016-02-05 00:00:00')
+        self.handler.update({'role': 'ΥΠΟΥΡΓΟΣ ΕΣΩΤΕΡΙΚΩΝ'}, {'person_name': ['ΝΙΚΟΛΑΟΣ ΤΟΣΚΑΣ']})
+
+        signature = self.handler.load_one({'person_name': ['ΝΙΚΟΛΑΟΣ ΤΟΣΚΑΣ']})
+        self.assertEqual(signature['role'], 'ΥΠΟΥΡΓΟΣ ΕΣΩΤΕΡΙΚΩΝ')
+        self.assertEqual(signature['issue_date'], '2016-02-05 00:00:00')
+        self.assertEqual(self.handler.find_most_common_role(None, 'ΝΙΚΟΛΑΟΣ ΤΟΣΚΑΣ')[0]['role'],
+                         'ΥΠΟΥΡΓΟΣ ΕΣΩΤΕΡΙΚΩΝ')
+
+    # Facts are returned along with the year and type of their issue, for the columnar export. Signatures saved
+    # together share one version.
+    def test_load_facts_changed_after(self):
+        self.handler.create_multiple(self.signatures()[:1])
+        first_version = self.handler.load_facts_changed_after(0)[-1][7]
+        self.handler.create_multiple(self.signatures()[1:])
+        db = sqlite3.connect(self.db_path)
+        db.execute("INSERT INTO issues (title, type, number, date) VALUES ('ΦΕΚ A 12 - 01.02.2016', 'Α', 12, "
+                   "'2016-02-01 00:00:00')")
+        db.commit()
+        db.close()
+
+        facts = self.handler.load_facts_changed_after(first_version)
+        self.assertEqual([fact[0] for fact in facts], [2, 3])
+        self.assertEqual(facts[0][7], facts[1][7])
+        self.assertEqual(facts[0][5:7], ('2016', 'Α'))
+        self.assertEqual(facts[1][5:7], ('2016', None))
+        self.assertEqual(self.handler.load_facts_changed_after(facts[-1][7]), [])
+
+        # Signatures saved through the raw_signatures view get a version of their own
+        self.handler.create('ΑΛΦΑ', 'ΥΠΟΥΡΓΟΣ', 'ΦΕΚ A 12 - 01.02.2016', '2016-02-01 00:00:00')
+        self.assertEqual([fact[0] for fact in self.handler.load_facts_changed_after(facts[-1][7])], [4])
+
+    # Signatures that change after they're saved are returned again
+    def test_load_facts_changed_after_update(self):
+        self.handler.create_multiple(self.signatures())
+        last_version = self.handler.load_facts_changed_after(0)[-1][7]
+
+        self.handler.update({'role': 'ΥΠΟΥΡΓΟΣ ΕΣΩΤΕΡΙΚΩΝ'}, {'id': [1]})
+        facts = self.handler.load_facts_changed_after(last_version)
+        self.assertEqual([fact[0] for fact in facts], [1])
+
+        db = sqlite3.connect(self.db_path)
+        db.execute("UPDATE signature_issues SET date = '2017-02-01 00:00:00' WHERE id = ?", [facts[0][3]])
+        db.commit()
+        db.close()
+
+        facts = self.handler.load_facts_changed_after(facts[-1][7])
+        self.assertEqual(facts[0][5], '2017')
+        self.assertEqual(self.handler.load_facts_changed_after(facts[-1][7]), [])
+
+    # Ids interned in a transaction that was rolled back aren't used for the values that take their place
+    def test_create_multiple_after_rollback(self):
+        with self.assertRaises(ValueError):
+            with self.handler.transaction():
+                self.handler.create_multiple([self.signature('ΑΛΦΑ')])
+                raise ValueError('Failed analysis')
+
+        self.handler.create_multiple([self.signature('ΒΗΤΑ')])
+        self.handler.create_multiple([self.signature('ΑΛΦΑ')])
+
+        self.assertEqual(sorted(signature['person_name'] for signature in self.handler.load_all()), ['ΑΛΦΑ', 'ΒΗΤΑ'])
+
+    # The same for a write of the database writer that failed and was rolled back on its own
+    def test_create_multiple_after_failed_write(self):
+        def create_and_fail():
+            self.handler.create_multiple([self.signature('ΑΛΦΑ')])
+            raise ValueError('Failed analysis')
+
+        with DatabaseWriter(self.db_path) as writer:
+            failing_future = writer.submit(create_and_fail)
+            writer.submit(self.handler.create_multiple, [self.signature('ΒΗΤΑ')])
+            last_future = writer.submit(self.handler.create_multiple, [self.signature('ΑΛΦΑ')])
+
+            with self.assertRaises(ValueError):
+                failing_future.result(timeout=10)
+            last_future.result(timeout=10)
+
+        self.assertEqual(sorted(signature['person_name'] for signature in self.handler.load_all()), ['ΑΛΦΑ', 'ΒΗΤΑ'])
+
+    # A signature of a new issue without a date fails the same way through the handler and through the view, instead
+    # of being saved without its issue
+    def test_missing_issue_date(self):
+        signature = dict(self.signature('ΑΛΦΑ'), issue_date=None)
+
+        with self.assertRaises(sqlite3.IntegrityError):
+            self.handler.create_multiple([signature])
+        with self.assertRaises(sqlite3.IntegrityError):
+            self.handler.create('ΑΛΦΑ', 'ΥΠΟΥΡΓΟΣ', 'ΦΕΚ A 12 - 01.02.2016', None)
+        self.assertEqual(self.handler.load_all(), [])
+
+        # Once the issue is saved, its date isn't needed anymore
+        self.handler.create_multiple([self.signature('ΒΗΤΑ')])
+        self.handler.create('ΑΛΦΑ', 'ΥΠΟΥΡΓΟΣ', 'ΦΕΚ A 12 - 01.02.2016', None)
+        self.assertEqual(self.handler.load_one({'person_name': ['ΑΛΦΑ']})['issue_date'], '2016-02-01 00:00:00')
+
+    def signature(self, person_name):
+        return {'person_name': person_name, 'role': 'ΥΠΟΥΡΓΟΣ', 'issue_title': 'ΦΕΚ A 12 - 01.02.2016',
+                'issue_date': '2016-02-01 00:00:00', 'regulation': 'NOMOΣ ΥΠ’ ΑΡΙΘ. 4363'}
+
+    def signatures(self):
+        return [{'person_name': 'ΠΡΟΚΟΠΙΟΣ Β ΠΑΥΛΟΠΟΥΛΟΣ', 'role': 'Ο ΠΡΟΕΔΡΟΣ ΤΗΣ ΔΗΜΟΚΡΑΤΙΑΣ',
+                 'issue_title': 'ΦΕΚ A 12 - 01.02.2016', 'issue_date': '2016-02-01 00:00:00',
+                 'regulation': 'NOMOΣ ΥΠ’ ΑΡΙΘ. 4363'},
+                {'person_name': 'ΝΙΚΟΛΑΟΣ ΤΟΣΚΑΣ', 'role': 'ΑΝΑΠΛΗΡΩΤΗΣ ΥΠΟΥΡΓΟΣ ΕΣΩΤΕΡΙΚΩΝ',
+                 'issue_title': 'ΦΕΚ A 12 - 01.02.2016', 'issue_date': '2016-02-01 00:00:00',
+                 'regulation': 'NOMOΣ ΥΠ’ ΑΡΙΘ. 4363'},
+                {'person_name': 'ΠΡΟΚΟΠΙΟΣ Β ΠΑΥΛΟΠΟΥΛΟΣ', 'role': 'Ο ΠΡΟΕΔΡΟΣ ΤΗΣ ΔΗΜΟΚΡΑΤΙΑΣ',
+                 'issue_title': 'ΦΕΚ A 1 - 12.01.2016', 'issue_date': '2016-01-12 00:00:00',
+                 'regulation': 'ΠΡΟΕΔΡΙΚΟ ΔΙΑΤΑΓΜΑ ΥΠ’ ΑΡΙΘΜ. 1'}]
+
+if __name__ == '__main__':
+    unittest.main()
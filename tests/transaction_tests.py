@@ -0,0 +1,246 @@
+import unittest
+import os
+import sys
+import sqlite3
+import threading
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from tests.database_test_case import DatabaseTestCase
+from mmu.db.handlers.issue import IssueHandler
+from mmu.db.transaction import TransactionHandler
+
+class TransactionTest(DatabaseTestCase):
+
+    def setUp(self):
+        DatabaseTestCase.setUp(self)
+
+        self.handler = IssueHandler(self.db_path)
+
+    def tearDown(self):
+        self.handler.close()
+        DatabaseTestCase.tearDown(self)
+
+    def test_default_pragmas(self):
+        db = self.handler.connection()
+        self.assertEqual(db.execute('PRAGMA journal_mode').fetchone()['journal_mode'], 'wal')
+        self.assertEqual(db.execute('PRAGMA synchronous').fetchone()['synchronous'], 1)
+
+    def test_custom_pragmas(self):
+        handler = IssueHandler(self.db_path, pragmas={'cache_size': -2000})
+        self.assertEqual(handler.connection().execute('PRAGMA cache_size').fetchone()['cache_size'], -2000)
+
+    def test_commit_without_batch(self):
+        self.create_issue(1)
+        self.assertEqual(self.count_committed(), 1)
+
+    def test_batch_size(self):
+        with self.handler.batch(size=3, interval=60):
+            self.create_issue(1)
+            self.create_issue(2)
+            self.assertEqual(self.count_committed(), 0)
+
+            # The third write fills the batch and commits all three together
+            self.create_issue(3)
+            self.assertEqual(self.count_committed(), 3)
+
+            self.create_issue(4)
+            self.assertEqual(self.count_committed(), 3)
+
+        # Whatever is left is committed when the batch ends
+        self.assertEqual(self.count_committed(), 4)
+
+    def test_batch_interval(self):
+        with self.handler.batch(size=100, interval=0):
+            self.create_issue(1)
+            self.assertEqual(self.count_committed(), 1)
+
+    def test_nested_batch_groups_writes(self):
+        with self.handler.batch(size=1, interval=60):
+            with self.handler.batch():
+                self.create_issue(1)
+                self.create_issue(2)
+                self.assertEqual(self.count_committed(), 0)
+
+            self.assertEqual(self.count_committed(), 2)
+
+    # A batch that fails rolls back the writes it hasn't committed yet
+    def test_failed_batch(self):
+        with self.assertRaises(ValueError):
+            with self.handler.batch(size=2, interval=60):
+                self.create_issue(1)
+                self.create_issue(2)
+                self.create_issue(3)
+                raise ValueError('Failed crawl')
+
+        self.assertEqual(self.count_committed(), 2)
+        self.assertIsNone(self.handler.load_by_title('ΦΕΚ A 3 - 12.01.2016'))
+
+    # A nested batch that fails only rolls back its own writes
+    def test_failed_nested_batch(self):
+        with self.handler.batch(size=100, interval=60):
+            self.create_issue(1)
+
+            with self.assertRaises(ValueError):
+                with self.handler.batch():
+                    self.create_issue(2)
+                    raise ValueError('Failed issue')
+
+            with self.handler.transaction():
+                self.create_issue(3)
+
+        self.assertEqual(self.count_committed(), 2)
+        self.assertIsNone(self.handler.load_by_title('ΦΕΚ A 2 - 12.01.2016'))
+
+    # Writes made through other handlers of the same database belong to the same batch
+    def test_batch_shared_between_handlers(self):
+        other_handler = IssueHandler(self.db_path)
+
+        with self.handler.batch(size=100, interval=60):
+            other_handler.create('ΦΕΚ A 1 - 12.01.2016', 'Α', 1, 'N/A', '2016-01-12 00:00:00')
+            self.assertEqual(self.count_committed(), 0)
+            self.assertTrue(self.handler.load_by_title('ΦΕΚ A 1 - 12.01.2016'))
+
+        self.assertEqual(self.count_committed(), 1)
+
+    # Values are bound as parameters, so quotes inside them don't break the query
+    def test_values_with_apostrophes(self):
+        title = 'ΠΡΟΕΔΡΙΚΟ ΔΙΑΤΑΓΜΑ ΥΠ’ ΑΡΙΘΜ. 1 - ΥΠ\' ΑΡΙΘΜ.'
+        self.handler.create(title, 'Α', 1, 'N/A', '2016-01-12 00:00:00')
+
+        self.assertEqual(self.handler.load_by_title(title)['title'], title)
+
+        self.handler.update('issues', {'file': "it's.pdf"}, {'title': [title]})
+        self.assertEqual(self.handler.load_by_title(title)['file'], "it's.pdf")
+
+    def test_conditions(self):
+        for number in range(1, 5):
+            self.create_issue(number)
+
+        conditions = {'title': ['%4%', 'LIKE', 'OR'], 'number': [2, '<=']}
+        self.assertEqual(len(self.handler.load_all(conditions=conditions)), 3)
+        self.assertEqual(len(self.handler.load_all(conditions={'number': [[1, 3], 'IN']})), 2)
+
+    # Queries of the same shape produce the same SQL text, no matter the values
+    def test_query_cache(self):
+        first_query, first_values = self.handler.select_query('issues', conditions={'title': ['a'], 'number': [1, '>']})
+        second_query, second_values = self.handler.select_query('issues', conditions={'title': ['b'], 'number': [2, '>']})
+
+        self.assertIs(first_query, second_query)
+        self.assertEqual(first_values, ['a', 1])
+        self.assertEqual(second_values, ['b', 2])
+
+    # Only the most recently used statements are kept, however many lengths lists of values have
+    def test_query_cache_size(self):
+        self.handler.max_cached_queries = 3
+
+        first_query = self.handler.select_query('issues', conditions={'number': [[1], 'IN']})[0]
+        for length in range(2, 10):
+            last_query = self.handler.select_query('issues', conditions={'number': [list(range(length)), 'IN']})[0]
+
+        self.assertIs(self.handler.select_query('issues', conditions={'number': [list(range(9)), 'IN']})[0],
+                      last_query)
+        self.assertIsNot(self.handler.select_query('issues', conditions={'number': [[2], 'IN']})[0], first_query)
+        self.assertEqual(self.handler.select_query('issues', conditions={'number': [[2], 'IN']})[0], first_query)
+
+    def test_row_types(self):
+        self.create_issue(1)
+        title = 'ΦΕΚ A 1 - 12.01.2016'
+
+        self.assertEqual(self.handler.load_by_title(title)['number'], 1)
+        self.assertEqual(IssueHandler(self.db_path, row_type='row').load_by_title(title)['number'], 1)
+        self.assertEqual(IssueHandler(self.db_path, row_type='tuple').load_by_title(title)[3], 1)
+
+        record = IssueHandler(self.db_path, row_type='record').load_by_title(title)
+        self.assertEqual(record.number, 1)
+        self.assertEqual(record['title'], title)
+        self.assertEqual(record.keys()[:7], ['id', 'title', 'type', 'number', 'file', 'analyzed', 'date'])
+        self.assertFalse(hasattr(record, '__dict__'))
+
+        # Columns that aren't valid attribute names fall back to sqlite3.Row
+        row = IssueHandler(self.db_path, row_type='record').select_one('issues', columns=['COUNT(*)'])
+        self.assertEqual(row[0], 1)
+
+        # So do keywords and the names of the records' own attributes
+        for column in ['class', 'from', 'keys', 'self', '__len__']:
+            row = IssueHandler(self.db_path, row_type='record').select_one('issues',
+                                                                            columns=['number AS "{}"'.format(column)])
+            self.assertEqual(row[column], 1)
+
+    def test_read_only_connection(self):
+        self.create_issue(1)
+        reader = IssueHandler(self.db_path, read_only=True)
+
+        self.assertTrue(reader.is_read_only())
+        self.assertEqual(reader.connection().execute('PRAGMA query_only').fetchone()['query_only'], 1)
+        self.assertEqual(len(reader.load_all()), 1)
+
+        with self.assertRaises(sqlite3.OperationalError):
+            reader.create('ΦΕΚ A 2 - 12.01.2016', 'Α', 2, 'N/A', '2016-01-12 00:00:00')
+
+        # Writes made through the read-write connection are seen by the reader once committed
+        self.create_issue(3)
+        self.assertEqual(len(reader.load_all()), 2)
+        reader.close()
+
+    def test_immutable_connection(self):
+        self.create_issue(1)
+        self.handler.close()
+
+        snapshot = IssueHandler(self.db_path, immutable=True)
+        self.assertTrue(snapshot.is_read_only())
+        self.assertEqual(len(snapshot.load_all()), 1)
+        snapshot.close()
+
+    # The connections of threads that end are closed, even if the threads never closed them themselves
+    def test_thread_connections(self):
+        count = TransactionHandler.connection_count()
+
+        for number in range(20):
+            thread = threading.Thread(target=lambda: IssueHandler(self.db_path).load_all())
+            thread.start()
+            thread.join()
+
+        self.assertEqual(TransactionHandler.connection_count(), count)
+
+    # A thread doesn't inherit the transaction of an ended thread, even if it's given the same ident
+    def test_thread_left_transaction(self):
+        def leave_transaction():
+            handler = IssueHandler(self.db_path)
+            handler.begin_batch()
+            handler.create('ΦΕΚ A 1 - 12.01.2016', 'Α', 1, 'N/A', '2016-01-12 00:00:00')
+
+        thread = threading.Thread(target=leave_transaction)
+        thread.start()
+        thread.join()
+
+        # The write that was never committed is discarded and the write lock is released
+        self.assertEqual(self.count_committed(), 0)
+        self.create_issue(2)
+        self.assertEqual(self.count_committed(), 1)
+
+    def test_close_thread_connections(self):
+        def write():
+            IssueHandler(self.db_path).begin_batch()
+            self.create_issue(1)
+            TransactionHandler.close_thread_connections()
+
+        count = TransactionHandler.connection_count()
+        thread = threading.Thread(target=write)
+        thread.start()
+        thread.join()
+
+        self.assertEqual(TransactionHandler.connection_count(), count)
+        self.assertEqual(self.count_committed(), 1)
+
+    # Counts the issues that can be seen from a separate connection
+    def count_committed(self):
+        db = sqlite3.connect(self.db_path)
+        count = db.execute('SELECT COUNT(*) FROM issues').fetchone()[0]
+        db.close()
+        return count
+
+    def create_issue(self, number):
+        title = 'ΦΕΚ A {} - 12.01.2016'.format(number)
+        self.handler.create(title, 'Α', number, 'N/A', '2016-01-12 00:00:00')
+
+if __name__ == '__main__':
+    unittest.main()
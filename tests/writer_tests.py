@@ -0,0 +1,122 @@
+import unittest
+import os
+import sys
+import sqlite3
+import threading
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from tests.database_test_case import DatabaseTestCase
+from mmu.db.writer import DatabaseWriter
+from mmu.db.handlers.issue import IssueHandler
+
+class DatabaseWriterTest(DatabaseTestCase):
+
+    def setUp(self):
+        DatabaseTestCase.setUp(self)
+
+        self.writer = DatabaseWriter(self.db_path)
+        self.handler = IssueHandler(self.db_path, writer=self.writer)
+
+    def tearDown(self):
+        self.writer.close()
+        self.handler.close()
+        DatabaseTestCase.tearDown(self)
+
+    # Writes from many threads are applied by the writer, and their futures resolve once they are committed
+    def test_concurrent_producers(self):
+        futures = []
+
+        def produce(thread_number):
+            for number in range(50):
+                futures.append(self.create_issue_async(thread_number * 100 + number))
+
+        threads = [threading.Thread(target=produce, args=(i,)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        for future in futures:
+            future.result(timeout=10)
+
+        self.assertEqual(self.count_committed(), 200)
+
+    def test_update_async(self):
+        self.create_issue_async(1).result(timeout=10)
+        issue = self.handler.load_by_title('ΦΕΚ A 1 - 12.01.2016')
+
+        self.handler.submit(self.handler.set_analyzed, issue['id']).result(timeout=10)
+        self.handler.update_async('issues', {'file': 'a.pdf'}, {'id': [issue['id']]}).result(timeout=10)
+
+        issue = self.handler.load_by_title('ΦΕΚ A 1 - 12.01.2016')
+        self.assertEqual((issue['analyzed'], issue['file']), (1, 'a.pdf'))
+
+    # A failing write is rolled back on its own, while the rest of its group is committed
+    def test_failing_write(self):
+        def create_and_fail():
+            self.handler.create('ΦΕΚ A 2 - 12.01.2016', 'Α', 2, 'N/A', '2016-01-12 00:00:00')
+            raise ValueError('Invalid issue')
+
+        first_future = self.create_issue_async(1)
+        failing_future = self.writer.submit(create_and_fail)
+        last_future = self.create_issue_async(3)
+
+        with self.assertRaises(ValueError):
+            failing_future.result(timeout=10)
+
+        first_future.result(timeout=10)
+        last_future.result(timeout=10)
+        self.assertEqual(self.count_committed(), 2)
+
+    # Submitting blocks while the queue is full
+    def test_backpressure(self):
+        writer = DatabaseWriter(self.db_path, max_pending=1, group_size=1)
+        handler = IssueHandler(self.db_path, writer=writer)
+        release = threading.Event()
+
+        # The writer is kept busy, so the next write fills the queue and the one after it has to wait
+        writer.submit(release.wait)
+        handler.create_async('ΦΕΚ A 1 - 12.01.2016', 'Α', 1, 'N/A', '2016-01-12 00:00:00')
+        producer = threading.Thread(target=handler.create_async,
+                                    args=('ΦΕΚ A 2 - 12.01.2016', 'Α', 2, 'N/A', '2016-01-12 00:00:00'))
+        producer.start()
+        producer.join(timeout=0.2)
+        self.assertTrue(producer.is_alive())
+
+        release.set()
+        producer.join(timeout=10)
+        writer.close()
+        self.assertEqual(self.count_committed(), 2)
+
+    def test_closed_writer(self):
+        self.create_issue_async(1)
+        self.writer.close()
+
+        self.assertEqual(self.count_committed(), 1)
+        with self.assertRaises(RuntimeError):
+            self.create_issue_async(2)
+
+    # Without a writer, asynchronous writes happen right away
+    def test_without_writer(self):
+        handler = IssueHandler(self.db_path)
+        future = handler.create_async('ΦΕΚ A 1 - 12.01.2016', 'Α', 1, 'N/A', '2016-01-12 00:00:00')
+
+        self.assertTrue(future.done())
+        self.assertEqual(self.count_committed(), 1)
+
+    def test_writer_of_other_database(self):
+        with self.assertRaises(ValueError):
+            IssueHandler(os.path.join(self.directory, 'other'), writer=self.writer)
+
+    def create_issue_async(self, number):
+        title = 'ΦΕΚ A {} - 12.01.2016'.format(number)
+        return self.handler.create_async(title, 'Α', number, 'N/A', '2016-01-12 00:00:00')
+
+    # Counts the issues that can be seen from a separate connection
+    def count_committed(self):
+        db = sqlite3.connect(self.db_path)
+        count = db.execute('SELECT COUNT(*) FROM issues').fetchone()[0]
+        db.close()
+        return count
+
+if __name__ == '__main__':
+    unittest.main()